@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser, Expediente, Visita, Familiar, Proyecto, ProyectoUsuario
+from .models import CustomUser, Expediente, Visita, Familiar, Proyecto, ProyectoUsuario, Trabajo
 
 
 @admin.register(CustomUser)
@@ -130,4 +130,12 @@ class ProyectoAdmin(admin.ModelAdmin):
 class ProyectoUsuarioAdmin(admin.ModelAdmin):
     list_display = ['proyecto', 'usuario', 'fecha_inscripcion', 'activo']
     list_filter = ['activo', 'fecha_inscripcion']
-    search_fields = ['proyecto__nombre', 'usuario__username']
\ No newline at end of file
+    search_fields = ['proyecto__nombre', 'usuario__username']
+
+@admin.register(Trabajo)
+class TrabajoAdmin(admin.ModelAdmin):
+    list_display = ['id', 'tipo', 'estado', 'progreso', 'intentos', 'trabajador', 'fecha_creacion']
+    list_filter = ['estado', 'tipo']
+    search_fields = ['id', 'tipo']
+    readonly_fields = ['fecha_creacion', 'fecha_inicio', 'fecha_fin']
+    date_hierarchy = 'fecha_creacion'
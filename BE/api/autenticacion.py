@@ -0,0 +1,111 @@
+import time
+
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .metricas import sumar_auth
+from .models import CustomUser
+
+
+# ============= TOKENS CON ROL =============
+
+# Tiempo que se confía en el estado cacheado del usuario antes de volver a
+# consultarlo. Guardar el usuario invalida la caché de inmediato.
+REVOCACION_TTL = 60
+
+
+def agregar_claims(token, user):
+    """Claims que permiten autorizar sin consultar la base de datos"""
+    token['rol'] = user.rol
+    token['sede'] = user.sede
+    token['activo'] = user.activo
+    token['is_superuser'] = user.is_superuser
+    return token
+
+
+def tokens_para_usuario(user):
+    """Par refresh/access con claims de rol (el access hereda los claims)"""
+    refresh = agregar_claims(RefreshToken.for_user(user), user)
+    return {
+        'refresh': str(refresh),
+        'access': str(refresh.access_token),
+    }
+
+
+class TokenConRolSerializer(TokenObtainPairSerializer):
+    """Usado por /api/token/ (SIMPLE_JWT['TOKEN_OBTAIN_SERIALIZER'])"""
+
+    @classmethod
+    def get_token(cls, user):
+        return agregar_claims(super().get_token(user), user)
+
+
+# ============= USUARIO RESPALDADO POR EL TOKEN =============
+
+class UsuarioToken(TokenUser):
+    """request.user construido solo con los claims del token (sin consultas)"""
+
+    @cached_property
+    def id(self):
+        return int(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def rol(self):
+        return self.token.get('rol')
+
+    @cached_property
+    def sede(self):
+        return self.token.get('sede')
+
+    @cached_property
+    def activo(self):
+        return self.token.get('activo', False)
+
+
+def _clave_estado(user_id):
+    return f'auth:estado:{user_id}'
+
+
+def estado_usuario(user_id):
+    """(activo, rol) actuales del usuario; cacheado REVOCACION_TTL segundos"""
+    clave = _clave_estado(user_id)
+    estado = cache.get(clave)
+    if estado is None:
+        fila = CustomUser.objects.filter(id=user_id).values_list('activo', 'is_active', 'rol').first()
+        estado = (bool(fila and fila[0] and fila[1]), fila[2] if fila else None)
+        cache.set(clave, estado, REVOCACION_TTL)
+    return estado
+
+
+def invalidar_estado_usuario(user_id):
+    cache.delete(_clave_estado(user_id))
+
+
+class JWTRolAuthentication(JWTStatelessUserAuthentication):
+    """
+    Autentica con el JWT sin cargar el CustomUser.
+    Rechaza tokens de usuarios desactivados o cuyo rol cambió después de
+    emitir el token (el cliente debe volver a iniciar sesión).
+    """
+
+    def authenticate(self, request):
+        inicio = time.perf_counter()
+        try:
+            return super().authenticate(request)
+        finally:
+            sumar_auth(request, time.perf_counter() - inicio)
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        activo, rol = estado_usuario(user.id)
+        if not activo:
+            raise AuthenticationFailed('Usuario inactivo', code='user_inactive')
+        if rol != user.rol:
+            raise AuthenticationFailed('El rol del usuario cambió', code='token_not_valid')
+        return user
@@ -0,0 +1,81 @@
+import re
+
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Concat
+
+from .models import CustomUser, Visita
+
+
+# ============= BÚSQUEDA DE TEXTO COMPLETO =============
+
+# 'simple' no aplica stemming: nombres, correos y cédulas se indexan tal cual
+CONFIG = 'simple'
+
+
+def usa_postgres():
+    return connection.vendor == 'postgresql'
+
+
+def _documento():
+    """
+    Textos a indexar; los nombres pesan más que el resto.
+    Las cédulas e instituciones de las visitas se agregan con una subconsulta.
+    """
+    visitas = Visita.objects.filter(expediente__user_id=OuterRef('pk')).values(
+        'expediente__user_id'
+    ).annotate(
+        texto=StringAgg(Concat('cedula', Value(' '), 'institucion'), delimiter=' ')
+    ).values('texto')
+
+    return (
+        SearchVector('first_name', 'last_name', 'username', weight='A', config=CONFIG)
+        + SearchVector('email', 'sede', Subquery(visitas), weight='B', config=CONFIG)
+    )
+
+
+def actualizar_vector_busqueda(user_ids):
+    """
+    Recalcula el tsvector de los usuarios indicados en un solo UPDATE.
+    Se usa update() para no disparar de nuevo las señales de post_save.
+    """
+    if not usa_postgres() or not user_ids:
+        return
+
+    CustomUser.objects.filter(id__in=user_ids).update(vector_busqueda=_documento())
+
+
+def _consulta_prefijos(texto):
+    """'ana rod' -> 'ana:* & rod:*' para buscar mientras se escribe"""
+    palabras = re.findall(r'\w+', texto.lower())
+    if not palabras:
+        return None
+    return SearchQuery(' & '.join(f'{p}:*' for p in palabras), search_type='raw', config=CONFIG)
+
+
+def buscar_usuarios(texto):
+    """Usuarios que coinciden con `texto`, ordenados por relevancia"""
+    queryset = CustomUser.objects.defer('vector_busqueda').annotate(expediente_id=F('expediente__id'))
+
+    if not usa_postgres():
+        # Alternativa para desarrollo local sin PostgreSQL (sin índice)
+        filtro = Q()
+        for palabra in texto.split():
+            filtro &= (
+                Q(first_name__icontains=palabra) | Q(last_name__icontains=palabra)
+                | Q(username__icontains=palabra) | Q(email__icontains=palabra)
+                | Q(sede__icontains=palabra)
+                | Q(expediente__visitas__cedula__icontains=palabra)
+                | Q(expediente__visitas__institucion__icontains=palabra)
+            )
+        return queryset.filter(filtro).distinct().annotate(rango=Value(1.0)).order_by('id')
+
+    consulta = _consulta_prefijos(texto)
+    if consulta is None:
+        return queryset.none()
+
+    return queryset.filter(vector_busqueda=consulta).annotate(
+        rango=SearchRank(F('vector_busqueda'), consulta)
+    ).order_by('-rango', 'id')
@@ -0,0 +1,181 @@
+import hashlib
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from rest_framework.response import Response
+
+from .permisions import get_user_role
+from .replicas import alias_lectura
+
+
+# ============= CACHÉ DE RESPUESTAS =============
+#
+# Cada respuesta cacheada depende de etiquetas ('expediente:lista',
+# 'expediente:15', ...). La clave incluye la versión actual de sus etiquetas:
+# invalidar una etiqueta cambia su versión y las entradas viejas dejan de
+# usarse (expiran solas con el TTL del backend).
+
+ALIAS = 'respuestas'
+RECURSOS = ('expediente', 'visita', 'proyecto')
+
+
+def _cache():
+    return caches[ALIAS]
+
+
+def _clave_etiqueta(etiqueta):
+    return f'etiqueta:{etiqueta}'
+
+
+def etiqueta_lista(recurso):
+    return f'{recurso}:lista'
+
+
+def etiqueta_objeto(recurso, pk):
+    return f'{recurso}:{pk}'
+
+
+def _versiones(etiquetas):
+    cache = _cache()
+    claves = [_clave_etiqueta(etiqueta) for etiqueta in etiquetas]
+    versiones = cache.get_many(claves)
+    faltantes = {clave: time.time_ns() for clave in claves if clave not in versiones}
+    if faltantes:
+        # Iniciar con la hora evita reutilizar versiones si el backend las descartó
+        cache.set_many(faltantes, None)
+        versiones.update(faltantes)
+    return [str(versiones[clave]) for clave in claves]
+
+
+def _invalidar_ahora(etiquetas):
+    _cache().set_many({_clave_etiqueta(etiqueta): time.time_ns() for etiqueta in etiquetas}, None)
+
+
+def invalidar(*etiquetas):
+    """
+    Invalida ya y de nuevo al confirmar la transacción: así no queda
+    cacheada una respuesta leída entre la escritura y el commit.
+    """
+    etiquetas = set(etiquetas)
+    if not etiquetas:
+        return
+    _invalidar_ahora(etiquetas)
+    transaction.on_commit(lambda: _invalidar_ahora(etiquetas))
+
+
+# ---------- Métricas ----------
+
+def _clave_metrica(recurso, resultado):
+    return f'metricas:{recurso}:{resultado}'
+
+
+def _registrar(recurso, resultado):
+    cache = _cache()
+    clave = _clave_metrica(recurso, resultado)
+    try:
+        cache.incr(clave)
+    except ValueError:
+        if not cache.add(clave, 1, None):
+            cache.incr(clave)
+
+
+def metricas():
+    """Aciertos y fallos acumulados por recurso (compartidos entre procesos)"""
+    claves = [_clave_metrica(recurso, resultado) for recurso in RECURSOS for resultado in ('hit', 'miss')]
+    valores = _cache().get_many(claves)
+
+    resultado = {}
+    for recurso in RECURSOS:
+        hits = valores.get(_clave_metrica(recurso, 'hit'), 0)
+        misses = valores.get(_clave_metrica(recurso, 'miss'), 0)
+        total = hits + misses
+        resultado[recurso] = {
+            'hits': hits,
+            'misses': misses,
+            'ratio': round(hits / total, 4) if total else None,
+        }
+    return resultado
+
+
+# ---------- Vistas ----------
+
+def _quizas_atrasada(versiones):
+    """
+    Leída de una réplica poco después de una invalidación: la réplica podría
+    no tener aún el cambio y se guardaría una respuesta vieja con la versión
+    nueva. Las versiones son la hora (ns) de la última invalidación.
+    """
+    if alias_lectura() is None:
+        return False
+    margen = (settings.REPLICAS_RETRASO_MAXIMO + settings.REPLICAS_CHEQUEO_SEGUNDOS) * 1e9
+    return time.time_ns() - max(int(version) for version in versiones) < margen
+
+
+class CacheRespuestaMixin:
+    """
+    Cachea list/retrieve en el backend 'respuestas'. La clave depende de la
+    URL completa, el formato negociado y el rol de quien consulta.
+    Las señales de api/signals.py invalidan las etiquetas del recurso.
+
+    Con RespuestaCondicionalMixin delante, la clave incluye también la versión
+    leída de la base (version_datos): con una caché por proceso, una escritura
+    de otro proceso no invalida las etiquetas de este.
+    """
+    recurso_cache = None
+    version_datos = None
+
+    def _clave_respuesta(self, request, versiones):
+        rol = get_user_role(request.user) or 'anonimo'
+        partes = [
+            request.build_absolute_uri(),
+            request.accepted_renderer.format,
+            rol,
+            self.version_datos or '',
+        ] + versiones
+        digest = hashlib.md5('|'.join(partes).encode()).hexdigest()
+        return f'respuesta:{self.recurso_cache}:{digest}'
+
+    def _respuesta_cacheada(self, request, etiquetas, generar):
+        # Dentro de una transacción los datos pueden no estar confirmados
+        if connection.in_atomic_block:
+            return generar()
+
+        cache = _cache()
+        versiones = _versiones(etiquetas)
+        clave = self._clave_respuesta(request, versiones)
+        guardada = cache.get(clave)
+        if guardada is not None:
+            _registrar(self.recurso_cache, 'hit')
+            data, encabezados = guardada
+            response = Response(data, headers=encabezados)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _registrar(self.recurso_cache, 'miss')
+        response = generar()
+        if response.status_code == 200 and not _quizas_atrasada(versiones):
+            encabezados = {
+                nombre: valor for nombre, valor in response.items()
+                if nombre.lower() != 'content-type'
+            }
+            cache.set(clave, (response.data, encabezados))
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._respuesta_cacheada(
+            request,
+            [etiqueta_lista(self.recurso_cache)],
+            partial(super().list, request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        pk = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self._respuesta_cacheada(
+            request,
+            [etiqueta_objeto(self.recurso_cache, pk)],
+            partial(super().retrieve, request, *args, **kwargs),
+        )
@@ -0,0 +1,239 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import CargaArchivo
+
+
+# ============= SUBIDAS POR PARTES (REANUDABLES) =============
+#
+# Protocolo:
+#   1. POST   /api/cargas/                    {nombre, destino, content_type, tamano_total}
+#   2. PATCH  /api/cargas/<id>/               cuerpo = bytes, header Upload-Offset = posición
+#      (GET   /api/cargas/<id>/ devuelve el offset recibido para reanudar)
+#   3. POST   /api/cargas/<id>/finalizar/
+#   4. El serializer de visita/expediente recibe el id (adjunto_notas_carga, imagen_carga)
+
+MB = 1024 * 1024
+TAMANO_PARTE_MAXIMO = 5 * MB
+TAMANO_LECTURA = 64 * 1024
+
+# Mismos límites y tipos que los validadores de serializers.py
+DESTINOS = {
+    'adjunto_notas': {
+        'limite': 10 * MB,
+        'tipos': ['application/pdf'],
+    },
+    'imagen': {
+        'limite': 5 * MB,
+        'tipos': ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp'],
+    },
+}
+
+# Primeros bytes esperados por tipo de contenido
+FIRMAS = {
+    'application/pdf': [b'%PDF-'],
+    'image/jpeg': [b'\xff\xd8\xff'],
+    'image/jpg': [b'\xff\xd8\xff'],
+    'image/png': [b'\x89PNG\r\n\x1a\n'],
+    'image/gif': [b'GIF87a', b'GIF89a'],
+    'image/webp': [b'RIFF'],
+}
+
+
+class OffsetIncorrecto(Exception):
+    """El cliente envió una parte que no continúa donde quedó la carga"""
+
+    def __init__(self, esperado):
+        super().__init__(f'Offset esperado: {esperado}')
+        self.esperado = esperado
+
+
+def directorio_temporal():
+    directorio = getattr(settings, 'CARGAS_TEMP_DIR', os.path.join(settings.MEDIA_ROOT, 'cargas_tmp'))
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def validar_inicio(destino, content_type, tamano_total):
+    reglas = DESTINOS[destino]
+    if content_type not in reglas['tipos']:
+        raise serializers.ValidationError({
+            'content_type': f'Tipo de archivo no permitido: {content_type}. '
+                            f'Tipos permitidos: {", ".join(reglas["tipos"])}'
+        })
+    if tamano_total > reglas['limite']:
+        raise serializers.ValidationError({
+            'tamano_total': f'El archivo no puede superar {reglas["limite"] // MB}MB.'
+        })
+
+
+def iniciar_carga(nombre, destino, content_type, tamano_total):
+    validar_inicio(destino, content_type, tamano_total)
+    carga = CargaArchivo(
+        nombre=os.path.basename(nombre),
+        destino=destino,
+        content_type=content_type,
+        tamano_total=tamano_total,
+    )
+    carga.ruta_temporal = os.path.join(directorio_temporal(), f'{carga.id.hex}.part')
+    open(carga.ruta_temporal, 'wb').close()
+    carga.save()
+    return carga
+
+
+def _validar_firma(carga, inicio):
+    firmas = FIRMAS.get(carga.content_type, [])
+    if firmas and not any(inicio.startswith(firma) for firma in firmas):
+        raise serializers.ValidationError(
+            f'El contenido no corresponde a un archivo {carga.content_type}.'
+        )
+
+
+def _recibir_parte(carga, offset, stream, temporal):
+    """Copia `stream` a `temporal` en bloques, validando firma y tamaños"""
+    escritos = 0
+    while True:
+        bloque = stream.read(TAMANO_LECTURA) if stream is not None else b''
+        if not bloque:
+            break
+        if offset == 0 and escritos == 0:
+            _validar_firma(carga, bloque)
+        escritos += len(bloque)
+        if escritos > TAMANO_PARTE_MAXIMO or offset + escritos > carga.tamano_total:
+            raise serializers.ValidationError(
+                'La parte excede el tamaño declarado o el máximo por parte '
+                f'({TAMANO_PARTE_MAXIMO // MB}MB).'
+            )
+        temporal.write(bloque)
+    return escritos
+
+
+def _verificar_pendiente(carga, offset):
+    if carga.estado != 'pendiente':
+        raise serializers.ValidationError('La carga ya fue finalizada.')
+    if offset != carga.recibido:
+        raise OffsetIncorrecto(carga.recibido)
+
+
+def agregar_parte(carga_id, offset, stream):
+    """
+    Agrega al archivo temporal los bytes de `stream` a partir de `offset`.
+    El cuerpo se copia en bloques: nunca se carga completo en memoria.
+
+    La parte se recibe primero en un archivo aparte, sin transacción: un
+    cliente lento no retiene la fila bloqueada ni una conexión en transacción.
+    Después, con la fila bloqueada, se revisa de nuevo el offset (otra parte
+    simultánea pudo llegar antes) y se agrega la parte al archivo de la carga.
+    """
+    carga = CargaArchivo.objects.get(id=carga_id)
+    # Rechazo temprano: no vale la pena leer una parte que no continúa la carga
+    _verificar_pendiente(carga, offset)
+
+    with tempfile.TemporaryFile(dir=directorio_temporal()) as temporal:
+        escritos = _recibir_parte(carga, offset, stream, temporal)
+
+        with transaction.atomic():
+            carga = CargaArchivo.objects.select_for_update().get(id=carga_id)
+            _verificar_pendiente(carga, offset)
+
+            temporal.seek(0)
+            with open(carga.ruta_temporal, 'r+b') as destino:
+                destino.seek(offset)
+                try:
+                    shutil.copyfileobj(temporal, destino, TAMANO_LECTURA)
+                except Exception:
+                    # Descartar lo escrito de esta parte para poder reintentarla
+                    destino.truncate(offset)
+                    raise
+                destino.truncate(offset + escritos)
+
+            carga.recibido = offset + escritos
+            carga.save(update_fields=['recibido', 'fecha_actualizacion'])
+    return carga
+
+
+def finalizar_carga(carga_id):
+    carga = CargaArchivo.objects.get(id=carga_id)
+    if carga.estado == 'completa':
+        return carga
+    if carga.recibido != carga.tamano_total:
+        raise serializers.ValidationError(
+            f'Faltan datos: recibidos {carga.recibido} de {carga.tamano_total} bytes.'
+        )
+
+    if carga.destino == 'imagen':
+        from PIL import Image
+        try:
+            with Image.open(carga.ruta_temporal) as imagen:
+                imagen.verify()
+        except Exception:
+            raise serializers.ValidationError('El archivo no es una imagen válida.')
+
+    carga.estado = 'completa'
+    carga.save(update_fields=['estado', 'fecha_actualizacion'])
+    return carga
+
+
+def eliminar_carga(carga):
+    if os.path.exists(carga.ruta_temporal):
+        os.remove(carga.ruta_temporal)
+    carga.delete()
+
+
+def limpiar_cargas_vencidas(horas=24):
+    """Elimina cargas sin actividad reciente (p. ej. abandonadas a medias)"""
+    limite = timezone.now() - timedelta(hours=horas)
+    vencidas = list(CargaArchivo.objects.filter(fecha_actualizacion__lt=limite))
+    for carga in vencidas:
+        eliminar_carga(carga)
+    return len(vencidas)
+
+
+# ============= USO DESDE LOS SERIALIZERS =============
+
+class CargaCompletaField(serializers.PrimaryKeyRelatedField):
+    """Id de una carga finalizada con el destino indicado"""
+
+    def __init__(self, destino, **kwargs):
+        kwargs.setdefault('write_only', True)
+        kwargs.setdefault('required', False)
+        kwargs['queryset'] = CargaArchivo.objects.filter(estado='completa', destino=destino)
+        super().__init__(**kwargs)
+
+
+class CargaReferenciadaMixin:
+    """
+    Permite enviar el id de una carga finalizada en lugar del archivo.
+    Meta.campos_carga = {'campo_carga': 'campo_archivo'}
+    Al guardar se copia el archivo al storage y se elimina la carga.
+    """
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        self._cargas_usadas = []
+        for campo_carga, campo_archivo in getattr(self.Meta, 'campos_carga', {}).items():
+            carga = attrs.pop(campo_carga, None)
+            if carga is not None:
+                attrs[campo_archivo] = File(open(carga.ruta_temporal, 'rb'), name=carga.nombre)
+                self._cargas_usadas.append(carga)
+        return attrs
+
+    def save(self, **kwargs):
+        try:
+            instancia = super().save(**kwargs)
+        finally:
+            for campo_archivo in getattr(self.Meta, 'campos_carga', {}).values():
+                archivo = self.validated_data.get(campo_archivo)
+                if isinstance(archivo, File) and not archivo.closed:
+                    archivo.close()
+        for carga in getattr(self, '_cargas_usadas', []):
+            eliminar_carga(carga)
+        return instancia
@@ -0,0 +1,113 @@
+import hashlib
+from datetime import date
+from functools import partial
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+
+# ============= GET CONDICIONAL (ETag / Last-Modified) =============
+
+class RespuestaCondicionalMixin:
+    """
+    Agrega ETag y Last-Modified a list/retrieve y responde 304 sin ejecutar
+    el serializer cuando el cliente ya tiene la versión actual.
+
+    Detalle: la versión sale de una consulta de agregados (máximos de
+    fecha_actualizacion y conteos) sobre el objeto y sus relaciones. Los
+    conteos detectan eliminaciones, que no dejan fecha.
+
+    Listado: los mismos agregados, pero por fila y solo sobre las filas de la
+    página pedida (una subconsulta con el LIMIT del cursor), así el costo no
+    crece con la tabla. Las altas y bajas dentro de la página cambian los ids.
+
+    La versión sale de la base, no de una caché local: una escritura hecha
+    por otro proceso (otro worker, run_workers) también cambia el ETag.
+
+    agregados_version = {'nombre': Max(...) | Count(...)}
+    """
+    agregados_version = {}
+
+    def _version(self, queryset):
+        return queryset.order_by().aggregate(
+            total=Count('pk', distinct=True),
+            **self.agregados_version,
+        )
+
+    def _version_lista(self, queryset):
+        paginador = self.paginator
+        pagina = None
+        if hasattr(paginador, 'consulta_pagina'):
+            pagina = paginador.consulta_pagina(queryset, self.request, self)
+        if pagina is None:
+            return self._version(queryset)
+
+        filas = list(
+            queryset.filter(pk__in=pagina.values('pk'))
+            .order_by('pk').values('pk').annotate(**self.agregados_version)
+            .values_list('pk', *self.agregados_version)
+        )
+        version = {'filas': hashlib.md5(repr(filas).encode()).hexdigest()}
+        fechas = [valor for fila in filas for valor in fila if hasattr(valor, 'timestamp')]
+        if fechas:
+            version['ultima'] = max(fechas)
+        # X-Total-Count depende de toda la consulta, no solo de la página
+        if paginador.pide_total(self.request):
+            version['total'] = queryset.count()
+        return version
+
+    def _validadores(self, request, version):
+        # La edad de las visitas depende del día: la fecha forma parte del ETag
+        partes = [
+            request.get_full_path(),
+            request.headers.get('Accept', ''),
+            # El listado depende del rol y del usuario (atletas ven lo suyo)
+            str(getattr(request.user, 'id', None)),
+            date.today().isoformat(),
+        ] + [f'{nombre}={version[nombre]}' for nombre in sorted(version)]
+        etag = '"%s"' % hashlib.md5('|'.join(partes).encode()).hexdigest()
+
+        fechas = [valor for valor in version.values() if hasattr(valor, 'timestamp')]
+        ultima = int(max(fechas).timestamp()) if fechas else None
+        return etag, ultima
+
+    def _responder_condicional(self, request, obtener_version, generar):
+        try:
+            version = obtener_version()
+        except (TypeError, ValueError, ValidationError):
+            # pk mal formado: la vista normal responde 404
+            return generar()
+        etag, ultima = self._validadores(request, version)
+        # CacheRespuestaMixin la agrega a su clave: una escritura de otro
+        # proceso no deja en uso una respuesta cacheada vieja
+        self.version_datos = '|'.join(f'{nombre}={version[nombre]}' for nombre in sorted(version))
+
+        response = get_conditional_response(request, etag=etag, last_modified=ultima)
+        if response is None:
+            response = generar()
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if ultima is not None:
+                response['Last-Modified'] = http_date(ultima)
+            # Siempre revalidar: evita que el navegador reutilice una copia vieja
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._responder_condicional(
+            request,
+            lambda: self._version_lista(self.filter_queryset(self.queryset.all())),
+            partial(super().list, request, *args, **kwargs),
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        return self._responder_condicional(
+            request,
+            lambda: self._version(self.filter_queryset(self.queryset.all()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )),
+            partial(super().retrieve, request, *args, **kwargs),
+        )
@@ -0,0 +1,196 @@
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from .busqueda import actualizar_vector_busqueda
+from .cache_respuestas import etiqueta_lista, invalidar
+from .models import CustomUser, Expediente, Familiar, Proyecto, ProyectoUsuario, Visita
+
+
+# ============= DATOS SINTÉTICOS =============
+#
+# Volúmenes parecidos a producción para pruebas de carga y de índices.
+# Todo se inserta con bulk_create; con la misma semilla se generan los mismos datos.
+
+PREFIJO = 'seed_'
+TAMANO_LOTE = 1000
+
+SEDES = ['San José', 'Alajuela', 'Cartago', 'Heredia', 'Guanacaste', 'Puntarenas', 'Limón']
+NOMBRES = ['María', 'José', 'Ana', 'Luis', 'Sofía', 'Carlos', 'Valeria', 'Daniel', 'Camila', 'Andrés',
+           'Fernanda', 'Diego', 'Isabella', 'Mateo', 'Gabriela', 'Sebastián', 'Daniela', 'Javier']
+APELLIDOS = ['Rodríguez', 'Vargas', 'Jiménez', 'Mora', 'Rojas', 'Alvarado', 'Solís', 'Castro',
+             'Chaves', 'Araya', 'Quesada', 'Soto', 'Brenes', 'Hernández', 'Sánchez', 'Ramírez']
+INSTITUCIONES = ['Liceo de Costa Rica', 'Colegio Técnico Profesional', 'Liceo Experimental',
+                 'Colegio Científico', 'Liceo Rural', 'Colegio Nocturno']
+PARENTESCOS = ['Madre', 'Padre', 'Hermano', 'Hermana', 'Abuela', 'Abuelo', 'Tío', 'Tía']
+OCUPACIONES = ['Comerciante', 'Docente', 'Agricultor', 'Ama de casa', 'Chofer', 'Enfermera',
+               'Construcción', 'Estudiante', None]
+TIPOS_VIVIENDA = ['propia', 'alquilada', 'prestada', 'otro']
+
+
+def _monto(aleatorio, minimo, maximo):
+    """Colones redondeados a miles"""
+    return Decimal(aleatorio.randint(minimo // 1000, maximo // 1000) * 1000)
+
+
+def _economia(aleatorio):
+    """Campos económicos de una visita, con totales coherentes"""
+    tiene_beca = aleatorio.random() < 0.35
+    trabaja = aleatorio.random() < 0.2
+    vivienda = aleatorio.choice(TIPOS_VIVIENDA)
+
+    gastos = {
+        'gasto_alimentacion': _monto(aleatorio, 80000, 350000),
+        'gasto_agua': _monto(aleatorio, 5000, 25000),
+        'gasto_luz': _monto(aleatorio, 15000, 60000),
+        'gasto_internet_cable': _monto(aleatorio, 0, 40000),
+        'gasto_celular': _monto(aleatorio, 5000, 30000),
+        'gasto_transporte': _monto(aleatorio, 10000, 80000),
+        'gasto_salud': _monto(aleatorio, 0, 50000),
+    }
+    monto_vivienda = _monto(aleatorio, 100000, 300000) if vivienda == 'alquilada' else Decimal(0)
+    salario = _monto(aleatorio, 100000, 300000) if trabaja else Decimal(0)
+    monto_beca = _monto(aleatorio, 20000, 80000) if tiene_beca else Decimal(0)
+
+    return {
+        'tiene_beca': tiene_beca,
+        'monto_beca': monto_beca,
+        'institucion_beca': aleatorio.choice(['FONABE', 'IMAS', 'Municipalidad']) if tiene_beca else None,
+        'tipo_vivienda': vivienda,
+        'monto_vivienda': monto_vivienda,
+        'trabaja': trabaja,
+        'empresa': 'Supermercado' if trabaja else None,
+        'salario': salario,
+        'ingresos_totales': _monto(aleatorio, 250000, 1200000) + salario + monto_beca,
+        'gastos_totales': sum(gastos.values()) + monto_vivienda,
+        'deudas': _monto(aleatorio, 0, 500000) if aleatorio.random() < 0.4 else Decimal(0),
+        **gastos,
+    }
+
+
+def _visita(aleatorio, expediente, fecha_visita, fecha_nacimiento):
+    return Visita(
+        expediente=expediente,
+        institucion=aleatorio.choice(INSTITUCIONES),
+        ano_academico=str(fecha_visita.year),
+        adecuacion=aleatorio.choice([None, None, None, 'No significativa', 'Significativa']),
+        fecha_nacimiento=fecha_nacimiento,
+        cedula=str(aleatorio.randint(100000000, 799999999)),
+        telefono_principal=f'8{aleatorio.randint(0, 9999999):07d}',
+        direccion=f'{aleatorio.choice(SEDES)}, {aleatorio.randint(100, 900)} m al norte de la iglesia',
+        lesiones=aleatorio.choice([None, None, 'Esguince de tobillo', 'Tendinitis']),
+        disponibilidad='Lunes a viernes por la tarde',
+        observaciones=aleatorio.choice([None, 'Familia colaboradora', 'Requiere seguimiento']),
+        fecha_visita=fecha_visita,
+        **_economia(aleatorio),
+    )
+
+
+def _crear(modelo, objetos):
+    return modelo.objects.bulk_create(objetos, batch_size=TAMANO_LOTE)
+
+
+def limpiar():
+    """Elimina los usuarios sembrados (y en cascada sus expedientes, visitas, etc.)"""
+    Proyecto.objects.filter(nombre__startswith=PREFIJO).delete()
+    eliminados, _ = CustomUser.objects.filter(username__startswith=PREFIJO).delete()
+    return eliminados
+
+
+def sembrar(atletas=1000, staff=10, visitas=4, familiares=3, proyectos=10,
+            semilla=42, password='endurance123'):
+    """
+    Genera `atletas` usuarios con expediente, hasta `visitas` visitas cada uno
+    (con hasta `familiares` familiares), `staff` usuarios de personal y
+    `proyectos` proyectos con inscripciones. Devuelve los conteos creados.
+    """
+    aleatorio = random.Random(semilla)
+    # Un solo hash para todos: calcularlo por usuario domina el tiempo de carga
+    password_hash = make_password(password)
+    inicio = CustomUser.objects.filter(username__startswith=PREFIJO).count()
+    hoy = date.today()
+
+    with transaction.atomic():
+        usuarios = _crear(CustomUser, [
+            CustomUser(
+                username=f'{PREFIJO}{"staff" if i < staff else "atleta"}_{inicio + i}',
+                email=f'{PREFIJO}{inicio + i}@endurance.test',
+                first_name=aleatorio.choice(NOMBRES),
+                last_name=f'{aleatorio.choice(APELLIDOS)} {aleatorio.choice(APELLIDOS)}',
+                rol='staff' if i < staff else 'user',
+                is_staff=i < staff,
+                sede=aleatorio.choice(SEDES),
+                telefono=f'8{aleatorio.randint(0, 9999999):07d}',
+                activo=i < staff or aleatorio.random() < 0.9,
+                password=password_hash,
+            )
+            for i in range(staff + atletas)
+        ])
+        deportistas = usuarios[staff:]
+
+        expedientes = _crear(Expediente, [
+            Expediente(
+                user=usuario,
+                genero=aleatorio.choice('MMFFO'),
+                comentario_general=aleatorio.choice([None, 'Atleta de alto rendimiento', 'Nuevo ingreso']),
+                activo=usuario.activo,
+            )
+            for usuario in deportistas
+        ])
+
+        nuevas_visitas = []
+        for expediente in expedientes:
+            fecha_nacimiento = hoy - timedelta(days=aleatorio.randint(12 * 365, 22 * 365))
+            for _ in range(aleatorio.randint(1, visitas)):
+                fecha_visita = hoy - timedelta(days=aleatorio.randint(0, 4 * 365))
+                nuevas_visitas.append(_visita(aleatorio, expediente, fecha_visita, fecha_nacimiento))
+        nuevas_visitas = _crear(Visita, nuevas_visitas)
+
+        nuevos_familiares = _crear(Familiar, [
+            Familiar(
+                visita=visita,
+                nombre_completo=f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)}',
+                edad=aleatorio.randint(5, 80),
+                parentesco=aleatorio.choice(PARENTESCOS),
+                ocupacion=aleatorio.choice(OCUPACIONES),
+                ingreso_mensual=_monto(aleatorio, 0, 600000),
+                lugar_trabajo=aleatorio.choice([None, 'San José centro', 'Zona franca']),
+            )
+            for visita in nuevas_visitas
+            for _ in range(aleatorio.randint(0, familiares))
+        ])
+
+        nuevos_proyectos = _crear(Proyecto, [
+            Proyecto(
+                nombre=f'{PREFIJO}Proyecto {inicio + i}',
+                descripcion='Proyecto generado para pruebas de carga',
+                objetivo='Medir el rendimiento de la API',
+                fecha_inicio=hoy - timedelta(days=aleatorio.randint(0, 365)),
+                fecha_fin=hoy + timedelta(days=aleatorio.randint(30, 365)),
+                activo=aleatorio.random() < 0.8,
+            )
+            for i in range(proyectos)
+        ])
+        inscripciones = _crear(ProyectoUsuario, [
+            ProyectoUsuario(proyecto=proyecto, usuario=usuario, activo=aleatorio.random() < 0.85)
+            for proyecto in nuevos_proyectos
+            for usuario in aleatorio.sample(deportistas, min(len(deportistas), aleatorio.randint(10, 200)))
+        ])
+
+    # bulk_create no dispara señales
+    ids = [usuario.id for usuario in usuarios]
+    for posicion in range(0, len(ids), TAMANO_LOTE):
+        actualizar_vector_busqueda(ids[posicion:posicion + TAMANO_LOTE])
+    invalidar(etiqueta_lista('expediente'), etiqueta_lista('visita'), etiqueta_lista('proyecto'))
+
+    return {
+        'usuarios': len(usuarios),
+        'expedientes': len(expedientes),
+        'visitas': len(nuevas_visitas),
+        'familiares': len(nuevos_familiares),
+        'proyectos': len(nuevos_proyectos),
+        'inscripciones': len(inscripciones),
+    }
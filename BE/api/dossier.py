@@ -0,0 +1,336 @@
+import hashlib
+import io
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Expediente, Trabajo, Visita
+from .trabajos import ErrorPermanente
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import LETTER
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Image, PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:  # dependencia opcional: generar_pdf() avisa si falta
+    colors = None
+
+
+# ============= DOSSIER PDF DEL EXPEDIENTE =============
+#
+# Expediente, visitas, familiares y resumen económico en un PDF imprimible
+# (lo que hoy se arma a mano desde View.jsx y ViewVisita.jsx). Lo genera la
+# tarea 'dossier_expediente' (api/tareas.py) y queda guardado en
+# MEDIA_ROOT/dossiers/expediente_<id>/<huella>.pdf. La huella sale de la
+# misma versión que usa el ETag del expediente (fecha_actualizacion de
+# expediente, visitas y familiares, más los conteos), así que una descarga
+# repetida solo cuesta esa consulta y el PDF se regenera únicamente cuando
+# cambian los datos.
+
+CARPETA = 'dossiers/'
+FORMATO = 1  # subirlo al cambiar el diseño invalida los PDF guardados
+TIPO_TRABAJO = 'dossier_expediente'
+
+
+def ruta_dossier(expediente_id, version):
+    partes = [f'formato={FORMATO}'] + [f'{nombre}={version[nombre]}' for nombre in sorted(version)]
+    huella = hashlib.md5('|'.join(partes).encode()).hexdigest()[:16]
+    return f'{CARPETA}expediente_{expediente_id}/{huella}.pdf'
+
+
+def trabajo_en_curso(ruta):
+    """Trabajo pendiente o en proceso para la misma versión (evita generarlo dos veces)"""
+    return Trabajo.objects.filter(
+        tipo=TIPO_TRABAJO, parametros__ruta=ruta, estado__in=['pendiente', 'en_proceso']
+    ).first()
+
+
+def _borrar_carpeta(carpeta, conservar=None):
+    try:
+        _, archivos = default_storage.listdir(carpeta)
+    except FileNotFoundError:
+        return
+    for nombre in archivos:
+        if nombre != conservar:
+            default_storage.delete(f'{carpeta}/{nombre}')
+
+
+def eliminar_anteriores(ruta):
+    """Borra los PDF de versiones anteriores del mismo expediente"""
+    carpeta, _, vigente = ruta.rpartition('/')
+    _borrar_carpeta(carpeta, conservar=vigente)
+
+
+def eliminar_dossiers(expediente_id):
+    _borrar_carpeta(f'{CARPETA}expediente_{expediente_id}')
+
+
+# ---------- Formato de valores ----------
+
+def _texto(valor):
+    if valor is None or valor == '':
+        return 'No disponible'
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%d/%m/%Y')
+    return str(valor)
+
+
+def _moneda(valor):
+    return f'CRC {valor or 0:,.2f}'
+
+
+def _edad_en(nacimiento, fecha):
+    # Edad a la fecha de la visita y no a hoy: el PDF guardado no cambia con los días
+    return fecha.year - nacimiento.year - ((fecha.month, fecha.day) < (nacimiento.month, nacimiento.day))
+
+
+# ---------- PDF ----------
+
+def _estilos():
+    base = getSampleStyleSheet()
+    return {
+        'titulo': ParagraphStyle('titulo', parent=base['Title'], textColor=colors.HexColor('#2c3e50')),
+        'seccion': ParagraphStyle('seccion', parent=base['Heading2'], textColor=colors.HexColor('#34495e')),
+        'subseccion': ParagraphStyle('subseccion', parent=base['Heading4'], textColor=colors.HexColor('#34495e')),
+        'normal': base['BodyText'],
+    }
+
+
+def _parrafo(texto, estilo):
+    return Paragraph(escape(texto).replace('\n', '<br/>'), estilo)
+
+
+def _tabla(filas, anchos, estilos, encabezado=False, resaltadas=()):
+    celdas = [[_parrafo(str(celda), estilos['normal']) for celda in fila] for fila in filas]
+    tabla = Table(celdas, colWidths=anchos, repeatRows=1 if encabezado else 0)
+    comandos = [
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#bdc3c7')),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ]
+    for fila in ([0] if encabezado else []) + list(resaltadas):
+        comandos.append(('BACKGROUND', (0, fila), (-1, fila), colors.HexColor('#ecf0f1')))
+    tabla.setStyle(TableStyle(comandos))
+    return tabla
+
+
+def _detalle(pares, estilos):
+    """Tabla etiqueta/valor como los detail-item del FE"""
+    return _tabla([(etiqueta, _texto(valor)) for etiqueta, valor in pares], [5.5 * cm, 11.5 * cm], estilos)
+
+
+def _foto(expediente):
+    """Foto del atleta (variante mediana si existe); None si no hay o no se puede leer"""
+    ruta = (expediente.imagen_variantes or {}).get('medium') or (expediente.imagen.name if expediente.imagen else None)
+    if not ruta or not default_storage.exists(ruta):
+        return None
+    try:
+        with default_storage.open(ruta, 'rb') as archivo:
+            return Image(io.BytesIO(archivo.read()), width=5 * cm, height=5 * cm, kind='proportional')
+    except Exception:
+        # Un formato que reportlab no lee no impide generar el dossier
+        return None
+
+
+def _resumen_economico(visita):
+    ingreso_familiares = sum((familiar.ingreso_mensual for familiar in visita.familiares.all()), Decimal(0))
+    filas = [
+        ('INGRESOS', ''),
+        ('Ingresos Totales', _moneda(visita.ingresos_totales)),
+        ('Salario', _moneda(visita.salario)),
+        ('Beca', _moneda(visita.monto_beca)),
+        ('Ingreso de Familiares', _moneda(ingreso_familiares)),
+        ('GASTOS', ''),
+        ('Gastos Totales', _moneda(visita.gastos_totales)),
+        ('Comida', _moneda(visita.gasto_alimentacion)),
+        ('Agua', _moneda(visita.gasto_agua)),
+        ('Luz', _moneda(visita.gasto_luz)),
+        ('Internet/Cable', _moneda(visita.gasto_internet_cable)),
+        ('Celular', _moneda(visita.gasto_celular)),
+        ('Transporte', _moneda(visita.gasto_transporte)),
+        ('Salud', _moneda(visita.gasto_salud)),
+        ('Monto Casa/Alquiler', _moneda(visita.monto_vivienda)),
+        ('Deudas', _moneda(visita.deudas)),
+        ('BALANCE', _moneda((visita.ingresos_totales or 0) - (visita.gastos_totales or 0))),
+    ]
+    return filas, (0, 5, len(filas) - 1)
+
+
+def _visita(visita, estilos):
+    bloques = [
+        PageBreak(),
+        _parrafo(f'Visita del {_texto(visita.fecha_visita)}', estilos['seccion']),
+        _parrafo('Información Académica', estilos['subseccion']),
+        _detalle([
+            ('Institución', visita.institucion),
+            ('Año Académico', visita.ano_academico),
+            ('Adecuación', visita.adecuacion),
+            ('Tipo de Adecuación', visita.tipo_adecuacion),
+            ('¿Tiene beca?', visita.tiene_beca),
+            ('Monto de Beca', _moneda(visita.monto_beca) if visita.tiene_beca else None),
+            ('Institución que otorga la Beca', visita.institucion_beca),
+        ], estilos),
+        _parrafo('Datos Personales', estilos['subseccion']),
+        _detalle([
+            ('Fecha de Nacimiento', visita.fecha_nacimiento),
+            ('Edad en la visita', _edad_en(visita.fecha_nacimiento, visita.fecha_visita)),
+            ('Cédula', visita.cedula),
+            ('Teléfono Principal', visita.telefono_principal),
+            ('Teléfono Secundario', visita.telefono_secundario),
+            ('Lugar de Residencia', visita.direccion),
+        ], estilos),
+        _parrafo('Información Médica', estilos['subseccion']),
+        _detalle([
+            ('Lesiones', visita.lesiones),
+            ('Enfermedades', visita.enfermedades),
+            ('Tratamientos', visita.tratamientos),
+            ('Atención Médica', visita.atencion_medica),
+            ('Drogas/Medicamentos', visita.drogas),
+            ('Disponibilidad', visita.disponibilidad),
+        ], estilos),
+        _parrafo('Información de Vivienda', estilos['subseccion']),
+        _detalle([
+            ('Tipo de Casa', visita.get_tipo_vivienda_display()),
+            ('Monto Casa/Alquiler', _moneda(visita.monto_vivienda)),
+            ('Especificaciones de Vivienda', visita.especificaciones_vivienda),
+        ], estilos),
+        _parrafo('Información Laboral', estilos['subseccion']),
+        _detalle([
+            ('¿Trabaja actualmente?', visita.trabaja),
+            ('Empresa', visita.empresa),
+            ('Salario', _moneda(visita.salario) if visita.trabaja else None),
+            ('Comentarios sobre Trabajo', visita.comentario_empleo),
+        ], estilos),
+        _parrafo('Información Familiar', estilos['subseccion']),
+    ]
+
+    familiares = list(visita.familiares.all())
+    if familiares:
+        bloques.append(_tabla(
+            [('Nombre', 'Edad', 'Parentesco', 'Ocupación', 'Ingreso Mensual', 'Lugar de Trabajo')] + [
+                (familiar.nombre_completo, familiar.edad, familiar.parentesco, _texto(familiar.ocupacion),
+                 _moneda(familiar.ingreso_mensual), _texto(familiar.lugar_trabajo))
+                for familiar in familiares
+            ],
+            [3.4 * cm, 1.3 * cm, 2.4 * cm, 3 * cm, 3 * cm, 3.9 * cm],
+            estilos,
+            encabezado=True,
+        ))
+    else:
+        bloques.append(_parrafo('Sin familiares registrados.', estilos['normal']))
+
+    filas, resaltadas = _resumen_economico(visita)
+    bloques += [
+        _parrafo('Resumen Económico', estilos['subseccion']),
+        _tabla(filas, [9 * cm, 6 * cm], estilos, resaltadas=resaltadas),
+    ]
+    if visita.observaciones:
+        bloques += [
+            Spacer(1, 0.4 * cm),
+            _parrafo('Observaciones', estilos['subseccion']),
+            _parrafo(visita.observaciones, estilos['normal']),
+        ]
+    return bloques
+
+
+def cargar_expediente(expediente_id):
+    """Expediente con usuario, visitas (más recientes primero) y familiares en 3 consultas"""
+    visitas = Visita.objects.order_by('-fecha_visita', 'id').prefetch_related('familiares')
+    try:
+        return Expediente.objects.select_related('user').prefetch_related(
+            Prefetch('visitas', queryset=visitas)
+        ).get(pk=expediente_id)
+    except Expediente.DoesNotExist:
+        raise ErrorPermanente('El expediente ya no existe.')
+
+
+def generar_pdf(expediente, al_avanzar=None):
+    """Bytes del PDF; al_avanzar(hechas, total) se llama por cada visita procesada"""
+    if colors is None:
+        raise ErrorPermanente('Para generar el dossier se requiere instalar reportlab.')
+
+    estilos = _estilos()
+    usuario = expediente.user
+    nombre = usuario.get_full_name() or usuario.username
+    visitas = list(expediente.visitas.all())
+
+    bloques = [_parrafo(f'Expediente de {nombre}', estilos['titulo'])]
+    foto = _foto(expediente)
+    if foto is not None:
+        bloques.append(foto)
+    bloques += [
+        _parrafo('Información General', estilos['seccion']),
+        _detalle([
+            ('Nombre', nombre),
+            ('Usuario', usuario.username),
+            ('Correo', usuario.email),
+            ('Sede', usuario.sede),
+            ('Teléfono', usuario.telefono),
+            ('Género', expediente.get_genero_display()),
+            ('Estado', 'Activo' if expediente.activo else 'Inactivo'),
+            ('Fecha de creación', expediente.fecha_creacion),
+            ('Total de visitas', len(visitas)),
+            ('Última visita', visitas[0].fecha_visita if visitas else None),
+        ], estilos),
+        _parrafo('Comentarios', estilos['seccion']),
+        _detalle([
+            ('Comentario General', expediente.comentario_general),
+            ('Comentario Académico', expediente.comentario_academico),
+            ('Comentario Económico', expediente.comentario_economico),
+        ], estilos),
+    ]
+
+    if visitas:
+        # Evolución económica: una fila por visita
+        bloques += [
+            Spacer(1, 0.4 * cm),
+            _parrafo('Resumen Económico por Visita', estilos['seccion']),
+            _tabla(
+                [('Fecha de Visita', 'Ingresos', 'Gastos', 'Balance', 'Familiares')] + [
+                    (_texto(visita.fecha_visita), _moneda(visita.ingresos_totales), _moneda(visita.gastos_totales),
+                     _moneda((visita.ingresos_totales or 0) - (visita.gastos_totales or 0)),
+                     len(visita.familiares.all()))
+                    for visita in visitas
+                ],
+                [3.5 * cm, 3.6 * cm, 3.6 * cm, 3.6 * cm, 2.7 * cm],
+                estilos,
+                encabezado=True,
+            ),
+        ]
+    for hechas, visita in enumerate(visitas, start=1):
+        bloques += _visita(visita, estilos)
+        if al_avanzar:
+            al_avanzar(hechas, len(visitas))
+
+    generado = timezone.localtime().strftime('%d/%m/%Y %H:%M')
+
+    def pie(canvas, documento):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawCentredString(
+            LETTER[0] / 2, 1 * cm, f'{nombre} · Generado el {generado} · Página {documento.page}'
+        )
+        canvas.restoreState()
+
+    salida = io.BytesIO()
+    documento = SimpleDocTemplate(
+        salida, pagesize=LETTER, title=f'Expediente de {nombre}',
+        leftMargin=2 * cm, rightMargin=2 * cm, topMargin=2 * cm, bottomMargin=2 * cm,
+    )
+    documento.build(bloques, onFirstPage=pie, onLaterPages=pie)
+    return salida.getvalue()
+
+
+def guardar_dossier(ruta, contenido):
+    """Guarda el PDF en `ruta` (reemplaza si otro trabajo ya lo dejó) y borra las versiones viejas"""
+    if default_storage.exists(ruta):
+        default_storage.delete(ruta)
+    guardado = default_storage.save(ruta, ContentFile(contenido))
+    eliminar_anteriores(guardado)
+    return guardado
@@ -0,0 +1,121 @@
+import hashlib
+from datetime import date
+
+from django.core.cache import cache
+from django.db.models import Case, CharField, Count, Max, OuterRef, Subquery, Sum, Value, When
+
+from .models import Expediente, Visita
+
+
+# ============= ESTADÍSTICAS DEL DASHBOARD =============
+
+CACHE_KEY = 'estadisticas:dashboard'
+CACHE_TIMEOUT = 60 * 60  # 1 hora; una escritura cambia la clave antes
+
+# (edad mínima, etiqueta) ordenados de mayor a menor
+RANGOS_EDAD = [
+    (23, '23+'),
+    (18, '18-22'),
+    (15, '15-17'),
+    (12, '12-14'),
+    (0, '0-11'),
+]
+
+GENEROS = {'M': 'Masculino', 'F': 'Femenino', 'O': 'Otro'}
+
+
+def _hace_anos(hoy, anos):
+    """Fecha de hoy hace `anos` años (29 de febrero pasa a 28)"""
+    try:
+        return hoy.replace(year=hoy.year - anos)
+    except ValueError:
+        return hoy.replace(year=hoy.year - anos, day=28)
+
+
+def _ultimas_visitas():
+    """Última visita de cada expediente (una fila por atleta)"""
+    ultima = Visita.objects.filter(
+        expediente=OuterRef('expediente')
+    ).order_by('-fecha_visita', '-id').values('id')[:1]
+    return Visita.objects.filter(id=Subquery(ultima))
+
+
+def _por_genero():
+    filas = Expediente.objects.values('genero').annotate(total=Count('id')).order_by('genero')
+    return [
+        {'genero': GENEROS.get(fila['genero'], fila['genero']), 'total': fila['total']}
+        for fila in filas
+    ]
+
+
+def _por_sede():
+    filas = Expediente.objects.values('user__sede').annotate(total=Count('id')).order_by('user__sede')
+    return [
+        {'sede': fila['user__sede'] or 'Sin sede', 'total': fila['total']}
+        for fila in filas
+    ]
+
+
+def _por_beca():
+    filas = _ultimas_visitas().values('tiene_beca').annotate(
+        total=Count('id'),
+        monto_total=Sum('monto_beca'),
+    ).order_by('-tiene_beca')
+    return [
+        {
+            'beca': 'Con beca' if fila['tiene_beca'] else 'Sin beca',
+            'total': fila['total'],
+            'monto_total': fila['monto_total'] or 0,
+        }
+        for fila in filas
+    ]
+
+
+def _por_edad(hoy):
+    rango = Case(
+        *[
+            When(fecha_nacimiento__lte=_hace_anos(hoy, minima), then=Value(etiqueta))
+            for minima, etiqueta in RANGOS_EDAD
+        ],
+        output_field=CharField(),
+    )
+    filas = _ultimas_visitas().annotate(rango=rango).values('rango').annotate(total=Count('id'))
+    totales = {fila['rango']: fila['total'] for fila in filas}
+    return [
+        {'edad': etiqueta, 'total': totales[etiqueta]}
+        for _, etiqueta in reversed(RANGOS_EDAD)
+        if totales.get(etiqueta)
+    ]
+
+
+def calcular_estadisticas():
+    """Distribuciones agregadas en la base de datos (una consulta por gráfico)"""
+    hoy = date.today()
+    return {
+        'genero': _por_genero(),
+        'sede': _por_sede(),
+        'beca': _por_beca(),
+        'edad': _por_edad(hoy),
+        'total_expedientes': Expediente.objects.count(),
+    }
+
+
+def _version():
+    """
+    Conteos y última modificación de expedientes y visitas. Sale de la base
+    y no de una invalidación en caché: la caché 'default' es por proceso y
+    una escritura en otro worker (o en run_workers) no la limpiaría. Los
+    cambios de sede del usuario actualizan la fecha de su expediente.
+    """
+    expedientes = Expediente.objects.aggregate(total=Count('id'), ultima=Max('fecha_actualizacion'))
+    visitas = Visita.objects.aggregate(total=Count('id'), ultima=Max('fecha_actualizacion'))
+    # La edad depende del día
+    partes = [date.today().isoformat()] + [
+        f'{valores["total"]}-{valores["ultima"]}' for valores in (expedientes, visitas)
+    ]
+    return hashlib.md5('|'.join(partes).encode()).hexdigest()
+
+
+def obtener_estadisticas():
+    """Estadísticas desde caché; se recalculan cuando cambia la versión de los datos"""
+    return cache.get_or_set(f'{CACHE_KEY}:{_version()}', calcular_estadisticas, CACHE_TIMEOUT)
@@ -0,0 +1,205 @@
+import csv
+import io
+import tempfile
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count, Max
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+
+
+# ============= EXPORTACIÓN DE VISITAS =============
+#
+# Una fila por visita con los datos económicos y los familiares aplanados
+# (familiar_1_nombre, familiar_1_edad, ...). Las visitas se leen con
+# .iterator(chunk_size=TAMANO_LOTE): en memoria solo hay un lote a la vez.
+
+TAMANO_LOTE = 500
+TAMANO_BLOQUE = 64 * 1024  # bytes por escritura al cliente
+
+COLUMNAS = [
+    ('visita_id', 'id'),
+    ('fecha_visita', 'fecha_visita'),
+    ('expediente_id', 'expediente_id'),
+    ('usuario', 'expediente.user.username'),
+    ('nombre', 'expediente.user.first_name'),
+    ('apellidos', 'expediente.user.last_name'),
+    ('sede', 'expediente.user.sede'),
+    ('cedula', 'cedula'),
+    ('fecha_nacimiento', 'fecha_nacimiento'),
+    ('telefono_principal', 'telefono_principal'),
+    ('telefono_secundario', 'telefono_secundario'),
+    ('direccion', 'direccion'),
+    ('institucion', 'institucion'),
+    ('ano_academico', 'ano_academico'),
+    ('adecuacion', 'adecuacion'),
+    ('tipo_adecuacion', 'tipo_adecuacion'),
+    ('tiene_beca', 'tiene_beca'),
+    ('monto_beca', 'monto_beca'),
+    ('institucion_beca', 'institucion_beca'),
+    ('tipo_vivienda', 'tipo_vivienda'),
+    ('monto_vivienda', 'monto_vivienda'),
+    ('especificaciones_vivienda', 'especificaciones_vivienda'),
+    ('trabaja', 'trabaja'),
+    ('empresa', 'empresa'),
+    ('salario', 'salario'),
+    ('comentario_empleo', 'comentario_empleo'),
+    ('ingresos_totales', 'ingresos_totales'),
+    ('gastos_totales', 'gastos_totales'),
+    ('gasto_alimentacion', 'gasto_alimentacion'),
+    ('gasto_agua', 'gasto_agua'),
+    ('gasto_luz', 'gasto_luz'),
+    ('gasto_internet_cable', 'gasto_internet_cable'),
+    ('gasto_celular', 'gasto_celular'),
+    ('gasto_transporte', 'gasto_transporte'),
+    ('gasto_salud', 'gasto_salud'),
+    ('deudas', 'deudas'),
+    ('observaciones', 'observaciones'),
+]
+COLUMNAS_FAMILIAR = [
+    ('nombre', 'nombre_completo'),
+    ('edad', 'edad'),
+    ('parentesco', 'parentesco'),
+    ('ocupacion', 'ocupacion'),
+    ('ingreso_mensual', 'ingreso_mensual'),
+    ('lugar_trabajo', 'lugar_trabajo'),
+]
+FORMATOS = ('csv', 'xlsx')
+
+
+def _valor(objeto, ruta):
+    for atributo in ruta.split('.'):
+        objeto = getattr(objeto, atributo)
+    return objeto
+
+
+def encabezado(max_familiares):
+    columnas = [nombre for nombre, _ in COLUMNAS] + ['cantidad_familiares', 'ingreso_familiares']
+    for numero in range(1, max_familiares + 1):
+        columnas += [f'familiar_{numero}_{nombre}' for nombre, _ in COLUMNAS_FAMILIAR]
+    return columnas
+
+
+def filas_visitas(queryset, max_familiares):
+    """Valores de cada visita (los familiares ya vienen prefetcheados por lote)"""
+    for visita in queryset.iterator(chunk_size=TAMANO_LOTE):
+        familiares = list(visita.familiares.all())
+        fila = [_valor(visita, ruta) for _, ruta in COLUMNAS]
+        fila += [len(familiares), sum(familiar.ingreso_mensual for familiar in familiares)]
+        for familiar in familiares[:max_familiares]:
+            fila += [getattr(familiar, atributo) for _, atributo in COLUMNAS_FAMILIAR]
+        fila += [None] * (len(COLUMNAS_FAMILIAR) * (max_familiares - len(familiares)))
+        yield fila
+
+
+def _maximo_familiares(queryset):
+    resultado = queryset.order_by().annotate(conteo=Count('familiares')).aggregate(maximo=Max('conteo'))
+    return resultado['maximo'] or 0
+
+
+# ---------- CSV ----------
+
+def _celda_csv(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, bool):
+        return 'Sí' if valor else 'No'
+    if isinstance(valor, date):
+        return valor.isoformat()
+    valor = str(valor)
+    # Evita que Excel interprete texto del usuario como fórmula
+    if valor[:1] in ('=', '+', '-', '@') and not _es_numero(valor):
+        return "'" + valor
+    return valor
+
+
+def _es_numero(texto):
+    try:
+        float(texto)
+    except ValueError:
+        return False
+    return True
+
+
+def _bloques_csv(queryset, max_familiares):
+    """Texto CSV en bloques de ~TAMANO_BLOQUE bytes"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    # BOM para que Excel detecte UTF-8
+    buffer.write('\ufeff')
+    escritor.writerow(encabezado(max_familiares))
+    for fila in filas_visitas(queryset, max_familiares):
+        escritor.writerow([_celda_csv(valor) for valor in fila])
+        if buffer.tell() >= TAMANO_BLOQUE:
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode('utf-8')
+
+
+# ---------- XLSX ----------
+
+def _bloques_xlsx(queryset, max_familiares):
+    """
+    El XLSX es un zip y no se puede enviar fila por fila: openpyxl en modo
+    write_only escribe las filas a disco y el archivo se envía en bloques.
+    """
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise serializers.ValidationError('Para exportar XLSX se requiere instalar openpyxl.')
+
+    libro = Workbook(write_only=True)
+    hoja = libro.create_sheet('Visitas')
+    hoja.append(encabezado(max_familiares))
+    for fila in filas_visitas(queryset, max_familiares):
+        hoja.append(fila)
+
+    archivo = tempfile.TemporaryFile()
+    libro.save(archivo)
+    archivo.seek(0)
+
+    def leer():
+        with archivo:
+            while bloque := archivo.read(TAMANO_BLOQUE):
+                yield bloque
+
+    return leer()
+
+
+# ---------- Respuesta ----------
+
+def _para_asgi(bloques):
+    """
+    Bajo ASGI Django acumula en memoria los iteradores síncronos antes de
+    enviarlos: se entregan como iterador async, leyendo cada bloque en el
+    hilo del request (el cursor de la base sigue en la misma conexión).
+    """
+    siguiente = sync_to_async(next)
+
+    async def iterador():
+        while (bloque := await siguiente(bloques, None)) is not None:
+            yield bloque
+
+    return iterador()
+
+
+def exportar_visitas(queryset, formato, request):
+    """StreamingHttpResponse con las visitas del queryset (ya filtrado y ordenado)"""
+    if formato not in FORMATOS:
+        raise serializers.ValidationError(f"Formato no soportado. Use {' o '.join(FORMATOS)}.")
+
+    max_familiares = _maximo_familiares(queryset)
+    if formato == 'csv':
+        bloques, content_type = _bloques_csv(queryset, max_familiares), 'text/csv; charset=utf-8'
+    else:
+        bloques = _bloques_xlsx(queryset, max_familiares)
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+    if isinstance(request, ASGIRequest):
+        bloques = _para_asgi(bloques)
+    response = StreamingHttpResponse(bloques, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="visitas_{date.today():%Y%m%d}.{formato}"'
+    return response
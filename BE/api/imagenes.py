@@ -0,0 +1,144 @@
+import hashlib
+import io
+import logging
+import posixpath
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .cache_respuestas import etiqueta_lista, etiqueta_objeto, invalidar
+
+logger = logging.getLogger(__name__)
+
+
+# ============= VARIANTES DE IMÁGENES =============
+
+# nombre -> lado mayor en píxeles
+TAMANOS = {
+    'thumb': 160,
+    'medium': 480,
+    'large': 1080,
+}
+CALIDAD_WEBP = 80
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='variantes')
+
+
+def _hash_contenido(archivo):
+    # Con los parámetros de codificación: si cambian, cambian los nombres y
+    # las variantes servidas como inmutables nunca cambian de contenido
+    sha = hashlib.sha256(f'{sorted(TAMANOS.items())}|{CALIDAD_WEBP}'.encode())
+    for chunk in archivo.chunks():
+        sha.update(chunk)
+    return sha.hexdigest()[:16]
+
+
+def generar_variantes(campo, prefijo, sobrescribir=False):
+    """
+    Genera las variantes WebP de un ImageField y las guarda junto al original
+    (carpeta 'variantes/') con `prefijo` (modelo y pk) y el hash del contenido
+    en el nombre. El prefijo evita que dos registros con la misma imagen
+    compartan archivos: borrar las variantes de uno rompería las del otro.
+    Devuelve {'original': nombre, 'thumb': ruta, 'medium': ruta, 'large': ruta}.
+    """
+    campo.open('rb')
+    try:
+        digest = _hash_contenido(campo)
+        campo.seek(0)
+        with Image.open(campo) as imagen:
+            imagen = ImageOps.exif_transpose(imagen)
+            if imagen.mode not in ('RGB', 'RGBA'):
+                imagen = imagen.convert('RGBA' if 'transparency' in imagen.info else 'RGB')
+
+            carpeta = posixpath.join(posixpath.dirname(campo.name), 'variantes')
+            variantes = {'original': campo.name}
+            for nombre, lado in TAMANOS.items():
+                copia = imagen.copy()
+                copia.thumbnail((lado, lado), Image.LANCZOS)
+                salida = io.BytesIO()
+                copia.save(salida, format='WEBP', quality=CALIDAD_WEBP, method=4)
+
+                ruta = posixpath.join(carpeta, f'{prefijo}_{digest}_{nombre}.webp')
+                existe = default_storage.exists(ruta)
+                if existe and sobrescribir:
+                    default_storage.delete(ruta)
+                if not existe or sobrescribir:
+                    ruta = default_storage.save(ruta, ContentFile(salida.getvalue()))
+                variantes[nombre] = ruta
+    finally:
+        campo.close()
+    return variantes
+
+
+def borrar_variantes(variantes):
+    for nombre in TAMANOS:
+        ruta = (variantes or {}).get(nombre)
+        if ruta and default_storage.exists(ruta):
+            default_storage.delete(ruta)
+
+
+def variantes_pendientes(instancia):
+    """True si la imagen cambió desde la última generación de variantes"""
+    nombre = instancia.imagen.name if instancia.imagen else None
+    return (instancia.imagen_variantes or {}).get('original') != nombre
+
+
+def actualizar_variantes(modelo, pk, regenerar=False):
+    """
+    Genera (o limpia) las variantes de una instancia y las persiste.
+    Con regenerar=True se vuelven a codificar aunque estén al día.
+    """
+    instancia = modelo.objects.filter(pk=pk).first()
+    if instancia is None or not (regenerar or variantes_pendientes(instancia)):
+        return
+
+    anteriores = instancia.imagen_variantes
+    prefijo = f'{modelo._meta.model_name}_{pk}'
+    variantes = {}
+    if instancia.imagen:
+        variantes = generar_variantes(instancia.imagen, prefijo, sobrescribir=regenerar)
+    # update() para no volver a disparar post_save; la fecha cambia el ETag
+    modelo.objects.filter(pk=pk).update(
+        imagen_variantes=variantes, fecha_actualizacion=timezone.now()
+    )
+    recurso = modelo._meta.model_name
+    invalidar(etiqueta_lista(recurso), etiqueta_objeto(recurso, pk))
+
+    # Solo se borran archivos propios: los nombres sin prefijo (anteriores a
+    # él) pueden estar compartidos con otro registro y se dejan
+    rutas_nuevas = set(variantes.values())
+    borrar_variantes({
+        nombre: ruta for nombre, ruta in (anteriores or {}).items()
+        if ruta not in rutas_nuevas and posixpath.basename(ruta).startswith(f'{prefijo}_')
+    })
+
+
+def _en_segundo_plano(modelo, pk):
+    close_old_connections()
+    try:
+        actualizar_variantes(modelo, pk)
+    except Exception:
+        logger.exception('No se pudieron generar las variantes de %s %s', modelo.__name__, pk)
+    finally:
+        close_old_connections()
+
+
+def programar_variantes(instancia):
+    """
+    Agenda la generación de variantes para después del commit, fuera del
+    ciclo del request. Con VARIANTES_SINCRONAS=True se ejecuta en línea.
+    """
+    modelo, pk = type(instancia), instancia.pk
+
+    def ejecutar():
+        if getattr(settings, 'VARIANTES_SINCRONAS', False):
+            actualizar_variantes(modelo, pk)
+        else:
+            _executor.submit(_en_segundo_plano, modelo, pk)
+
+    transaction.on_commit(ejecutar)
@@ -0,0 +1,230 @@
+import csv
+import io
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+from rest_framework import serializers
+
+from .busqueda import actualizar_vector_busqueda
+from .cache_respuestas import etiqueta_lista, invalidar
+from .models import CustomUser, Expediente
+
+
+# ============= IMPORTACIÓN MASIVA DE ATLETAS =============
+
+TAMANO_LOTE = 500
+HILOS_HASH = 4  # pbkdf2 libera el GIL, así que los hilos sí trabajan en paralelo
+COLUMNAS = ['username', 'email', 'first_name', 'last_name', 'password',
+            'sede', 'telefono', 'genero']
+
+
+class FilaAtletaSerializer(serializers.Serializer):
+    """
+    Valida el formato de una fila. La unicidad de username/email se
+    revisa por lote (una consulta) y no fila por fila.
+    """
+    username = serializers.RegexField(r'^[\w.@+-]+\Z', max_length=150)
+    email = serializers.EmailField()
+    first_name = serializers.CharField(max_length=150)
+    last_name = serializers.CharField(max_length=150)
+    password = serializers.CharField(required=False, allow_blank=True)
+    sede = serializers.CharField(max_length=150, required=False, allow_blank=True)
+    telefono = serializers.CharField(max_length=30, required=False, allow_blank=True)
+    genero = serializers.ChoiceField(
+        choices=[('M', 'Masculino'), ('F', 'Femenino'), ('O', 'Otro')],
+        required=False,
+        allow_blank=True
+    )
+
+    def validate_email(self, value):
+        return value.lower()
+
+
+# ---------- Lectura del archivo ----------
+
+def _filas_csv(archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', newline='')
+    try:
+        for fila in csv.DictReader(texto):
+            yield {clave.strip().lower(): (valor or '').strip() for clave, valor in fila.items() if clave}
+    finally:
+        texto.detach()
+
+
+def _filas_xlsx(archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise serializers.ValidationError('Para importar XLSX se requiere instalar openpyxl.')
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        encabezado = [str(celda or '').strip().lower() for celda in next(filas, [])]
+        for valores in filas:
+            yield {
+                clave: str(valor).strip() if valor is not None else ''
+                for clave, valor in zip(encabezado, valores) if clave
+            }
+    finally:
+        libro.close()
+
+
+def leer_filas(archivo, nombre):
+    """Itera las filas del archivo sin cargarlo completo en memoria"""
+    extension = os.path.splitext(nombre)[1].lower()
+    if extension == '.csv':
+        return _filas_csv(archivo)
+    if extension == '.xlsx':
+        return _filas_xlsx(archivo)
+    raise serializers.ValidationError('Formato no soportado. Use CSV o XLSX.')
+
+
+def guardar_archivo(archivo):
+    """Copia la subida al storage para importarla en segundo plano (api/tareas.py)"""
+    extension = os.path.splitext(archivo.name)[1].lower()
+    if extension not in ('.csv', '.xlsx'):
+        raise serializers.ValidationError('Formato no soportado. Use CSV o XLSX.')
+    return default_storage.save(f'importaciones/{uuid.uuid4().hex}{extension}', archivo)
+
+
+def _lotes(iterable, tamano):
+    iterador = iter(iterable)
+    while lote := list(islice(iterador, tamano)):
+        yield lote
+
+
+# ---------- Procesamiento por lote ----------
+
+def _primer_error(errores):
+    campo, mensajes = next(iter(errores.items()))
+    return f'{campo}: {mensajes[0]}'
+
+
+def _procesar_lote(lote, vistos, hilos):
+    """
+    Valida, revisa duplicados y crea usuarios + expedientes de un lote.
+    `lote` es una lista de (número de fila, datos). Devuelve (creados, errores).
+    """
+    errores = []
+    validas = []
+    for numero, datos in lote:
+        serializer = FilaAtletaSerializer(data=datos)
+        if serializer.is_valid():
+            validas.append((numero, serializer.validated_data))
+        else:
+            errores.append((numero, datos.get('username', ''), _primer_error(serializer.errors)))
+
+    # Unicidad contra la base de datos: una consulta para todo el lote.
+    # Los correos de las filas ya vienen en minúsculas; los guardados pueden no estarlo
+    usernames = {datos['username'] for _, datos in validas}
+    emails = {datos['email'] for _, datos in validas}
+    existentes = CustomUser.objects.annotate(email_minusculas=Lower('email')).filter(
+        Q(username__in=usernames) | Q(email_minusculas__in=emails)
+    ).values_list('username', 'email')
+    vistos['username'].update(username for username, _ in existentes)
+    vistos['email'].update(email.lower() for _, email in existentes)
+
+    nuevas = []
+    for numero, datos in validas:
+        if datos['username'] in vistos['username']:
+            errores.append((numero, datos['username'], 'username: Este nombre de usuario ya existe.'))
+        elif datos['email'] in vistos['email']:
+            errores.append((numero, datos['username'], 'email: Este correo ya está registrado.'))
+        else:
+            vistos['username'].add(datos['username'])
+            vistos['email'].add(datos['email'])
+            nuevas.append((numero, datos))
+
+    if not nuevas:
+        return 0, errores
+
+    passwords = [datos.pop('password', '') or f"{datos['username']}123" for _, datos in nuevas]
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        hashes = list(pool.map(make_password, passwords))
+
+    try:
+        usuarios = _crear_lote([datos for _, datos in nuevas], hashes)
+    except IntegrityError:
+        # Un alta concurrente ocupó un username después de la revisión: el lote
+        # se revierte completo y sus filas se reportan; los lotes anteriores quedan
+        errores.extend(
+            (numero, datos['username'], 'No se guardó: el usuario se registró por otra vía durante la importación.')
+            for numero, datos in nuevas
+        )
+        return 0, errores
+
+    # bulk_create no dispara señales: actualizar el índice de búsqueda aquí
+    actualizar_vector_busqueda([usuario.id for usuario in usuarios])
+    return len(usuarios), errores
+
+
+def _crear_lote(nuevas, hashes):
+    with transaction.atomic():
+        usuarios = CustomUser.objects.bulk_create([
+            CustomUser(
+                username=datos['username'],
+                email=datos['email'],
+                first_name=datos['first_name'],
+                last_name=datos['last_name'],
+                sede=datos.get('sede') or None,
+                telefono=datos.get('telefono') or None,
+                rol='user',
+                activo=True,
+                password=password_hash,
+            )
+            for datos, password_hash in zip(nuevas, hashes)
+        ])
+        # Igual que crear-atleta: el expediente se crea si viene el género
+        Expediente.objects.bulk_create([
+            Expediente(user=usuario, genero=datos['genero'], activo=True)
+            for usuario, datos in zip(usuarios, nuevas)
+            if datos.get('genero')
+        ])
+    return usuarios
+
+
+def _guardar_reporte(errores):
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(['fila', 'username', 'error'])
+    escritor.writerows(errores)
+    nombre = f'reportes_importacion/{uuid.uuid4().hex}.csv'
+    return default_storage.save(nombre, ContentFile(salida.getvalue().encode('utf-8')))
+
+
+def importar_atletas(archivo, nombre, tamano_lote=TAMANO_LOTE, hilos=HILOS_HASH, al_avanzar=None):
+    """
+    Importa atletas desde un CSV/XLSX con columnas COLUMNAS (password,
+    sede, telefono y genero son opcionales). Cada lote se inserta en su
+    propia transacción; las filas con error se reportan y no detienen el resto.
+    al_avanzar(filas, creados) se llama después de cada lote.
+    """
+    vistos = {'username': set(), 'email': set()}
+    creados = 0
+    errores = []
+
+    filas = enumerate(leer_filas(archivo, nombre), start=2)  # fila 1 = encabezado
+    for lote in _lotes(filas, tamano_lote):
+        creados_lote, errores_lote = _procesar_lote(lote, vistos, hilos)
+        creados += creados_lote
+        errores.extend(errores_lote)
+        if al_avanzar:
+            al_avanzar(lote[-1][0] - 1, creados)
+
+    if creados:
+        invalidar(etiqueta_lista('expediente'))
+
+    return {
+        'creados': creados,
+        'errores': errores,
+        'reporte': _guardar_reporte(errores) if errores else None,
+    }
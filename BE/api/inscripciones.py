@@ -0,0 +1,78 @@
+from django.db import transaction
+
+from .cache_respuestas import etiqueta_lista, etiqueta_objeto, invalidar
+from .models import CustomUser, ProyectoUsuario
+
+
+# ============= INSCRIPCIÓN MASIVA EN PROYECTOS =============
+
+AGREGADO = 'agregado'
+YA_INSCRITO = 'ya_inscrito'
+REMOVIDO = 'removido'
+NO_INSCRITO = 'no_inscrito'
+NO_ENCONTRADO = 'no_encontrado'
+
+
+def resolver_usuarios(usuarios_ids=None, sede=None, rol=None):
+    """
+    Ids de usuarios a partir de una lista explícita y/o filtros, en una consulta.
+    Devuelve (ids en el orden solicitado, ids que existen).
+    """
+    queryset = CustomUser.objects.all()
+    if usuarios_ids is not None:
+        queryset = queryset.filter(id__in=usuarios_ids)
+    if sede:
+        queryset = queryset.filter(sede=sede)
+    if rol:
+        queryset = queryset.filter(rol=rol)
+
+    encontrados = set(queryset.values_list('id', flat=True))
+    if usuarios_ids is None:
+        return sorted(encontrados), encontrados
+    return list(dict.fromkeys(usuarios_ids)), encontrados
+
+
+def _inscritos(proyecto, ids):
+    return set(
+        ProyectoUsuario.objects.filter(proyecto=proyecto, usuario_id__in=ids)
+        .values_list('usuario_id', flat=True)
+    )
+
+
+@transaction.atomic
+def inscribir_usuarios(proyecto, solicitados, encontrados):
+    """
+    Inscribe los usuarios que aún no están en el proyecto con un solo INSERT.
+    ignore_conflicts protege el unique_together ante inscripciones simultáneas.
+    """
+    inscritos = _inscritos(proyecto, encontrados)
+    nuevos = sorted(encontrados - inscritos)
+    if nuevos:
+        ProyectoUsuario.objects.bulk_create(
+            [ProyectoUsuario(proyecto=proyecto, usuario_id=usuario_id) for usuario_id in nuevos],
+            ignore_conflicts=True,
+        )
+        # bulk_create no dispara post_save
+        invalidar(etiqueta_lista('proyecto'), etiqueta_objeto('proyecto', proyecto.id))
+
+    def resultado(usuario_id):
+        if usuario_id not in encontrados:
+            return NO_ENCONTRADO
+        return YA_INSCRITO if usuario_id in inscritos else AGREGADO
+
+    return {usuario_id: resultado(usuario_id) for usuario_id in solicitados}
+
+
+@transaction.atomic
+def remover_usuarios(proyecto, solicitados, encontrados):
+    """Elimina las inscripciones existentes con un solo DELETE"""
+    inscritos = _inscritos(proyecto, encontrados)
+    if inscritos:
+        ProyectoUsuario.objects.filter(proyecto=proyecto, usuario_id__in=inscritos).delete()
+
+    def resultado(usuario_id):
+        if usuario_id not in encontrados:
+            return NO_ENCONTRADO
+        return REMOVIDO if usuario_id in inscritos else NO_INSCRITO
+
+    return {usuario_id: resultado(usuario_id) for usuario_id in solicitados}
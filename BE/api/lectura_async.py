@@ -0,0 +1,118 @@
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .views import ExpedienteViewSet, ProyectoViewSet, VisitaViewSet
+
+
+# ============= LECTURAS ASYNC =============
+#
+# Variantes async de las lecturas más consultadas (/api/async/...), para
+# servir con uvicorn (config/asgi.py) sin ocupar un hilo por request mientras
+# PostgreSQL responde. Reutilizan get_queryset/filter_queryset, serializers y
+# paginación de los ViewSets; solo cambia cómo se ejecutan las consultas.
+# Los serializers no consultan la base (todo viene en select/prefetch_related),
+# así que serializar dentro del event loop es seguro.
+# No pasan por la caché de respuestas ni responden 304.
+# Las consultas de un mismo request NO corren en paralelo: el ORM async las
+# manda todas al hilo de sync_to_async de la conexión, una tras otra. La
+# ganancia es solo no bloquear el worker mientras espera a la base.
+
+def _http(response):
+    """Response de DRF -> HttpResponse con el JSON ya renderizado"""
+    http = HttpResponse(
+        JSONRenderer().render(response.data),
+        status=response.status_code,
+        content_type='application/json',
+    )
+    for nombre, valor in response.items():
+        if nombre.lower() != 'content-type':
+            http[nombre] = valor
+    return http
+
+
+def _autorizar(vista):
+    # El JWT puede consultar el estado del usuario: va en un hilo
+    vista.perform_authentication(vista.request)
+    vista.check_permissions(vista.request)
+
+
+class LecturaAsyncView(View):
+    """
+    Base: instancia el ViewSet para usar su configuración y maneja errores como DRF.
+    Cada subclase define `async responder(vista, **kwargs)` -> Response.
+    """
+    viewset = None
+    accion = None
+    lecturas_en_replica = True
+    http_method_names = ['get', 'head', 'options']
+
+    async def get(self, request, **kwargs):
+        acciones = {'get': self.accion, 'head': self.accion}
+        vista = self.viewset(action_map=acciones, args=(), kwargs=kwargs, format_kwarg=None)
+        # Siempre JSON: el API navegable consulta la base al armar formularios
+        vista.renderer_classes = [JSONRenderer]
+        vista.request = vista.initialize_request(request, **kwargs)
+        try:
+            await sync_to_async(_autorizar)(vista)
+            response = await self.responder(vista, **kwargs)
+        except exceptions.APIException as exc:
+            response = vista.handle_exception(exc)
+        return _http(response)
+
+
+class ListaAsyncView(LecturaAsyncView):
+    accion = 'list'
+
+    async def responder(self, vista):
+        queryset = vista.filter_queryset(vista.get_queryset())
+        pagina = await vista.paginator.apaginate_queryset(queryset, vista.request, view=vista)
+        serializer = vista.get_serializer(pagina, many=True)
+        return vista.paginator.get_paginated_response(serializer.data)
+
+
+class DetalleAsyncView(LecturaAsyncView):
+    accion = 'retrieve'
+
+    async def responder(self, vista, pk):
+        return Response(self.serializar(vista, await self.obtener(vista, pk)))
+
+    async def obtener(self, vista, pk):
+        """Equivalente async de get_object()"""
+        queryset = vista.filter_queryset(vista.get_queryset())
+        try:
+            objeto = await queryset.aget(pk=pk)
+        except (queryset.model.DoesNotExist, TypeError, ValueError, ValidationError):
+            raise exceptions.NotFound()
+        vista.check_object_permissions(vista.request, objeto)
+        return objeto
+
+    def serializar(self, vista, objeto):
+        return vista.get_serializer(objeto).data
+
+
+class ResumenExpedienteAsyncView(DetalleAsyncView):
+    """Misma respuesta que ExpedienteViewSet.resumen"""
+    viewset = ExpedienteViewSet
+    accion = 'resumen'
+
+    def serializar(self, vista, expediente):
+        return {
+            'expediente': vista.get_serializer(expediente).data,
+            'estadisticas': {
+                'total_visitas': expediente.total_visitas,
+                'ultima_visita': expediente.ultima_visita,
+            }
+        }
+
+
+expediente_lista = ListaAsyncView.as_view(viewset=ExpedienteViewSet)
+expediente_detalle = DetalleAsyncView.as_view(viewset=ExpedienteViewSet)
+expediente_resumen = ResumenExpedienteAsyncView.as_view()
+visita_lista = ListaAsyncView.as_view(viewset=VisitaViewSet)
+visita_detalle = DetalleAsyncView.as_view(viewset=VisitaViewSet)
+proyecto_lista = ListaAsyncView.as_view(viewset=ProyectoViewSet)
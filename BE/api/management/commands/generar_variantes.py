@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.imagenes import actualizar_variantes, variantes_pendientes
+from api.models import Expediente, Proyecto
+
+
+class Command(BaseCommand):
+    help = 'Genera las variantes WebP que falten en expedientes y proyectos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--todas', action='store_true',
+                            help='Regenerar también las variantes existentes')
+
+    def handle(self, *args, **options):
+        for modelo in (Expediente, Proyecto):
+            generadas = errores = 0
+            queryset = modelo.objects.exclude(imagen='').exclude(imagen__isnull=True)
+
+            for instancia in queryset.only('id', 'imagen', 'imagen_variantes').iterator(chunk_size=200):
+                if not options['todas'] and not variantes_pendientes(instancia):
+                    continue
+                try:
+                    # --todas sobrescribe los archivos: no basta con vaciar el JSON
+                    actualizar_variantes(modelo, instancia.pk, regenerar=options['todas'])
+                    generadas += 1
+                except Exception as error:
+                    errores += 1
+                    self.stderr.write(f'{modelo.__name__} {instancia.pk}: {error}')
+
+            self.stdout.write(self.style.SUCCESS(
+                f'{modelo._meta.verbose_name_plural}: {generadas} generadas, {errores} con error'
+            ))
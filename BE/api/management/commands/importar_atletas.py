@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework import serializers
+
+from api.importacion import HILOS_HASH, TAMANO_LOTE, importar_atletas
+
+
+class Command(BaseCommand):
+    help = 'Importa atletas (usuario + expediente) desde un archivo CSV o XLSX'
+
+    def add_arguments(self, parser):
+        parser.add_argument('archivo', help='Ruta al archivo .csv o .xlsx')
+        parser.add_argument('--lote', type=int, default=TAMANO_LOTE,
+                            help='Filas por transacción')
+        parser.add_argument('--hilos', type=int, default=HILOS_HASH,
+                            help='Hilos para calcular los hashes de contraseña')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['archivo'], 'rb') as archivo:
+                resultado = importar_atletas(
+                    archivo, options['archivo'],
+                    tamano_lote=options['lote'], hilos=options['hilos'],
+                )
+        except OSError as error:
+            raise CommandError(f'No se pudo abrir el archivo: {error}')
+        except serializers.ValidationError as error:
+            raise CommandError(error.detail[0])
+
+        self.stdout.write(self.style.SUCCESS(f"Atletas creados: {resultado['creados']}"))
+        if resultado['errores']:
+            self.stdout.write(self.style.WARNING(
+                f"Filas con error: {len(resultado['errores'])} "
+                f"(reporte en MEDIA_ROOT/{resultado['reporte']})"
+            ))
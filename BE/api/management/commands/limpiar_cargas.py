@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from api.cargas import limpiar_cargas_vencidas
+
+
+class Command(BaseCommand):
+    help = 'Elimina las subidas por partes abandonadas y sus archivos temporales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--horas', type=int, default=24,
+                            help='Antigüedad mínima sin actividad')
+
+    def handle(self, *args, **options):
+        eliminadas = limpiar_cargas_vencidas(options['horas'])
+        self.stdout.write(self.style.SUCCESS(f'Cargas eliminadas: {eliminadas}'))
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from api.management.commands.prueba_carga import PERCENTILES, percentil
+from api.models import Expediente, Visita
+
+
+# ============= MEDICIÓN DE CONEXIONES =============
+#
+# Simula requests concurrentes contra PostgreSQL con cada perfil de
+# DB_CONEXIONES (config/settings.py). Cada perfil usa un alias temporal con la
+# configuración de 'default'; entre requests se envían request_started y
+# request_finished, igual que el handler de Django, para que las conexiones
+# se cierren, reutilicen o devuelvan al pool como en producción.
+
+PERFILES = ('nueva', 'persistente', 'pool')
+
+
+class Command(BaseCommand):
+    help = 'Compara la latencia por request con conexiones nuevas, persistentes y con pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hilos', type=int, default=8, help='Requests concurrentes (hilos de un worker)')
+        parser.add_argument('--requests', type=int, default=200, help='Requests por hilo')
+        parser.add_argument('--pool-max', type=int, help='Tamaño máximo del pool (por defecto, --hilos)')
+        parser.add_argument('--perfiles', default=','.join(PERFILES))
+
+    def handle(self, *args, **options):
+        if connections[DEFAULT_DB_ALIAS].vendor != 'postgresql':
+            raise CommandError('La comparación de conexiones solo aplica a PostgreSQL.')
+        perfiles = [perfil.strip() for perfil in options['perfiles'].split(',') if perfil.strip()]
+        desconocidos = set(perfiles) - set(PERFILES)
+        if desconocidos:
+            raise CommandError(f"Perfiles desconocidos: {', '.join(sorted(desconocidos))}")
+        if 'pool' in perfiles:
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                raise CommandError('El perfil pool requiere psycopg[pool] (pip install "psycopg[pool]").')
+
+        self.stdout.write(f"{options['hilos']} hilos x {options['requests']} requests por perfil")
+        self.stdout.write(
+            f"{'perfil':<12} {'req/s':>8} " + ' '.join(f'{f"p{p} ms":>9}' for p in PERCENTILES)
+            + f" {'conexiones':>11}"
+        )
+        for perfil in perfiles:
+            alias = f'medir_{perfil}'
+            connections.settings[alias] = self._configuracion(perfil, options)
+            try:
+                tiempos, pids, transcurrido = self._medir(alias, options)
+            finally:
+                if perfil == 'pool':
+                    connections[alias].close_pool()
+                del connections.settings[alias]
+
+            tiempos.sort()
+            self.stdout.write(
+                f'{perfil:<12} {len(tiempos) / transcurrido:>8.1f} '
+                + ' '.join(f'{percentil(tiempos, p):>9.2f}' for p in PERCENTILES)
+                + f' {len(pids):>11}'
+            )
+
+    def _configuracion(self, perfil, options):
+        configuracion = dict(connections.settings[DEFAULT_DB_ALIAS])
+        opciones = {clave: valor for clave, valor in configuracion['OPTIONS'].items() if clave != 'pool'}
+        configuracion.update(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=False, OPTIONS=opciones)
+        if perfil == 'persistente':
+            configuracion.update(CONN_MAX_AGE=None, CONN_HEALTH_CHECKS=True)
+        elif perfil == 'pool':
+            tamano = options['pool_max'] or options['hilos']
+            configuracion.update(CONN_HEALTH_CHECKS=True, OPTIONS={
+                **opciones, 'pool': {'min_size': min(2, tamano), 'max_size': tamano, 'timeout': 30},
+            })
+        return configuracion
+
+    def _medir(self, alias, options):
+        tiempos, pids = [], set()
+        lock = threading.Lock()
+
+        def hilo():
+            propios, propios_pids = [], set()
+            try:
+                for _ in range(options['requests']):
+                    request_started.send(sender=self.__class__)
+                    inicio = time.perf_counter()
+                    propios_pids.add(self._request(alias))
+                    propios.append((time.perf_counter() - inicio) * 1000)
+                    request_finished.send(sender=self.__class__)
+            finally:
+                connections[alias].close()
+            with lock:
+                tiempos.extend(propios)
+                pids.update(propios_pids)
+
+        hilos = [threading.Thread(target=hilo) for _ in range(options['hilos'])]
+        inicio = time.perf_counter()
+        for trabajador in hilos:
+            trabajador.start()
+        for trabajador in hilos:
+            trabajador.join()
+        return tiempos, pids, time.perf_counter() - inicio
+
+    def _request(self, alias):
+        """Consultas de un listado típico; devuelve el pid del backend para contar conexiones"""
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT pg_backend_pid()')
+            pid = cursor.fetchone()[0]
+        list(Expediente.objects.using(alias).select_related('user').order_by('id')[:50])
+        Visita.objects.using(alias).filter(fecha_visita__isnull=False).count()
+        return pid
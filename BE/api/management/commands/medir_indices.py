@@ -0,0 +1,115 @@
+import re
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+
+from api.datos_sinteticos import PREFIJO, SEDES, sembrar
+from api.models import CustomUser, Expediente, Proyecto, Visita
+
+
+# Índices de la migración 0006 (se eliminan dentro de la transacción para medir "antes")
+INDICES = [
+    'usuario_rol_activo_sede_idx',
+    'expediente_activo_genero_idx',
+    'inscripcion_activa_idx',
+    'visita_expediente_fecha_idx',
+    'visita_fecha_idx',
+    'visita_cedula_trgm',
+]
+TIEMPO = re.compile(r'Execution Time: ([\d.]+) ms')
+
+
+class Command(BaseCommand):
+    help = (
+        'Compara planes y tiempos de las consultas de la API con y sin los índices '
+        'compuestos/parciales. Siembra datos en una transacción que se revierte al final.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--atletas', type=int, default=5000)
+        parser.add_argument('--visitas', type=int, default=6, help='Máximo de visitas por atleta')
+        parser.add_argument('--repeticiones', type=int, default=5,
+                            help='Ejecuciones por consulta (se reporta la más rápida)')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Los planes de consulta solo se comparan en PostgreSQL.')
+
+        with transaction.atomic():
+            self.stdout.write('Sembrando datos...')
+            referencias = self._sembrar(options['atletas'], options['visitas'])
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+            consultas = self._consultas(referencias)
+            despues = {nombre: self._medir(qs, options['repeticiones']) for nombre, qs in consultas}
+
+            with connection.cursor() as cursor:
+                for indice in INDICES:
+                    cursor.execute(f'DROP INDEX IF EXISTS {connection.ops.quote_name(indice)}')
+            antes = {nombre: self._medir(qs, options['repeticiones']) for nombre, qs in consultas}
+
+            self._reportar(consultas, antes, despues, options['verbosity'])
+            # No dejar datos de prueba ni índices eliminados
+            transaction.set_rollback(True)
+
+    # ---------- Datos ----------
+
+    def _sembrar(self, cantidad, visitas_por_atleta):
+        sembrar(atletas=cantidad, visitas=visitas_por_atleta, proyectos=20, semilla=2025)
+        expedientes = Expediente.objects.filter(user__username__startswith=PREFIJO).order_by('id')
+        return {
+            'expediente': expedientes[expedientes.count() // 2],
+            'proyecto': Proyecto.objects.filter(nombre__startswith=PREFIJO).order_by('id').first(),
+            'hoy': date.today(),
+        }
+
+    def _consultas(self, ref):
+        hoy = ref['hoy']
+        desde = hoy - timedelta(days=180)
+        return [
+            ('usuarios ?rol=&activo=&sede=',
+             CustomUser.objects.filter(rol='staff', activo=True, sede=SEDES[0]).order_by('id')[:51]),
+            ('expedientes ?activo=&genero=',
+             Expediente.objects.filter(activo=False, genero='O').order_by('id')[:51]),
+            ('visitas ?expediente_id=&fecha_desde=',
+             Visita.objects.filter(expediente=ref['expediente'], fecha_visita__gte=desde)
+             .order_by('-fecha_visita', 'id')[:51]),
+            ('visitas ?fecha_desde=&fecha_hasta=',
+             Visita.objects.filter(fecha_visita__gte=desde, fecha_visita__lte=hoy)
+             .order_by('-fecha_visita', 'id')[:51]),
+            ('admin: cédula icontains',
+             Visita.objects.filter(cedula__icontains='12345')[:100]),
+            ('participantes activos del proyecto',
+             Proyecto.objects.filter(id=ref['proyecto'].id).annotate(
+                 activos=Count('proyectousuario', filter=Q(proyectousuario__activo=True)))),
+        ]
+
+    # ---------- Medición ----------
+
+    def _medir(self, queryset, repeticiones):
+        mejor, plan = None, ''
+        for _ in range(repeticiones):
+            plan = queryset.explain(analyze=True, buffers=True)
+            coincidencia = TIEMPO.search(plan)
+            tiempo = float(coincidencia.group(1)) if coincidencia else 0.0
+            mejor = tiempo if mejor is None else min(mejor, tiempo)
+        return mejor, plan
+
+    def _reportar(self, consultas, antes, despues, verbosidad):
+        self.stdout.write('')
+        self.stdout.write(f"{'consulta':<40} {'sin índices':>14} {'con índices':>14} {'mejora':>8}")
+        for nombre, _ in consultas:
+            tiempo_antes, plan_antes = antes[nombre]
+            tiempo_despues, plan_despues = despues[nombre]
+            mejora = f'{tiempo_antes / tiempo_despues:.1f}x' if tiempo_despues else '-'
+            self.stdout.write(
+                f'{nombre:<40} {tiempo_antes:>11.3f} ms {tiempo_despues:>11.3f} ms {mejora:>8}'
+            )
+            if verbosidad > 1:
+                self.stdout.write(self.style.WARNING('  sin índices:'))
+                self.stdout.write('    ' + plan_antes.replace('\n', '\n    '))
+                self.stdout.write(self.style.SUCCESS('  con índices:'))
+                self.stdout.write('    ' + plan_despues.replace('\n', '\n    '))
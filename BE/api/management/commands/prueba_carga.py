@@ -0,0 +1,200 @@
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.datos_sinteticos import PREFIJO
+
+
+# ============= PRUEBA DE CARGA =============
+#
+# Reproduce el recorrido del FE contra un servidor ya levantado:
+#   login -> listado de expedientes (sigue `next` como apiService.getData)
+#   -> detalle del expediente -> visitas del expediente -> detalle de visita
+#   -> reporte (estadísticas)
+# Pensado para datos de `manage.py seed_endurance`. Con --async las lecturas
+# van a las variantes /api/async/ (comparar ambas bajo uvicorn config.asgi:application).
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano sobre valores ordenados"""
+    if not valores:
+        return 0.0
+    indice = max(math.ceil(p / 100 * len(valores)) - 1, 0)
+    return valores[indice]
+
+
+class Cliente:
+    """Conexión keep-alive de un usuario virtual (como el navegador)"""
+
+    def __init__(self, url, timeout):
+        partes = urlsplit(url)
+        clase = http.client.HTTPSConnection if partes.scheme == 'https' else http.client.HTTPConnection
+        self._nueva = lambda: clase(partes.hostname, partes.port, timeout=timeout)
+        self.conexion = self._nueva()
+        self.token = None
+        self.mediciones = defaultdict(list)
+        self.errores = defaultdict(int)
+
+    def pedir(self, nombre, metodo, ruta, cuerpo=None):
+        encabezados = {'Accept': 'application/json'}
+        if cuerpo is not None:
+            cuerpo = json.dumps(cuerpo)
+            encabezados['Content-Type'] = 'application/json'
+        if self.token:
+            encabezados['Authorization'] = f'Bearer {self.token}'
+
+        inicio = time.perf_counter()
+        try:
+            self.conexion.request(metodo, ruta, body=cuerpo, headers=encabezados)
+            respuesta = self.conexion.getresponse()
+            contenido = respuesta.read()
+        except (OSError, http.client.HTTPException):
+            self.conexion.close()
+            self.conexion = self._nueva()
+            self.errores[nombre] += 1
+            return None
+        self.mediciones[nombre].append((time.perf_counter() - inicio) * 1000)
+
+        if respuesta.status >= 400:
+            self.errores[nombre] += 1
+            return None
+        return json.loads(contenido) if contenido else {}
+
+
+def _ruta(url):
+    partes = urlsplit(url)
+    return f'{partes.path}?{partes.query}' if partes.query else partes.path
+
+
+def _resultados(datos):
+    """Listas paginadas ({'results': [...]}) o sin paginar"""
+    return datos.get('results', []) if isinstance(datos, dict) else datos
+
+
+def recorrido(cliente, aleatorio, max_paginas, base='/api'):
+    """Una iteración del recorrido del FE; `base` es /api o /api/async para las lecturas"""
+    expedientes = []
+    datos = cliente.pedir('expedientes: lista', 'GET', f'{base}/expedientes/')
+    paginas = 1
+    while datos is not None:
+        expedientes.extend(_resultados(datos))
+        siguiente = datos.get('next') if isinstance(datos, dict) else None
+        if not siguiente or paginas >= max_paginas:
+            break
+        datos = cliente.pedir('expedientes: lista', 'GET', _ruta(siguiente))
+        paginas += 1
+
+    if expedientes:
+        expediente_id = aleatorio.choice(expedientes)['id']
+        cliente.pedir('expedientes: detalle', 'GET', f'{base}/expedientes/{expediente_id}/')
+        visitas = cliente.pedir('visitas: por expediente', 'GET', f'{base}/visitas/?expediente_id={expediente_id}')
+        visitas = _resultados(visitas) if visitas is not None else []
+        if visitas:
+            cliente.pedir('visitas: detalle', 'GET', f"{base}/visitas/{aleatorio.choice(visitas)['id']}/")
+
+    cliente.pedir('estadisticas', 'GET', '/api/estadisticas/')
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga con el recorrido real del FE; reporta p50/p95/p99 y throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000')
+        parser.add_argument('--usuarios', type=int, default=10, help='Usuarios virtuales concurrentes')
+        parser.add_argument('--duracion', type=int, default=30, help='Segundos de carga')
+        parser.add_argument('--username', default=f'{PREFIJO}staff_{{n}}',
+                            help='Usuario de login; {n} se reemplaza por el número de usuario virtual')
+        parser.add_argument('--cuentas', type=int, default=10,
+                            help='Cantidad de cuentas distintas ({n} va de 0 a cuentas-1)')
+        parser.add_argument('--password', default='endurance123')
+        parser.add_argument('--paginas', type=int, default=20,
+                            help='Máximo de páginas del listado que sigue cada iteración')
+        parser.add_argument('--semilla', type=int, default=42)
+        parser.add_argument('--timeout', type=float, default=30)
+        parser.add_argument('--async', dest='asincrono', action='store_true',
+                            help='Lecturas por /api/async/ en lugar de los ViewSets síncronos')
+        parser.add_argument('--json', help='Guardar el reporte en este archivo')
+
+    def handle(self, *args, **options):
+        clientes = [Cliente(options['url'], options['timeout']) for _ in range(options['usuarios'])]
+        fin = time.monotonic() + options['duracion']
+        base = '/api/async' if options['asincrono'] else '/api'
+
+        def usuario_virtual(numero, cliente):
+            aleatorio = random.Random(options['semilla'] + numero)
+            username = options['username'].format(n=numero % options['cuentas'])
+            sesion = cliente.pedir('auth: login', 'POST', '/api/auth/login/', {
+                'username': username, 'password': options['password'],
+            })
+            if not sesion or 'tokens' not in sesion:
+                return
+            cliente.token = sesion['tokens']['access']
+            while time.monotonic() < fin:
+                recorrido(cliente, aleatorio, options['paginas'], base)
+
+        self.stdout.write(
+            f"{options['usuarios']} usuarios virtuales durante {options['duracion']} s contra {options['url']}{base}/"
+        )
+        inicio = time.monotonic()
+        hilos = [
+            threading.Thread(target=usuario_virtual, args=(numero, cliente), daemon=True)
+            for numero, cliente in enumerate(clientes)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        transcurrido = time.monotonic() - inicio
+
+        mediciones, errores = defaultdict(list), defaultdict(int)
+        for cliente in clientes:
+            for nombre, tiempos in cliente.mediciones.items():
+                mediciones[nombre].extend(tiempos)
+            for nombre, cantidad in cliente.errores.items():
+                errores[nombre] += cantidad
+        if not mediciones:
+            raise CommandError('Ninguna solicitud tuvo respuesta. ¿Está levantado el servidor?')
+
+        reporte = self._reporte(mediciones, errores, transcurrido)
+        self._imprimir(reporte)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as salida:
+                json.dump(reporte, salida, indent=2)
+
+    def _reporte(self, mediciones, errores, transcurrido):
+        reporte = {'duracion_s': round(transcurrido, 2), 'endpoints': {}}
+        for nombre in sorted(set(mediciones) | set(errores)):
+            tiempos = sorted(mediciones.get(nombre, []))
+            reporte['endpoints'][nombre] = {
+                'solicitudes': len(tiempos),
+                'errores': errores.get(nombre, 0),
+                'rps': round(len(tiempos) / transcurrido, 2),
+                **{f'p{p}_ms': round(percentil(tiempos, p), 2) for p in PERCENTILES},
+            }
+        total = sum(len(tiempos) for tiempos in mediciones.values())
+        reporte['rps_total'] = round(total / transcurrido, 2)
+        return reporte
+
+    def _imprimir(self, reporte):
+        self.stdout.write('')
+        self.stdout.write(
+            f"{'endpoint':<26} {'solic.':>7} {'errores':>7} {'req/s':>8} "
+            + ' '.join(f'{f"p{p} ms":>9}' for p in PERCENTILES)
+        )
+        for nombre, datos in reporte['endpoints'].items():
+            self.stdout.write(
+                f"{nombre:<26} {datos['solicitudes']:>7} {datos['errores']:>7} {datos['rps']:>8} "
+                + ' '.join(f"{datos[f'p{p}_ms']:>9}" for p in PERCENTILES)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Throughput total: {reporte['rps_total']} req/s en {reporte['duracion_s']} s"
+        ))
@@ -0,0 +1,62 @@
+import multiprocessing
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.trabajos import bucle_trabajador, procesar_pendientes
+
+
+class Command(BaseCommand):
+    help = 'Procesa los trabajos en segundo plano con un grupo de procesos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--procesos', type=int, default=2, help='Procesos trabajadores')
+        parser.add_argument('--intervalo', type=float, default=2.0,
+                            help='Segundos entre consultas cuando la cola está vacía')
+        parser.add_argument('--espera-cierre', type=float, default=60.0,
+                            help='Segundos para terminar el trabajo en curso al detenerse')
+        parser.add_argument('--una-vez', action='store_true',
+                            help='Procesar lo pendiente en este proceso y salir')
+
+    def handle(self, *args, **options):
+        if options['una_vez']:
+            procesados = procesar_pendientes()
+            self.stdout.write(self.style.SUCCESS(f'Trabajos procesados: {procesados}'))
+            return
+
+        # 'fork': los hijos heredan Django ya configurado. No se comparten
+        # conexiones abiertas con ellos.
+        contexto = multiprocessing.get_context('fork')
+        connections.close_all()
+        detener = contexto.Event()
+        senales = []
+        for senal in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(senal, lambda numero, marco: senales.append(numero))
+
+        def iniciar():
+            proceso = contexto.Process(target=bucle_trabajador, args=(detener, options['intervalo']), daemon=True)
+            proceso.start()
+            return proceso
+
+        procesos = [iniciar() for _ in range(options['procesos'])]
+        self.stdout.write(f"{len(procesos)} trabajadores iniciados (Ctrl+C para detener)")
+
+        while not senales:
+            for posicion, proceso in enumerate(procesos):
+                proceso.join(timeout=1 / len(procesos))
+                if not proceso.is_alive() and not senales:
+                    # Un hijo que muere (OOM, segfault) se reemplaza; su trabajo
+                    # vuelve a la cola cuando vence la reserva
+                    self.stderr.write(f'Trabajador {proceso.pid} terminó (código {proceso.exitcode}), reiniciando')
+                    procesos[posicion] = iniciar()
+
+        self.stdout.write('Deteniendo: se termina el trabajo en curso...')
+        detener.set()
+        limite = time.monotonic() + options['espera_cierre']
+        for proceso in procesos:
+            proceso.join(max(0, limite - time.monotonic()))
+            if proceso.is_alive():
+                proceso.terminate()
+        self.stdout.write(self.style.SUCCESS('Trabajadores detenidos'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from api.datos_sinteticos import PREFIJO, limpiar, sembrar
+
+
+class Command(BaseCommand):
+    help = (
+        'Genera datos sintéticos (usuarios, expedientes, visitas con datos económicos, '
+        f'familiares, proyectos e inscripciones). Los usuarios se crean con el prefijo "{PREFIJO}".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--atletas', type=int, default=1000)
+        parser.add_argument('--staff', type=int, default=10,
+                            help='Usuarios de personal (seed_staff_N) para iniciar sesión')
+        parser.add_argument('--visitas', type=int, default=4, help='Máximo de visitas por atleta')
+        parser.add_argument('--familiares', type=int, default=3, help='Máximo de familiares por visita')
+        parser.add_argument('--proyectos', type=int, default=10)
+        parser.add_argument('--semilla', type=int, default=42,
+                            help='Semilla del generador (misma semilla, mismos datos)')
+        parser.add_argument('--password', default='endurance123',
+                            help='Contraseña de todos los usuarios generados')
+        parser.add_argument('--limpiar', action='store_true',
+                            help='Eliminar antes los datos sembrados previamente')
+
+    def handle(self, *args, **options):
+        if options['limpiar']:
+            self.stdout.write(f'Registros eliminados: {limpiar()}')
+
+        conteos = sembrar(
+            atletas=options['atletas'],
+            staff=options['staff'],
+            visitas=options['visitas'],
+            familiares=options['familiares'],
+            proyectos=options['proyectos'],
+            semilla=options['semilla'],
+            password=options['password'],
+        )
+        for modelo, cantidad in conteos.items():
+            self.stdout.write(f'{modelo:<14} {cantidad:>8}')
+        self.stdout.write(self.style.SUCCESS(
+            f"Listo. Inicie sesión con {PREFIJO}staff_N / {options['password']}"
+        ))
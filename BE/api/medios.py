@@ -0,0 +1,196 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+from rest_framework.exceptions import NotAuthenticated, PermissionDenied
+
+from .models import Expediente, Visita
+from .permisions import ROLES, get_user_role
+
+
+# ============= ENTREGA DE ARCHIVOS MEDIA =============
+#
+# settings.MEDIA_ENTREGA:
+#   'python'     el worker sirve el archivo (Range, ETag y Cache-Control)
+#   'x-accel'    nginx lo sirve; ejemplo de configuración:
+#                    location /media-interno/ {
+#                        internal;
+#                        alias /ruta/a/BE/media/;
+#                    }
+#   'x-sendfile' Apache (mod_xsendfile) lo sirve desde la ruta absoluta
+
+CARPETAS_PERMITIDAS = (
+    'imagenes_perfil/', 'adjuntos_notas/', 'imagenes_proyectos/', 'reportes_importacion/', 'dossiers/',
+)
+CARPETAS_PRIVADAS = ('adjuntos_notas/', 'reportes_importacion/', 'dossiers/')
+DOSSIER = re.compile(r'^dossiers/expediente_(\d+)/')
+
+# Variantes con hash de contenido en el nombre: nunca cambian
+NOMBRE_CON_HASH = re.compile(r'(^|/)variantes/([a-z]+_\d+_)?[0-9a-f]{16}_[a-z]+\.webp$')
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+
+TAMANO_BLOQUE = 64 * 1024
+RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _ruta_segura(ruta):
+    if not ruta.startswith(CARPETAS_PERMITIDAS):
+        raise Http404
+    try:
+        return safe_join(settings.MEDIA_ROOT, ruta)
+    except SuspiciousFileOperation:
+        raise Http404
+
+
+def _propietario(ruta):
+    """id del atleta dueño de un archivo privado (None: solo lo ve el personal)"""
+    if ruta.startswith('adjuntos_notas/'):
+        return Visita.objects.filter(adjunto_notas=ruta).values_list('expediente__user_id', flat=True).first()
+    coincidencia = DOSSIER.match(ruta)
+    if coincidencia:
+        return Expediente.objects.filter(pk=coincidencia[1]).values_list('user_id', flat=True).first()
+    return None
+
+
+def verificar_acceso(request, ruta):
+    """
+    Las carpetas privadas requieren sesión: el personal ve todo y cada atleta
+    solo sus adjuntos y su dossier. Se revisa antes de delegar al proxy.
+    """
+    if not ruta.startswith(CARPETAS_PRIVADAS):
+        return
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    if get_user_role(request.user) in (ROLES['ADMIN'], ROLES['STAFF']):
+        return
+    if _propietario(ruta) != request.user.id:
+        raise PermissionDenied('No tiene acceso a este archivo.')
+
+
+def _etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+
+def _cache_control(ruta):
+    if NOMBRE_CON_HASH.search(ruta):
+        return CACHE_INMUTABLE
+    if ruta.startswith(CARPETAS_PRIVADAS):
+        return 'private, no-cache'
+    return 'public, no-cache'
+
+
+def _no_modificado(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        etiquetas = [etiqueta.strip() for etiqueta in if_none_match.split(',')]
+        return '*' in etiquetas or etag in etiquetas or f'W/{etag}' in etiquetas
+
+    desde = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return desde is not None and int(mtime) <= desde
+
+
+def _rango(request, etag, tamano):
+    """
+    (inicio, fin) del header Range si aplica, None para el archivo completo
+    o False si el rango no es satisfacible. Solo se admite un rango.
+    """
+    encabezado = request.headers.get('Range')
+    if not encabezado or tamano == 0:
+        return None
+
+    if_range = request.headers.get('If-Range')
+    if if_range is not None and if_range != etag:
+        return None
+
+    coincidencia = RANGO.match(encabezado.strip())
+    if not coincidencia:
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        inicio, fin = max(tamano - int(fin), 0), tamano - 1
+    else:
+        inicio, fin = int(inicio), min(int(fin), tamano - 1) if fin else tamano - 1
+
+    if inicio >= tamano or inicio > fin:
+        return False
+    return inicio, fin
+
+
+def _leer_rango(ruta, inicio, fin):
+    with open(ruta, 'rb') as archivo:
+        archivo.seek(inicio)
+        restante = fin - inicio + 1
+        while restante > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+
+
+def respuesta_medio(request, ruta):
+    """
+    Respuesta para un archivo de MEDIA_ROOT: 304 si el cliente ya lo tiene,
+    delegación al proxy según MEDIA_ENTREGA o entrega en Python con Range.
+    """
+    ruta_absoluta = _ruta_segura(ruta)
+    try:
+        stat = os.stat(ruta_absoluta)
+    except OSError:
+        raise Http404
+    if not os.path.isfile(ruta_absoluta):
+        raise Http404
+
+    etag = _etag(stat)
+    content_type = mimetypes.guess_type(ruta_absoluta)[0] or 'application/octet-stream'
+
+    if _no_modificado(request, etag, stat.st_mtime):
+        response = HttpResponse(status=304)
+    else:
+        response = _entregar(request, ruta, ruta_absoluta, stat, etag, content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    response['Cache-Control'] = _cache_control(ruta)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def _entregar(request, ruta, ruta_absoluta, stat, etag, content_type):
+    modo = getattr(settings, 'MEDIA_ENTREGA', 'python')
+
+    if modo == 'x-accel':
+        # nginx atiende Range y envía el archivo con sendfile()
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_PREFIJO + ruta
+        return response
+    if modo == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = ruta_absoluta
+        return response
+
+    rango = _rango(request, etag, stat.st_size)
+    if rango is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+    if rango is None:
+        # FileResponse usa wsgi.file_wrapper (sendfile) cuando el servidor lo soporta
+        return FileResponse(open(ruta_absoluta, 'rb'), content_type=content_type)
+
+    inicio, fin = rango
+    response = StreamingHttpResponse(
+        _leer_rango(ruta_absoluta, inicio, fin), status=206, content_type=content_type
+    )
+    response['Content-Range'] = f'bytes {inicio}-{fin}/{stat.st_size}'
+    response['Content-Length'] = str(fin - inicio + 1)
+    return response
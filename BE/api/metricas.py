@@ -0,0 +1,299 @@
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import connections
+from django.dispatch import receiver
+
+
+# ============= MÉTRICAS POR REQUEST =============
+#
+# MedicionMiddleware mide cada request:
+#   db      tiempo total de SQL (y cantidad de consultas)
+#   auth    autenticación JWT (api/autenticacion.py)
+#   vista   ejecución de la vista sin SQL ni auth (lógica + serializers)
+#   render  renderizado de la respuesta (JSON / API navegable)
+#   total   todo el request dentro de la middleware
+# Los valores salen en el header Server-Timing y se acumulan por ruta
+# (p. ej. 'visita-list', 'expediente-resumen') en histogramas que
+# /api/metricas/ expone en formato de texto de Prometheus.
+#
+# Los histogramas viven en memoria de cada proceso: con varios workers,
+# cada uno reporta los suyos (Prometheus los suma por instancia).
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200)
+COMPONENTES = ('db', 'auth', 'vista', 'render')
+
+
+class Histograma:
+    __slots__ = ('limites', 'conteos', 'suma', 'total')
+
+    def __init__(self, limites):
+        self.limites = limites
+        self.conteos = [0] * len(limites)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, valor):
+        for posicion, limite in enumerate(self.limites):
+            if valor <= limite:
+                self.conteos[posicion] += 1
+                break
+        self.suma += valor
+        self.total += 1
+
+    def acumulados(self):
+        acumulado = 0
+        for limite, conteo in zip(self.limites, self.conteos):
+            acumulado += conteo
+            yield limite, acumulado
+
+
+class Registro:
+    """Histogramas por (métrica, ruta, método); protegido con un lock"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histogramas = {}
+        self._componentes = {}
+
+    def _histograma(self, metrica, etiquetas, limites):
+        clave = (metrica, etiquetas)
+        histograma = self._histogramas.get(clave)
+        if histograma is None:
+            histograma = self._histogramas[clave] = Histograma(limites)
+        return histograma
+
+    def registrar(self, ruta, metodo, estado, medicion):
+        etiquetas = (ruta, metodo)
+        with self._lock:
+            self._histograma('duracion', etiquetas, BUCKETS_SEGUNDOS).observar(medicion['total'])
+            self._histograma('consultas', etiquetas, BUCKETS_CONSULTAS).observar(medicion['consultas'])
+            for componente in COMPONENTES:
+                clave = (ruta, metodo, componente)
+                self._componentes[clave] = self._componentes.get(clave, 0.0) + medicion[componente]
+            clave = (ruta, metodo, f'{estado // 100}xx')
+            self._componentes[clave] = self._componentes.get(clave, 0) + 1
+
+    def limpiar(self):
+        with self._lock:
+            self._histogramas.clear()
+            self._componentes.clear()
+
+    def exportar(self):
+        """Formato de texto de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            histogramas = {
+                clave: (list(h.acumulados()), h.suma, h.total) for clave, h in self._histogramas.items()
+            }
+            componentes = dict(self._componentes)
+
+        lineas = []
+        for metrica, nombre, ayuda in (
+            ('duracion', 'api_request_duration_seconds', 'Duración total del request'),
+            ('consultas', 'api_request_queries', 'Consultas SQL por request'),
+        ):
+            lineas += [f'# HELP {nombre} {ayuda}', f'# TYPE {nombre} histogram']
+            for (tipo, (ruta, metodo)), (acumulados, suma, total) in sorted(histogramas.items()):
+                if tipo != metrica:
+                    continue
+                base = f'route="{ruta}",method="{metodo}"'
+                for limite, acumulado in acumulados:
+                    lineas.append(f'{nombre}_bucket{{{base},le="{limite}"}} {acumulado}')
+                lineas.append(f'{nombre}_bucket{{{base},le="+Inf"}} {total}')
+                lineas.append(f'{nombre}_sum{{{base}}} {suma:.6f}')
+                lineas.append(f'{nombre}_count{{{base}}} {total}')
+
+        lineas += [
+            '# HELP api_request_component_seconds_total Tiempo acumulado por componente del request',
+            '# TYPE api_request_component_seconds_total counter',
+        ]
+        for (ruta, metodo, componente), valor in sorted(componentes.items()):
+            if componente in COMPONENTES:
+                lineas.append(
+                    f'api_request_component_seconds_total{{route="{ruta}",method="{metodo}",'
+                    f'component="{componente}"}} {valor:.6f}'
+                )
+
+        lineas += [
+            '# HELP api_responses_total Respuestas por clase de estado',
+            '# TYPE api_responses_total counter',
+        ]
+        for (ruta, metodo, clase), valor in sorted(componentes.items()):
+            if clase not in COMPONENTES:
+                lineas.append(f'api_responses_total{{route="{ruta}",method="{metodo}",status="{clase}"}} {valor}')
+
+        return '\n'.join(lineas) + '\n'
+
+
+registro = Registro()
+
+
+def exportar(cache_respuestas):
+    """
+    Texto para /api/metricas/: histogramas del proceso más los aciertos de la
+    caché de respuestas (el dict de cache_respuestas.metricas()).
+    """
+    lineas = [
+        '# HELP api_cache_respuestas_total Aciertos y fallos de la caché de respuestas',
+        '# TYPE api_cache_respuestas_total counter',
+    ]
+    for recurso, valores in cache_respuestas.items():
+        for resultado, campo in (('hit', 'hits'), ('miss', 'misses')):
+            lineas.append(
+                f'api_cache_respuestas_total{{recurso="{recurso}",resultado="{resultado}"}} {valores[campo]}'
+            )
+    return registro.exportar() + '\n'.join(lineas) + '\n'
+
+
+# ---------- Medición ----------
+
+def medicion_actual(request):
+    """Acumulador del request (None si la middleware no está activa)"""
+    return getattr(request, '_medicion', None)
+
+
+def sumar_auth(request, segundos):
+    medicion = medicion_actual(getattr(request, '_request', request))
+    if medicion is not None:
+        medicion['auth'] += segundos
+
+
+# Medición del request en curso. Las conexiones de Django son por hilo: en
+# ASGI el ORM corre en el hilo de sync_to_async, no en el del event loop. El
+# contexto sí viaja a ese hilo, así que el contador lee la medición de aquí.
+_medicion_sql = ContextVar('medicion_sql', default=None)
+
+
+def _contar_sql(execute, sql, params, many, context):
+    medicion = _medicion_sql.get()
+    if medicion is None:
+        return execute(sql, params, many, context)
+    inicio = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        medicion['db'] += time.perf_counter() - inicio
+        medicion['consultas'] += 1
+
+
+@receiver(request_started)
+def instalar_contador_sql(**kwargs):
+    """
+    Deja _contar_sql en las conexiones del hilo que atiende el request. En
+    ASGI Django envía request_started desde el mismo hilo de sync_to_async
+    donde corren las consultas (como close_old_connections).
+    """
+    for conexion in connections.all():
+        if _contar_sql not in conexion.execute_wrappers:
+            conexion.execute_wrappers.append(_contar_sql)
+
+
+def _server_timing(medicion):
+    return ', '.join([
+        f'db;dur={medicion["db"] * 1000:.1f};desc="{medicion["consultas"]} consultas"',
+        f'auth;dur={medicion["auth"] * 1000:.1f}',
+        f'vista;dur={medicion["vista"] * 1000:.1f}',
+        f'render;dur={medicion["render"] * 1000:.1f}',
+        f'total;dur={medicion["total"] * 1000:.1f}',
+    ])
+
+
+def _marcar(request, momento):
+    medicion = medicion_actual(request)
+    if medicion is not None:
+        medicion[momento] = time.perf_counter()
+
+
+class MedicionMiddleware:
+    """
+    Debe ir primero en MIDDLEWARE para que 'total' cubra todo el request.
+    METRICAS_ACTIVAS=False la desactiva; METRICAS_SERVER_TIMING=False
+    mide sin exponer los tiempos al cliente. Funciona en WSGI y en ASGI
+    (sin forzar a las vistas async a correr en un hilo).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.activa = getattr(settings, 'METRICAS_ACTIVAS', True)
+        self.server_timing = getattr(settings, 'METRICAS_SERVER_TIMING', True)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # En ASGI los hooks también son async: Django no salta a un hilo para llamarlos
+            self.process_view = self._aprocess_view
+            self.process_template_response = self._aprocess_template_response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.activa:
+            return self.get_response(request)
+
+        medicion = self._iniciar(request)
+        inicio = time.perf_counter()
+        token = _medicion_sql.set(medicion)
+        try:
+            response = self.get_response(request)
+        finally:
+            _medicion_sql.reset(token)
+        return self._terminar(request, response, medicion, inicio)
+
+    async def __acall__(self, request):
+        if not self.activa:
+            return await self.get_response(request)
+
+        medicion = self._iniciar(request)
+        inicio = time.perf_counter()
+        # sync_to_async copia el contexto: el hilo del ORM ve esta medición
+        token = _medicion_sql.set(medicion)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medicion_sql.reset(token)
+        return self._terminar(request, response, medicion, inicio)
+
+    def _iniciar(self, request):
+        request._medicion = {
+            'db': 0.0, 'consultas': 0, 'auth': 0.0, 'vista': 0.0, 'render': 0.0, 'total': 0.0,
+            'inicio_vista': None, 'fin_vista': None,
+        }
+        return request._medicion
+
+    def _terminar(self, request, response, medicion, inicio):
+        fin = time.perf_counter()
+        medicion['total'] = fin - inicio
+        if medicion['inicio_vista'] is not None:
+            fin_vista = medicion['fin_vista'] or fin
+            # El SQL y la autenticación ocurren dentro de la vista: se descuentan
+            medicion['vista'] = max(fin_vista - medicion['inicio_vista'] - medicion['db'] - medicion['auth'], 0.0)
+            if medicion['fin_vista'] is not None:
+                medicion['render'] = fin - medicion['fin_vista']
+
+        if self.server_timing:
+            response['Server-Timing'] = _server_timing(medicion)
+
+        match = request.resolver_match
+        ruta = match.url_name or match.view_name if match else 'sin_ruta'
+        registro.registrar(ruta or 'sin_nombre', request.method, response.status_code, medicion)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        _marcar(request, 'inicio_vista')
+
+    def process_template_response(self, request, response):
+        # La vista ya devolvió su Response; lo que sigue es el render
+        _marcar(request, 'fin_vista')
+        return response
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        _marcar(request, 'inicio_vista')
+
+    async def _aprocess_template_response(self, request, response):
+        _marcar(request, 'fin_vista')
+        return response
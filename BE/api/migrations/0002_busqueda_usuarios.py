@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:17
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+CREAR_INDICE = 'CREATE INDEX usuario_busqueda_gin ON api_customuser USING gin (vector_busqueda)'
+BORRAR_INDICE = 'DROP INDEX IF EXISTS usuario_busqueda_gin'
+
+# Rellena el vector de los usuarios existentes (mismo documento que api/busqueda.py)
+RELLENAR_VECTORES = """
+UPDATE api_customuser u SET vector_busqueda =
+    setweight(to_tsvector('simple', concat_ws(' ', u.first_name, u.last_name, u.username)), 'A')
+    || setweight(to_tsvector('simple', concat_ws(' ', u.email, u.sede, (
+        SELECT string_agg(concat_ws(' ', v.cedula, v.institucion), ' ')
+        FROM api_visita v
+        JOIN api_expediente e ON e.id = v.expediente_id
+        WHERE e.user_id = u.id
+    ))), 'B')
+"""
+
+
+def solo_postgres(*sentencias):
+    """El índice GIN y el tsvector solo existen en PostgreSQL"""
+    def ejecutar(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for sql in sentencias:
+                schema_editor.execute(sql)
+    return ejecutar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='vector_busqueda',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='customuser',
+                    index=django.contrib.postgres.indexes.GinIndex(fields=['vector_busqueda'], name='usuario_busqueda_gin'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    solo_postgres(CREAR_INDICE, RELLENAR_VECTORES),
+                    solo_postgres(BORRAR_INDICE),
+                ),
+            ],
+        ),
+    ]
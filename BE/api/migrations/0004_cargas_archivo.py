@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:25
+
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_imagen_variantes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CargaArchivo',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('nombre', models.CharField(max_length=255)),
+                ('destino', models.CharField(choices=[('adjunto_notas', 'Adjunto de notas'), ('imagen', 'Imagen')], max_length=20)),
+                ('content_type', models.CharField(max_length=100)),
+                ('tamano_total', models.PositiveBigIntegerField()),
+                ('recibido', models.PositiveBigIntegerField(default=0)),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('completa', 'Completa')], default='pendiente', max_length=20)),
+                ('ruta_temporal', models.CharField(max_length=500)),
+                ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Carga de archivo',
+                'verbose_name_plural': 'Cargas de archivos',
+            },
+        ),
+    ]
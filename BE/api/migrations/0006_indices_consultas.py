@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:33
+
+import django.contrib.postgres.indexes
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+# pg_trgm permite usar un índice GIN con LIKE '%texto%'
+CREAR_EXTENSION = 'CREATE EXTENSION IF NOT EXISTS pg_trgm'
+CREAR_INDICE_CEDULA = 'CREATE INDEX visita_cedula_trgm ON api_visita USING gin (UPPER(cedula) gin_trgm_ops)'
+BORRAR_INDICE_CEDULA = 'DROP INDEX IF EXISTS visita_cedula_trgm'
+
+
+def solo_postgres(*sentencias):
+    """El índice trigram solo existe en PostgreSQL"""
+    def ejecutar(apps, schema_editor):
+        if schema_editor.connection.vendor == 'postgresql':
+            for sql in sentencias:
+                schema_editor.execute(sql)
+    return ejecutar
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_fecha_actualizacion'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['rol', 'activo', 'sede'], name='usuario_rol_activo_sede_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='expediente',
+            index=models.Index(fields=['activo', 'genero'], name='expediente_activo_genero_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='proyectousuario',
+            index=models.Index(condition=models.Q(('activo', True)), fields=['proyecto'], name='inscripcion_activa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['expediente', '-fecha_visita', 'id'], name='visita_expediente_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visita',
+            index=models.Index(fields=['-fecha_visita', 'id'], name='visita_fecha_idx'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='visita',
+                    index=django.contrib.postgres.indexes.GinIndex(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Upper('cedula'), name='gin_trgm_ops'), name='visita_cedula_trgm'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    solo_postgres(CREAR_EXTENSION, CREAR_INDICE_CEDULA),
+                    solo_postgres(BORRAR_INDICE_CEDULA),
+                ),
+            ],
+        ),
+    ]
@@ -1,6 +1,11 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models.functions import Upper
+from django.utils import timezone
 from datetime import date
+import uuid
 
 
 class CustomUser(AbstractUser):
@@ -20,12 +25,20 @@ class CustomUser(AbstractUser):
     cargo = models.CharField(max_length=30, blank=True, null=True)
     departamento = models.CharField(max_length=30, blank=True, null=True)
     
+    # Búsqueda de texto completo (nombres, usuario, correo, sede, cédula e institución)
+    vector_busqueda = SearchVectorField(null=True, editable=False)
+    
     def __str__(self):
         return f"{self.username} - {self.get_rol_display()}"
     
     class Meta:
         verbose_name = "Usuario"
         verbose_name_plural = "Usuarios"
+        indexes = [
+            GinIndex(fields=['vector_busqueda'], name='usuario_busqueda_gin'),
+            # /api/usuarios/?rol=&activo=&sede=
+            models.Index(fields=['rol', 'activo', 'sede'], name='usuario_rol_activo_sede_idx'),
+        ]
 
 
 class Expediente(models.Model):
@@ -41,6 +54,8 @@ class Expediente(models.Model):
         null=True,
         help_text="Foto del atleta"
     )
+    # Rutas de las variantes WebP (thumb/medium/large), ver api/imagenes.py
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
     genero = models.CharField(
         max_length=10, 
         choices=[('M', 'Masculino'), ('F', 'Femenino'), ('O', 'Otro')]
@@ -58,6 +73,10 @@ class Expediente(models.Model):
     class Meta:
         verbose_name = "Expediente"
         verbose_name_plural = "Expedientes"
+        indexes = [
+            # /api/expedientes/?activo=&genero=
+            models.Index(fields=['activo', 'genero'], name='expediente_activo_genero_idx'),
+        ]
 
 
 class Visita(models.Model):
@@ -162,6 +181,7 @@ class Visita(models.Model):
     
     fecha_visita = models.DateField()
     fecha_registro = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     @property
     def edad(self):
@@ -182,6 +202,14 @@ class Visita(models.Model):
         verbose_name = "Visita"
         verbose_name_plural = "Visitas"
         ordering = ['-fecha_visita']
+        indexes = [
+            # Visitas de un expediente por rango de fechas, en el orden del cursor
+            models.Index(fields=['expediente', '-fecha_visita', 'id'], name='visita_expediente_fecha_idx'),
+            # Listado general y rango de fechas sin expediente
+            models.Index(fields=['-fecha_visita', 'id'], name='visita_fecha_idx'),
+            # Búsqueda parcial de cédula en el admin: icontains usa UPPER(cedula) LIKE
+            GinIndex(OpClass(Upper('cedula'), name='gin_trgm_ops'), name='visita_cedula_trgm'),
+        ]
 
 
 class Familiar(models.Model):
@@ -200,6 +228,7 @@ class Familiar(models.Model):
     ocupacion = models.CharField(max_length=400, blank=True, null=True)
     ingreso_mensual = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     lugar_trabajo = models.CharField(max_length=400, blank=True, null=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     
     def __str__(self):
         return f"{self.nombre_completo} ({self.parentesco})"
@@ -220,9 +249,11 @@ class Proyecto(models.Model):
         null=True,
         help_text="Imagen del proyecto"
     )
+    imagen_variantes = models.JSONField(default=dict, blank=True, editable=False)
     fecha_inicio = models.DateField()
     fecha_fin = models.DateField()
     activo = models.BooleanField(default=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
     usuarios = models.ManyToManyField(
         CustomUser, 
         through='ProyectoUsuario',
@@ -234,6 +265,9 @@ class Proyecto(models.Model):
     
     @property
     def total_participantes(self):
+        # Los querysets de la API ya traen el conteo anotado (participantes_activos)
+        if hasattr(self, 'participantes_activos'):
+            return self.participantes_activos
         return self.usuarios.filter(proyectousuario__activo=True).count()
     
     class Meta:
@@ -253,6 +287,89 @@ class ProyectoUsuario(models.Model):
         verbose_name = "Usuario en Proyecto"
         verbose_name_plural = "Usuarios en Proyectos"
         unique_together = ['proyecto', 'usuario']
+        indexes = [
+            # Conteo de participantes activos por proyecto
+            models.Index(
+                fields=['proyecto'], name='inscripcion_activa_idx', condition=models.Q(activo=True)
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.usuario.username} en {self.proyecto.nombre}"
+
+class CargaArchivo(models.Model):
+    """Subida de archivo por partes (reanudable), ver api/cargas.py"""
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('completa', 'Completa'),
+    )
+    DESTINOS = (
+        ('adjunto_notas', 'Adjunto de notas'),
+        ('imagen', 'Imagen'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    nombre = models.CharField(max_length=255)
+    destino = models.CharField(max_length=20, choices=DESTINOS)
+    content_type = models.CharField(max_length=100)
+    tamano_total = models.PositiveBigIntegerField()
+    recibido = models.PositiveBigIntegerField(default=0)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    ruta_temporal = models.CharField(max_length=500)
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.nombre} ({self.recibido}/{self.tamano_total})"
+    
+    class Meta:
+        verbose_name = "Carga de archivo"
+        verbose_name_plural = "Cargas de archivos"
+
+
+class Trabajo(models.Model):
+    """Trabajo en segundo plano, ver api/trabajos.py"""
+    ESTADOS = (
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('fallido', 'Fallido'),
+    )
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    tipo = models.CharField(max_length=100)
+    parametros = models.JSONField(default=dict)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)  # 0 a 100
+    mensaje = models.CharField(max_length=255, blank=True)
+    resultado = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    max_intentos = models.PositiveSmallIntegerField(default=3)
+    
+    # Cuándo se puede tomar (reintentos con espera) y hasta cuándo lo reserva un trabajador
+    disponible_desde = models.DateTimeField(default=timezone.now)
+    bloqueado_hasta = models.DateTimeField(null=True, blank=True)
+    trabajador = models.CharField(max_length=100, blank=True)
+    
+    creado_por = models.ForeignKey(
+        CustomUser,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='trabajos'
+    )
+    fecha_creacion = models.DateTimeField(auto_now_add=True)
+    fecha_inicio = models.DateTimeField(null=True, blank=True)
+    fecha_fin = models.DateTimeField(null=True, blank=True)
     
     def __str__(self):
-        return f"{self.usuario.username} en {self.proyecto.nombre}"
\ No newline at end of file
+        return f"{self.tipo} ({self.estado})"
+    
+    class Meta:
+        verbose_name = "Trabajo"
+        verbose_name_plural = "Trabajos"
+        ordering = ['-fecha_creacion']
+        indexes = [
+            models.Index(fields=['estado', 'disponible_desde'], name='trabajo_estado_disp_idx'),
+        ]
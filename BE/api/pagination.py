@@ -0,0 +1,146 @@
+import asyncio
+
+from rest_framework.pagination import CursorPagination, PageNumberPagination, _reverse_ordering
+
+
+# ============= PAGINACIÓN POR CURSOR =============
+
+class CursorPaginacion(CursorPagination):
+    """
+    Paginación por cursor (keyset) ordenada por id.
+
+    El costo de cada página no depende del tamaño de la tabla: en lugar de
+    OFFSET se filtra por la posición codificada en el cursor.
+    Parámetros:
+        ?page_size=N        tamaño de página (máximo max_page_size)
+        ?incluir_total=true agrega el header X-Total-Count (hace un COUNT)
+    """
+    ordering = ('id',)
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    total_query_param = 'incluir_total'
+    total_header = 'X-Total-Count'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.total = queryset.count() if self.pide_total(request) else None
+        consulta = self.consulta_pagina(queryset, request, view)
+        if consulta is None:
+            return None
+        return self._procesar_pagina(list(consulta))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Igual que paginate_queryset con el ORM async. El COUNT y la página se
+        encolan juntos, pero se ejecutan uno tras otro en la misma conexión.
+        """
+        consulta = self.consulta_pagina(queryset, request, view)
+        if consulta is None:
+            self.total = await queryset.acount() if self.pide_total(request) else None
+            return None
+
+        async def resultados():
+            return [objeto async for objeto in consulta.aiterator(chunk_size=self.page_size + 1)]
+
+        if self.pide_total(request):
+            self.total, filas = await asyncio.gather(queryset.acount(), resultados())
+        else:
+            self.total, filas = None, await resultados()
+        return self._procesar_pagina(filas)
+
+    def pide_total(self, request):
+        return request.query_params.get(self.total_query_param, '').lower() == 'true'
+
+    # CursorPagination.paginate_queryset separado en dos mitades alrededor de
+    # la única consulta, para poder ejecutarla de forma síncrona o async.
+
+    def consulta_pagina(self, queryset, request, view):
+        """Consulta (sin ejecutar) de las filas de la página pedida, más una"""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # Con posición en el cursor se filtra desde ella (keyset)
+        if current_position is not None:
+            order = self.ordering[0]
+            is_reversed = order.startswith('-')
+            order_attr = order.lstrip('-')
+            if self.cursor.reverse != is_reversed:
+                queryset = queryset.filter(**{order_attr + '__lt': current_position})
+            else:
+                queryset = queryset.filter(**{order_attr + '__gt': current_position})
+
+        # Un elemento extra indica si hay página siguiente
+        return queryset[offset:offset + self.page_size + 1]
+
+    def _procesar_pagina(self, results):
+        reverse = self.cursor.reverse if self.cursor else False
+        current_position = self.cursor.position if self.cursor else None
+        offset = self.cursor.offset if self.cursor else 0
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            # La consulta se hizo en orden inverso: se restaura el orden
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if self.total is not None:
+            response[self.total_header] = str(self.total)
+        return response
+
+
+class VisitaCursorPaginacion(CursorPaginacion):
+    """Visitas de la más reciente a la más antigua, desempatando por id"""
+    ordering = ('-fecha_visita', 'id')
+
+
+# ============= PAGINACIÓN POR NÚMERO DE PÁGINA =============
+
+class BusquedaPaginacion(PageNumberPagination):
+    """
+    Resultados ordenados por relevancia: el orden no es estable entre
+    consultas, así que se pagina por número de página (?page=2&page_size=20).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
@@ -21,19 +21,29 @@ ROLES = {
     'USER': 'User'
 }
 
+# CustomUser.rol -> rol de permisos
+ROLES_POR_ROL = {
+    'admin': ROLES['ADMIN'],
+    'staff': ROLES['STAFF'],
+    'user': ROLES['USER'],
+}
+
 # =====================================================
 # CLASES DE PERMISOS
 # =====================================================
 
+# El rol se lee de CustomUser.rol o, con JWTRolAuthentication, de los claims
+# del token: ninguna de estas clases consulta la base de datos.
+
 class IsAdmin(BasePermission):
     """Solo permite acceso a usuarios con rol Admin"""
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.groups.filter(name='Admin').exists()
+        return get_user_role(request.user) == ROLES['ADMIN']
 
 class IsStaff(BasePermission):
     """Permite acceso a usuarios con rol Admin o Staff"""
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.groups.filter(name__in=['Admin', 'Staff']).exists()
+        return get_user_role(request.user) in (ROLES['ADMIN'], ROLES['STAFF'])
 
 class IsUser(BasePermission):
     """Permite acceso a cualquier usuario autenticado"""
@@ -52,14 +62,7 @@ def get_user_role(user):
     if user.is_superuser:
         return ROLES['ADMIN']
     
-    if user.groups.filter(name='Admin').exists():
-        return ROLES['ADMIN']
-    elif user.groups.filter(name='Staff').exists():
-        return ROLES['STAFF']
-    elif user.groups.filter(name='User').exists():
-        return ROLES['USER']
-    
-    return None
+    return ROLES_POR_ROL.get(getattr(user, 'rol', None))
 
 def get_user_permissions(user):
     """Obtiene los permisos del usuario basado en su rol"""
@@ -187,13 +190,13 @@ def register_user(request):
     )
     
     # Asignar rol
-    if role in ROLES.values():
-        group, created = Group.objects.get_or_create(name=role)
-        user.groups.add(group)
-    else:
+    if role not in ROLES.values():
         # Rol por defecto
-        group, created = Group.objects.get_or_create(name='User')
-        user.groups.add(group)
+        role = ROLES['USER']
+    group, created = Group.objects.get_or_create(name=role)
+    user.groups.add(group)
+    user.rol = role.lower()
+    user.save(update_fields=['rol'])
     
     return Response({
         'message': 'Usuario creado exitosamente',
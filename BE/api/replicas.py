@@ -0,0 +1,201 @@
+import hashlib
+import itertools
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+from rest_framework.viewsets import ViewSetMixin
+
+
+# ============= RÉPLICAS DE LECTURA =============
+#
+# Los GET/HEAD de los ViewSets leen de una réplica; todo lo demás usa
+# 'default'. Un cliente que escribe queda fijado a la primaria durante
+# REPLICAS_FIJAR_SEGUNDOS para que vea sus propios cambios. Una réplica con
+# más de REPLICAS_RETRASO_MAXIMO segundos de atraso (o que no responde) se
+# salta hasta el siguiente chequeo. Los alias de las réplicas están en
+# settings.REPLICAS (ver DB_REPLICAS en config/settings.py).
+#
+# La marca de "fijado" vive en la caché 'default': tiene que ser compartida
+# (REDIS_URL). Con LocMem el GET que sigue a un POST suele caer en otro
+# worker que no vio la marca; por eso ReplicaMiddleware no arranca así.
+
+_estado = ContextVar('estado_replicas', default=None)
+_salud = {}
+_turno = itertools.count()
+
+RETRASO_POSTGRES = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+    END
+"""
+
+
+def replicas():
+    return getattr(settings, 'REPLICAS', [])
+
+
+def _retraso(alias):
+    """Segundos que la réplica va detrás de la primaria"""
+    conexion = connections[alias]
+    if conexion.vendor != 'postgresql':
+        return 0.0
+    with conexion.cursor() as cursor:
+        cursor.execute(RETRASO_POSTGRES)
+        fila = cursor.fetchone()
+    return float(fila[0]) if fila and fila[0] is not None else 0.0
+
+
+def replica_sana(alias):
+    """Resultado cacheado en el proceso REPLICAS_CHEQUEO_SEGUNDOS"""
+    ahora = time.monotonic()
+    guardado = _salud.get(alias)
+    if guardado and guardado[0] > ahora:
+        return guardado[1]
+    try:
+        sana = _retraso(alias) <= settings.REPLICAS_RETRASO_MAXIMO
+    except DatabaseError:
+        sana = False
+    _salud[alias] = (ahora + settings.REPLICAS_CHEQUEO_SEGUNDOS, sana)
+    return sana
+
+
+def elegir_replica():
+    """Réplica sana por turnos, o None si ninguna lo está"""
+    candidatas = replicas()
+    if not candidatas:
+        return None
+    inicio = next(_turno)
+    for posicion in range(len(candidatas)):
+        alias = candidatas[(inicio + posicion) % len(candidatas)]
+        if replica_sana(alias):
+            return alias
+    return None
+
+
+def alias_lectura():
+    """Réplica de la que leyó el request actual (None si fue la primaria)"""
+    estado = _estado.get()
+    return estado.get('alias') if estado else None
+
+
+# ---------- Router ----------
+
+class RouterReplicas:
+    """DATABASE_ROUTERS: decide con el estado que deja ReplicaMiddleware en el request"""
+
+    def db_for_read(self, model, **hints):
+        estado = _estado.get()
+        if not estado or not estado['lectura'] or estado['escribio']:
+            return None
+        # Dentro de una transacción en la primaria se lee de la primaria
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        if 'alias' not in estado:
+            estado['alias'] = elegir_replica()
+        return estado['alias']
+
+    def db_for_write(self, model, **hints):
+        estado = _estado.get()
+        if estado is not None:
+            # Las lecturas que siguen en este request ya van a la primaria
+            estado['escribio'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        return db == DEFAULT_DB_ALIAS
+
+
+# ---------- Middleware ----------
+
+def _clave_cliente(request):
+    credencial = (
+        request.META.get('HTTP_AUTHORIZATION')
+        or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        or request.META.get('REMOTE_ADDR', '')
+    )
+    return f'replicas:fijado:{hashlib.md5(credencial.encode()).hexdigest()}'
+
+
+def _cache_por_proceso():
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], (LocMemCache, DummyCache))
+
+
+def _usa_replica(view_func):
+    """Los ViewSets y las vistas que lo declaran con lecturas_en_replica = True"""
+    clase = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+    if clase is None:
+        return False
+    return getattr(clase, 'lecturas_en_replica', issubclass(clase, ViewSetMixin))
+
+
+class ReplicaMiddleware:
+    """Marca qué requests pueden leer de una réplica y fija al cliente tras escribir"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if replicas() and _cache_por_proceso():
+            raise ImproperlyConfigured(
+                'Las réplicas de lectura requieren una caché compartida entre workers '
+                '(REDIS_URL) para fijar a la primaria al cliente que escribió.'
+            )
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            self.process_view = self._aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not replicas():
+            return self.get_response(request)
+
+        clave = _clave_cliente(request)
+        fijado = request.method not in ('GET', 'HEAD') or cache.get(clave) is not None
+        token = _estado.set({'fijado': fijado, 'lectura': False, 'escribio': False})
+        try:
+            response = self.get_response(request)
+        finally:
+            estado = _estado.get()
+            _estado.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') or estado['escribio']:
+            cache.set(clave, True, settings.REPLICAS_FIJAR_SEGUNDOS)
+        return response
+
+    async def __acall__(self, request):
+        if not replicas():
+            return await self.get_response(request)
+
+        clave = _clave_cliente(request)
+        fijado = request.method not in ('GET', 'HEAD') or await cache.aget(clave) is not None
+        token = _estado.set({'fijado': fijado, 'lectura': False, 'escribio': False})
+        try:
+            response = await self.get_response(request)
+        finally:
+            estado = _estado.get()
+            _estado.reset(token)
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') or estado['escribio']:
+            await cache.aset(clave, True, settings.REPLICAS_FIJAR_SEGUNDOS)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado.get()
+        if estado is not None and not estado['fijado']:
+            estado['lectura'] = _usa_replica(view_func)
+
+    async def _aprocess_view(self, request, view_func, view_args, view_kwargs):
+        estado = _estado.get()
+        if estado is not None and not estado['fijado']:
+            estado['lectura'] = _usa_replica(view_func)
@@ -1,6 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
-from .models import CustomUser, Expediente, Visita, Familiar, Proyecto, ProyectoUsuario
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+from .models import CustomUser, Expediente, Visita, Familiar, Proyecto, ProyectoUsuario, CargaArchivo, Trabajo
+from .cargas import CargaCompletaField, CargaReferenciadaMixin
+from .inscripciones import resolver_usuarios, inscribir_usuarios
 from django.core.exceptions import ValidationError
 
 # ============================================
@@ -48,6 +53,50 @@ def validar_tamano_pdf(value):
     if value.content_type != 'application/pdf':
         raise ValidationError('El archivo debe ser un PDF')
 
+def urls_variantes(obj, request):
+    """{'thumb': url, 'medium': url, 'large': url} si las variantes están al día"""
+    variantes = obj.imagen_variantes or {}
+    if not request or not obj.imagen or variantes.get('original') != obj.imagen.name:
+        return {}
+    return {
+        nombre: request.build_absolute_uri(default_storage.url(ruta))
+        for nombre, ruta in variantes.items()
+        if nombre != 'original'
+    }
+
+# ============================================
+# CAMPOS DINÁMICOS (SPARSE FIELDSETS)
+# ============================================
+
+def _parametro_lista(request, nombre):
+    """Convierte '?nombre=a,b' en {'a', 'b'}"""
+    valor = request.query_params.get(nombre, '')
+    return {campo.strip() for campo in valor.split(',') if campo.strip()}
+
+
+class CamposDinamicosMixin:
+    """
+    Permite al cliente elegir los campos de la respuesta:
+        ?fields=id,genero    devuelve solo esos campos
+        ?expand=visitas      agrega campos costosos declarados en Meta.expandibles
+    Solo aplica al serializer raíz (el que recibe el request en el context).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if request is None:
+            return
+
+        expandibles = getattr(self.Meta, 'expandibles', {})
+        for nombre in _parametro_lista(request, 'expand') & set(expandibles):
+            self.fields[nombre] = expandibles[nombre]()
+
+        campos = _parametro_lista(request, 'fields')
+        if campos:
+            for nombre in set(self.fields) - campos:
+                self.fields.pop(nombre)
+
 # ============= USUARIOS =============
 
 class RegistroUsuarioSerializer(serializers.ModelSerializer):
@@ -196,6 +245,28 @@ class UsuarioSerializer(serializers.ModelSerializer):
         return hasattr(obj, 'expediente')
 
 
+class UsuarioResumenSerializer(serializers.ModelSerializer):
+    """Datos mínimos del usuario para listados"""
+    nombre_completo = serializers.SerializerMethodField()
+
+    class Meta:
+        model = CustomUser
+        fields = ['id', 'username', 'first_name', 'last_name',
+                  'nombre_completo', 'sede', 'rol', 'activo']
+
+    def get_nombre_completo(self, obj):
+        return obj.get_full_name() or obj.username
+
+
+class ResultadoBusquedaSerializer(UsuarioResumenSerializer):
+    """Usuario encontrado por /api/buscar/ con su expediente y relevancia"""
+    expediente_id = serializers.IntegerField(read_only=True)
+    rango = serializers.FloatField(read_only=True)
+
+    class Meta(UsuarioResumenSerializer.Meta):
+        fields = UsuarioResumenSerializer.Meta.fields + ['email', 'expediente_id', 'rango']
+
+
 class UsuarioActualizarSerializer(serializers.ModelSerializer):
     """Serializer para actualizar usuarios (sin contraseña)"""
     class Meta:
@@ -231,6 +302,18 @@ class FamiliarSerializer(serializers.ModelSerializer):
         fields = '__all__'
 
 
+class FamiliarAnidadoSerializer(serializers.ModelSerializer):
+    """
+    Familiar dentro de una visita: la visita la asigna el serializer padre.
+    El id es opcional; si viene, identifica al familiar que se actualiza.
+    """
+    id = serializers.IntegerField(required=False)
+
+    class Meta:
+        model = Familiar
+        exclude = ['visita']
+
+
 # ============= VISITAS =============
 
 class VisitaSerializer(serializers.ModelSerializer):
@@ -256,29 +339,37 @@ class VisitaSerializer(serializers.ModelSerializer):
         return None
 
 
-class VisitaCrearSerializer(serializers.ModelSerializer):
+class VisitaCrearSerializer(CargaReferenciadaMixin, serializers.ModelSerializer):
     """Serializer para crear visitas con familiares y validación de archivos"""
-    familiares = FamiliarSerializer(many=True, required=False)
+    familiares = FamiliarAnidadoSerializer(many=True, required=False)
     adjunto_notas = serializers.FileField(
         required=False,
         validators=[validar_tamano_pdf]
     )
+    # Alternativa a adjunto_notas: id de una subida por partes ya finalizada
+    adjunto_notas_carga = CargaCompletaField('adjunto_notas')
     
     class Meta:
         model = Visita
         fields = '__all__'
         read_only_fields = ['fecha_registro']
+        campos_carga = {'adjunto_notas_carga': 'adjunto_notas'}
     
+    @transaction.atomic
     def create(self, validated_data):
         familiares_data = validated_data.pop('familiares', [])
         visita = Visita.objects.create(**validated_data)
         
-        # Crear familiares
+        # Crear familiares en un solo INSERT
         for familiar_data in familiares_data:
-            Familiar.objects.create(visita=visita, **familiar_data)
+            familiar_data.pop('id', None)
+        Familiar.objects.bulk_create([
+            Familiar(visita=visita, **familiar_data) for familiar_data in familiares_data
+        ])
         
         return visita
     
+    @transaction.atomic
     def update(self, instance, validated_data):
         familiares_data = validated_data.pop('familiares', None)
         
@@ -289,30 +380,88 @@ class VisitaCrearSerializer(serializers.ModelSerializer):
         
         # Actualizar familiares si se proporcionan
         if familiares_data is not None:
-            # Eliminar familiares existentes
-            instance.familiares.all().delete()
-            # Crear nuevos
-            for familiar_data in familiares_data:
-                Familiar.objects.create(visita=instance, **familiar_data)
+            self._sincronizar_familiares(instance, familiares_data)
         
         return instance
+    
+    def _sincronizar_familiares(self, visita, familiares_data):
+        """
+        Aplica la lista recibida como diferencia contra los familiares actuales:
+        - con id existente: se actualizan (solo si cambió algo)
+        - sin id: se crean
+        - los que no vienen en la lista: se eliminan
+        A lo sumo un INSERT, un UPDATE masivo y un DELETE.
+        """
+        existentes = {familiar.id: familiar for familiar in visita.familiares.all()}
+        nuevos, modificados, campos, conservados = [], [], set(), set()
+        
+        for familiar_data in familiares_data:
+            familiar_id = familiar_data.pop('id', None)
+            if familiar_id is None:
+                nuevos.append(Familiar(visita=visita, **familiar_data))
+                continue
+            
+            familiar = existentes.get(familiar_id)
+            if familiar is None:
+                raise serializers.ValidationError({
+                    'familiares': f'El familiar {familiar_id} no pertenece a esta visita.'
+                })
+            conservados.add(familiar_id)
+            
+            cambios = {
+                attr: value for attr, value in familiar_data.items()
+                if getattr(familiar, attr) != value
+            }
+            for attr, value in cambios.items():
+                setattr(familiar, attr, value)
+            if cambios:
+                modificados.append(familiar)
+                campos.update(cambios)
+        
+        eliminados = set(existentes) - conservados
+        
+        if eliminados:
+            Familiar.objects.filter(id__in=eliminados).delete()
+        if modificados:
+            # bulk_update no aplica auto_now
+            ahora = timezone.now()
+            for familiar in modificados:
+                familiar.fecha_actualizacion = ahora
+            Familiar.objects.bulk_update(modificados, sorted(campos | {'fecha_actualizacion'}))
+        if nuevos:
+            Familiar.objects.bulk_create(nuevos)
 
 # ============= EXPEDIENTES =============
 
-class ExpedienteSerializer(serializers.ModelSerializer):
+class ExpedienteSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
     """Serializer para expedientes"""
     usuario = UsuarioSerializer(source='user', read_only=True)
     visitas = VisitaSerializer(many=True, read_only=True)
     total_visitas = serializers.SerializerMethodField()
+    ultima_visita = serializers.SerializerMethodField()
     imagen_url = serializers.SerializerMethodField()
+    imagen_variantes = serializers.SerializerMethodField()
     
     class Meta:
         model = Expediente
         fields = '__all__'
         read_only_fields = ['fecha_creacion', 'fecha_actualizacion']
     
+    # ExpedienteViewSet anota total_visitas y ultima_visita en el queryset;
+    # si la instancia no viene anotada se usan las visitas precargadas.
     def get_total_visitas(self, obj):
-        return obj.visitas.count()
+        if hasattr(obj, 'total_visitas'):
+            return obj.total_visitas
+        return len(obj.visitas.all())
+    
+    def get_ultima_visita(self, obj):
+        if hasattr(obj, 'ultima_visita'):
+            return obj.ultima_visita
+        fechas = [visita.fecha_visita for visita in obj.visitas.all()]
+        return max(fechas) if fechas else None
+    
+    def get_imagen_variantes(self, obj):
+        return urls_variantes(obj, self.context.get('request'))
     
     def get_imagen_url(self, obj):
         if obj.imagen:
@@ -321,17 +470,75 @@ class ExpedienteSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.imagen.url)
         return None
 
-class ExpedienteCrearSerializer(serializers.ModelSerializer):
+
+class ExpedienteListaSerializer(CamposDinamicosMixin, serializers.ModelSerializer):
+    """
+    Representación compacta para el listado de expedientes.
+    No incluye las visitas (se piden con ?expand=visitas); el total y la
+    fecha de la última visita vienen anotados en el queryset.
+    """
+    usuario = UsuarioResumenSerializer(source='user', read_only=True)
+    imagen_url = serializers.SerializerMethodField()
+    imagen_variantes = serializers.SerializerMethodField()
+    total_visitas = serializers.IntegerField(read_only=True)
+    ultima_visita = serializers.DateField(read_only=True)
+
+    class Meta:
+        model = Expediente
+        fields = ['id', 'user', 'usuario', 'imagen', 'imagen_url', 'imagen_variantes', 'genero',
+                  'comentario_general', 'comentario_academico', 'comentario_economico',
+                  'activo', 'fecha_creacion', 'fecha_actualizacion',
+                  'total_visitas', 'ultima_visita']
+        expandibles = {
+            'visitas': lambda: VisitaSerializer(many=True, read_only=True),
+        }
+
+    def get_imagen_variantes(self, obj):
+        return urls_variantes(obj, self.context.get('request'))
+
+    def get_imagen_url(self, obj):
+        if obj.imagen:
+            request = self.context.get('request')
+            if request:
+                return request.build_absolute_uri(obj.imagen.url)
+        return None
+
+
+class ExpedienteCrearSerializer(CargaReferenciadaMixin, serializers.ModelSerializer):
     """Serializer con validación de tamaño de imagen"""
     imagen = serializers.ImageField(
         required=False,
         validators=[validar_tamano_imagen, validar_tipo_imagen]
     )
+    # Alternativa a imagen: id de una subida por partes ya finalizada
+    imagen_carga = CargaCompletaField('imagen')
     
     class Meta:
         model = Expediente
-        fields = ['user', 'imagen', 'genero', 'comentario_general',
+        fields = ['user', 'imagen', 'imagen_carga', 'genero', 'comentario_general',
                   'comentario_academico', 'comentario_economico', 'activo']
+        campos_carga = {'imagen_carga': 'imagen'}
+
+# ============= CARGAS POR PARTES =============
+
+class CargaArchivoSerializer(serializers.ModelSerializer):
+    """Estado de una subida por partes"""
+    class Meta:
+        model = CargaArchivo
+        fields = ['id', 'nombre', 'destino', 'content_type', 'tamano_total',
+                  'recibido', 'estado', 'fecha_creacion']
+        read_only_fields = ['id', 'recibido', 'estado', 'fecha_creacion']
+
+# ============= TRABAJOS EN SEGUNDO PLANO =============
+
+class TrabajoSerializer(serializers.ModelSerializer):
+    """Estado de un trabajo (solo lectura)"""
+    class Meta:
+        model = Trabajo
+        fields = ['id', 'tipo', 'estado', 'progreso', 'mensaje', 'resultado', 'error',
+                  'intentos', 'max_intentos', 'disponible_desde', 'fecha_creacion',
+                  'fecha_inicio', 'fecha_fin']
+        read_only_fields = fields
 
 # ============= PROYECTOS =============
 
@@ -354,12 +561,21 @@ class ProyectoSerializer(serializers.ModelSerializer):
         read_only=True
     )
     total_participantes = serializers.ReadOnlyField()
+    usuarios = serializers.SerializerMethodField()
     imagen_url = serializers.SerializerMethodField()
+    imagen_variantes = serializers.SerializerMethodField()
     
     class Meta:
         model = Proyecto
         fields = '__all__'
     
+    def get_usuarios(self, obj):
+        # Reutiliza el prefetch de participantes en vez de consultar el M2M
+        return [relacion.usuario_id for relacion in obj.proyectousuario_set.all()]
+    
+    def get_imagen_variantes(self, obj):
+        return urls_variantes(obj, self.context.get('request'))
+    
     def get_imagen_url(self, obj):
         if obj.imagen:
             request = self.context.get('request')
@@ -381,15 +597,32 @@ class ProyectoCrearSerializer(serializers.ModelSerializer):
         fields = ['nombre', 'descripcion', 'objetivo', 'imagen', 
                   'fecha_inicio', 'fecha_fin', 'activo', 'usuarios_ids']
     
+    @transaction.atomic
     def create(self, validated_data):
         usuarios_ids = validated_data.pop('usuarios_ids', [])
         proyecto = Proyecto.objects.create(**validated_data)
         
-        for user_id in usuarios_ids:
-            try:
-                usuario = CustomUser.objects.get(id=user_id)
-                ProyectoUsuario.objects.create(proyecto=proyecto, usuario=usuario)
-            except CustomUser.DoesNotExist:
-                pass
+        # Los ids inexistentes se ignoran
+        if usuarios_ids:
+            solicitados, encontrados = resolver_usuarios(usuarios_ids)
+            inscribir_usuarios(proyecto, solicitados, encontrados)
         
-        return proyecto
\ No newline at end of file
+        return proyecto
+
+
+class InscripcionMasivaSerializer(serializers.Serializer):
+    """Usuarios a inscribir/remover: lista de ids y/o filtros por sede y rol"""
+    usuarios_ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        required=False,
+        max_length=5000
+    )
+    sede = serializers.CharField(required=False)
+    rol = serializers.ChoiceField(choices=CustomUser.ROLES, required=False)
+    
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError(
+                "Se requiere usuarios_ids o un filtro (sede, rol)."
+            )
+        return attrs
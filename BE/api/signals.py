@@ -0,0 +1,148 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .autenticacion import invalidar_estado_usuario
+from .busqueda import actualizar_vector_busqueda
+from .dossier import eliminar_dossiers
+from .cache_respuestas import etiqueta_lista, etiqueta_objeto, invalidar
+from .imagenes import programar_variantes, variantes_pendientes
+from .models import CustomUser, Expediente, Familiar, Proyecto, ProyectoUsuario, Visita
+
+
+# ============= ÍNDICE DE BÚSQUEDA =============
+
+@receiver(post_save, sender=CustomUser)
+def indexar_usuario(sender, instance, update_fields=None, **kwargs):
+    # El login solo cambia last_login, que no se indexa
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    actualizar_vector_busqueda([instance.id])
+
+
+@receiver([post_save, post_delete], sender=Visita)
+def indexar_usuario_de_visita(sender, instance, **kwargs):
+    """La cédula y la institución de las visitas también se buscan"""
+    user_ids = list(
+        Expediente.objects.filter(id=instance.expediente_id).values_list('user_id', flat=True)
+    )
+    actualizar_vector_busqueda(user_ids)
+
+
+# ============= ESTADO DE AUTENTICACIÓN =============
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def revocar_estado_cacheado(sender, instance, **kwargs):
+    """Desactivar o cambiar el rol surte efecto en el siguiente request"""
+    invalidar_estado_usuario(instance.id)
+
+
+# ============= VARIANTES DE IMÁGENES =============
+
+@receiver(post_save, sender=Expediente)
+@receiver(post_save, sender=Proyecto)
+def generar_variantes_imagen(sender, instance, **kwargs):
+    """Las miniaturas se generan después del commit, fuera del request"""
+    if variantes_pendientes(instance):
+        programar_variantes(instance)
+
+
+# ============= VERSIÓN DE EXPEDIENTES Y VISITAS =============
+
+@receiver(post_save, sender=CustomUser)
+def actualizar_fecha_de_expediente(sender, instance, update_fields=None, **kwargs):
+    """
+    Los datos del usuario se muestran dentro del expediente, de sus visitas y
+    de los proyectos donde participa: cambiar la fecha invalida sus ETag.
+    """
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    ahora = timezone.now()
+    Expediente.objects.filter(user=instance).update(fecha_actualizacion=ahora)
+    Visita.objects.filter(expediente__user=instance).update(fecha_actualizacion=ahora)
+    Proyecto.objects.filter(proyectousuario__usuario=instance).update(fecha_actualizacion=ahora)
+
+
+@receiver([post_save, post_delete], sender=Expediente)
+def actualizar_fecha_de_proyectos(sender, instance, created=True, **kwargs):
+    """Los participantes de un proyecto indican si tienen expediente"""
+    if created:
+        Proyecto.objects.filter(proyectousuario__usuario_id=instance.user_id).update(
+            fecha_actualizacion=timezone.now()
+        )
+
+
+# ============= CACHÉ DE RESPUESTAS =============
+
+def _etiquetas_expediente(expediente_id):
+    return [etiqueta_lista('expediente'), etiqueta_objeto('expediente', expediente_id)]
+
+
+def _etiquetas_visita(visita_id):
+    return [etiqueta_lista('visita'), etiqueta_objeto('visita', visita_id)]
+
+
+def _etiquetas_proyecto(proyecto_id):
+    return [etiqueta_lista('proyecto'), etiqueta_objeto('proyecto', proyecto_id)]
+
+
+@receiver([post_save, post_delete], sender=Expediente)
+def invalidar_cache_expediente(sender, instance, created=True, **kwargs):
+    etiquetas = _etiquetas_expediente(instance.id)
+    if created:
+        # Los participantes de proyectos indican si tienen expediente
+        etiquetas.append(etiqueta_lista('proyecto'))
+        for proyecto_id in ProyectoUsuario.objects.filter(usuario_id=instance.user_id).values_list('proyecto_id', flat=True):
+            etiquetas.append(etiqueta_objeto('proyecto', proyecto_id))
+    invalidar(*etiquetas)
+
+
+@receiver([post_save, post_delete], sender=Visita)
+def invalidar_cache_visita(sender, instance, **kwargs):
+    """El expediente muestra sus visitas, el conteo y la última fecha"""
+    invalidar(*_etiquetas_visita(instance.id), *_etiquetas_expediente(instance.expediente_id))
+
+
+@receiver([post_save, post_delete], sender=Familiar)
+def invalidar_cache_familiar(sender, instance, **kwargs):
+    etiquetas = _etiquetas_visita(instance.visita_id)
+    # Si la visita también se está eliminando, su propia señal cubre el expediente
+    expediente_id = Visita.objects.filter(id=instance.visita_id).values_list('expediente_id', flat=True).first()
+    if expediente_id is not None:
+        etiquetas += _etiquetas_expediente(expediente_id)
+    invalidar(*etiquetas)
+
+
+@receiver([post_save, post_delete], sender=Proyecto)
+def invalidar_cache_proyecto(sender, instance, **kwargs):
+    invalidar(*_etiquetas_proyecto(instance.id))
+
+
+@receiver([post_save, post_delete], sender=ProyectoUsuario)
+def invalidar_cache_participante(sender, instance, **kwargs):
+    invalidar(*_etiquetas_proyecto(instance.proyecto_id))
+
+
+@receiver(post_save, sender=CustomUser)
+def invalidar_cache_usuario(sender, instance, update_fields=None, **kwargs):
+    """Los datos del usuario aparecen en su expediente, visitas y proyectos"""
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    etiquetas = [etiqueta_lista('expediente'), etiqueta_lista('visita'), etiqueta_lista('proyecto')]
+    for expediente_id in Expediente.objects.filter(user=instance).values_list('id', flat=True):
+        etiquetas.append(etiqueta_objeto('expediente', expediente_id))
+    for visita_id in Visita.objects.filter(expediente__user=instance).values_list('id', flat=True):
+        etiquetas.append(etiqueta_objeto('visita', visita_id))
+    for proyecto_id in ProyectoUsuario.objects.filter(usuario=instance).values_list('proyecto_id', flat=True):
+        etiquetas.append(etiqueta_objeto('proyecto', proyecto_id))
+    invalidar(*etiquetas)
+
+
+# ============= DOSSIERS PDF =============
+
+@receiver(post_delete, sender=Expediente)
+def eliminar_dossiers_de_expediente(sender, instance, **kwargs):
+    """Los PDF guardados del expediente se borran cuando se confirma la eliminación"""
+    expediente_id = instance.pk
+    transaction.on_commit(lambda: eliminar_dossiers(expediente_id))
@@ -0,0 +1,59 @@
+from django.core.files.storage import default_storage
+from django.urls import reverse
+
+from . import dossier, importacion
+from .trabajos import ErrorPermanente, avance, tarea
+
+
+# ============= TAREAS EN SEGUNDO PLANO =============
+#
+# Funciones que ejecuta `manage.py run_workers` (ver api/trabajos.py).
+# Se registran al importar este módulo desde ApiConfig.ready().
+
+@tarea('importar_atletas', max_intentos=1)
+def importar_atletas(trabajo, ruta, nombre):
+    """
+    Importación masiva desde un archivo ya guardado en el storage. No se
+    reintenta: un segundo intento reportaría como duplicadas las filas creadas.
+    """
+    if not default_storage.exists(ruta):
+        raise ErrorPermanente('El archivo a importar ya no existe.')
+    tamano = default_storage.size(ruta) or 1
+
+    try:
+        with default_storage.open(ruta, 'rb') as archivo:
+            def al_avanzar(filas, creados):
+                # La posición en el archivo aproxima el avance sin contar las filas antes
+                avance(trabajo, min(99, archivo.tell() * 100 // tamano),
+                       f'{filas} filas procesadas, {creados} atletas creados')
+
+            resultado = importacion.importar_atletas(archivo, nombre, al_avanzar=al_avanzar)
+    finally:
+        default_storage.delete(ruta)
+
+    reporte = resultado['reporte']
+    return {
+        'creados': resultado['creados'],
+        'errores': len(resultado['errores']),
+        'reporte_url': default_storage.url(reporte) if reporte else None,
+    }
+
+
+@tarea(dossier.TIPO_TRABAJO)
+def dossier_expediente(trabajo, expediente_id, ruta):
+    """PDF del expediente para la versión de los datos codificada en `ruta` (ver api/dossier.py)"""
+    url = reverse('expediente-dossier', args=[expediente_id])
+    if default_storage.exists(ruta):
+        # Otro trabajo ya generó esta versión
+        return {'ruta': ruta, 'url': url}
+
+    expediente = dossier.cargar_expediente(expediente_id)
+    avance(trabajo, 10, 'Datos del expediente cargados')
+
+    def al_avanzar(hechas, total):
+        avance(trabajo, 10 + 60 * hechas // total, f'{hechas} de {total} visitas')
+
+    contenido = dossier.generar_pdf(expediente, al_avanzar=al_avanzar)
+    avance(trabajo, 90, 'Guardando PDF')
+    ruta = dossier.guardar_dossier(ruta, contenido)
+    return {'ruta': ruta, 'url': url, 'tamano': len(contenido)}
@@ -1,3 +1,1710 @@
-from django.test import TestCase
+import csv
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import time
+import unittest
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .autenticacion import UsuarioToken, tokens_para_usuario
+from .datos_sinteticos import PREFIJO, limpiar, sembrar
+from .importacion import importar_atletas
+from .metricas import registro as registro_metricas
+from . import cargas, replicas, trabajos
+from .views import EstadisticasView, ExpedienteViewSet
+from .models import CargaArchivo, CustomUser, Expediente, Familiar, Visita, Proyecto, ProyectoUsuario, Trabajo
+
+
+# ============= UTILIDADES =============
+
+def crear_atleta(username, **kwargs):
+    return CustomUser.objects.create(
+        username=username,
+        email=f'{username}@test.com',
+        first_name=username.capitalize(),
+        last_name='Test',
+        **kwargs
+    )
+
+
+def crear_expediente(username, genero='M', **kwargs):
+    return Expediente.objects.create(user=crear_atleta(username, **kwargs), genero=genero)
+
+
+def crear_visita(expediente, fecha_visita, **kwargs):
+    datos = {
+        'institucion': 'Liceo',
+        'ano_academico': '2025',
+        'fecha_nacimiento': date(2008, 5, 17),
+        'cedula': '101110111',
+        'telefono_principal': '88888888',
+        'direccion': 'San José',
+        'tipo_vivienda': 'propia',
+        'fecha_visita': fecha_visita,
+    }
+    datos.update(kwargs)
+    return Visita.objects.create(expediente=expediente, **datos)
+
+
+# ============= PAGINACIÓN =============
+
+class PaginacionTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        for i in range(5):
+            crear_atleta(f'atleta{i}')
+
+    def test_listado_paginado_por_cursor(self):
+        response = self.client.get('/api/usuarios/', {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        self.assertNotIn('X-Total-Count', response)
+
+        vistos = [u['id'] for u in response.data['results']]
+        siguiente = response.data['next']
+        while siguiente:
+            pagina = self.client.get(siguiente)
+            vistos += [u['id'] for u in pagina.data['results']]
+            siguiente = pagina.data['next']
+        self.assertEqual(vistos, sorted(CustomUser.objects.values_list('id', flat=True)))
+
+    def test_total_opcional(self):
+        response = self.client.get('/api/usuarios/', {'page_size': 2, 'incluir_total': 'true'})
+        self.assertEqual(response['X-Total-Count'], '5')
+
+    def test_visitas_ordenadas_por_fecha(self):
+        expediente = crear_expediente('conVisitas')
+        hoy = date.today()
+        for dias in (10, 0, 5, 5):
+            crear_visita(expediente, hoy - timedelta(days=dias))
+
+        response = self.client.get('/api/visitas/', {'page_size': 3})
+        fechas = [v['fecha_visita'] for v in response.data['results']]
+        self.assertEqual(fechas, sorted(fechas, reverse=True))
+
+        resto = self.client.get(response.data['next'])
+        self.assertEqual(len(resto.data['results']), 1)
+        self.assertEqual(resto.data['results'][0]['fecha_visita'], str(hoy - timedelta(days=10)))
+
+
+# ============= LISTADO DE EXPEDIENTES =============
+
+class ExpedienteListaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.expediente = crear_expediente('compacto', genero='F', sede='Heredia')
+        crear_visita(self.expediente, date(2025, 1, 10))
+        crear_visita(self.expediente, date(2025, 3, 2))
+
+    def test_listado_compacto(self):
+        response = self.client.get('/api/expedientes/')
+        item = response.data['results'][0]
+        self.assertNotIn('visitas', item)
+        self.assertEqual(item['total_visitas'], 2)
+        self.assertEqual(item['ultima_visita'], '2025-03-02')
+        self.assertEqual(item['usuario']['sede'], 'Heredia')
+
+    def test_expand_visitas(self):
+        response = self.client.get('/api/expedientes/', {'expand': 'visitas'})
+        self.assertEqual(len(response.data['results'][0]['visitas']), 2)
+
+    def test_fields(self):
+        response = self.client.get('/api/expedientes/', {'fields': 'id,genero'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'genero'})
+
+    def test_detalle_completo(self):
+        response = self.client.get(f'/api/expedientes/{self.expediente.id}/')
+        self.assertEqual(len(response.data['visitas']), 2)
+
+
+# ============= ESTADÍSTICAS =============
+
+class EstadisticasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        hoy = date.today()
+        self.ana = crear_expediente('ana', genero='F', sede='Central')
+        self.luis = crear_expediente('luis', genero='M', sede='Norte')
+        crear_expediente('sofia', genero='F', sede='Central')
+        # La última visita define beca y edad del atleta
+        crear_visita(self.ana, hoy - timedelta(days=400), tiene_beca=False,
+                     fecha_nacimiento=date(hoy.year - 20, 1, 1))
+        crear_visita(self.ana, hoy, tiene_beca=True, monto_beca=50000,
+                     fecha_nacimiento=date(hoy.year - 16, 1, 1))
+        crear_visita(self.luis, hoy, fecha_nacimiento=date(hoy.year - 30, 1, 1))
+
+    def test_distribuciones(self):
+        data = self.client.get('/api/estadisticas/').data
+        self.assertEqual(data['total_expedientes'], 3)
+        self.assertEqual(
+            {g['genero']: g['total'] for g in data['genero']},
+            {'Femenino': 2, 'Masculino': 1},
+        )
+        self.assertEqual({s['sede']: s['total'] for s in data['sede']}, {'Central': 2, 'Norte': 1})
+        self.assertEqual({b['beca']: b['total'] for b in data['beca']}, {'Con beca': 1, 'Sin beca': 1})
+        self.assertEqual(data['edad'], [{'edad': '15-17', 'total': 1}, {'edad': '23+', 'total': 1}])
+
+    def test_cache_se_invalida_al_escribir(self):
+        self.client.get('/api/estadisticas/')
+        # Solo las dos consultas de la versión
+        with self.assertNumQueries(2):
+            self.client.get('/api/estadisticas/')
+
+        crear_expediente('nuevo', genero='O')
+        data = self.client.get('/api/estadisticas/').data
+        self.assertEqual(data['total_expedientes'], 4)
+
+    def test_escritura_de_otro_proceso(self):
+        self.client.get('/api/estadisticas/')
+        # update() no dispara señales ni toca la caché de este proceso
+        Visita.objects.filter(expediente=self.luis).update(
+            tiene_beca=True, fecha_actualizacion=timezone.now()
+        )
+        data = self.client.get('/api/estadisticas/').data
+        self.assertEqual({b['beca']: b['total'] for b in data['beca']}, {'Con beca': 2})
+
+
+# ============= BÚSQUEDA =============
+
+class BuscarTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        expediente = crear_expediente('mrodriguez', sede='Limón')
+        crear_visita(expediente, date(2025, 2, 1), cedula='703330333', institucion='Colegio Bilingüe')
+        crear_atleta('jperez', sede='Central')
+
+    def test_busca_por_usuario_y_visita(self):
+        response = self.client.get('/api/buscar/', {'q': 'mrodriguez'})
+        self.assertEqual([r['username'] for r in response.data['results']], ['mrodriguez'])
+        self.assertIsNotNone(response.data['results'][0]['expediente_id'])
+
+        response = self.client.get('/api/buscar/', {'q': '703330333'})
+        self.assertEqual(response.data['count'], 1)
+
+    def test_consulta_vacia(self):
+        response = self.client.get('/api/buscar/', {'q': ' '})
+        self.assertEqual(response.data['count'], 0)
+
+    @mock.patch('api.signals.actualizar_vector_busqueda')
+    def test_login_no_reindexa(self, actualizar):
+        usuario = CustomUser.objects.get(username='jperez')
+        usuario.last_login = timezone.now()
+        usuario.save(update_fields=['last_login'])
+        actualizar.assert_not_called()
+
+        usuario.first_name = 'Juan'
+        usuario.save()
+        actualizar.assert_called_once_with([usuario.id])
+
+
+# ============= PROYECTOS =============
+
+class ProyectoConsultasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def crear_proyectos(self, cantidad, participantes):
+        inicio = Proyecto.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            proyecto = Proyecto.objects.create(
+                nombre=f'Proyecto {i}', descripcion='-', objetivo='-',
+                fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31),
+            )
+            for j in range(participantes):
+                username = f'p{i}_{j}'
+                usuario = crear_expediente(username).user if j % 2 else crear_atleta(username)
+                ProyectoUsuario.objects.create(proyecto=proyecto, usuario=usuario, activo=j != 0)
+        return proyecto
+
+    def test_listado_con_consultas_constantes(self):
+        self.crear_proyectos(2, 2)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/proyectos/')
+        self.assertEqual(response.data['results'][0]['total_participantes'], 1)
+
+        ultimo = self.crear_proyectos(6, 5)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/proyectos/')
+        self.assertEqual(len(response.data['results']), 8)
+        resultado, = [p for p in response.data['results'] if p['id'] == ultimo.id]
+        participantes = resultado['participantes']
+        self.assertEqual(
+            [p['usuario_info']['tiene_expediente'] for p in participantes],
+            [False, True, False, True, False],
+        )
+
+    def test_detalle_con_consultas_constantes(self):
+        proyecto = self.crear_proyectos(1, 10)
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/proyectos/{proyecto.id}/')
+        self.assertEqual(response.data['total_participantes'], 9)
+
+
+# ============= CONTEOS DE VISITAS =============
+
+class ExpedienteConsultasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def crear_expedientes(self, cantidad, visitas):
+        inicio = Expediente.objects.count()
+        for i in range(inicio, inicio + cantidad):
+            expediente = crear_expediente(f'e{i}')
+            for dia in range(1, visitas + 1):
+                crear_visita(expediente, date(2025, 1, dia))
+        return expediente
+
+    def test_listado_con_consultas_constantes(self):
+        self.crear_expedientes(2, 1)
+        with self.assertNumQueries(2):
+            self.client.get('/api/expedientes/')
+
+        self.crear_expedientes(8, 4)
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/expedientes/')
+        self.assertEqual(response.data['results'][-1]['total_visitas'], 4)
+
+    def test_resumen_sin_consultas_extra(self):
+        expediente = self.crear_expedientes(1, 3)
+        # expediente anotado + visitas + familiares
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/api/expedientes/{expediente.id}/resumen/')
+        self.assertEqual(response.data['estadisticas'], {
+            'total_visitas': 3,
+            'ultima_visita': date(2025, 1, 3),
+        })
+        self.assertEqual(response.data['expediente']['total_visitas'], 3)
+
+
+# ============= FAMILIARES ANIDADOS =============
+
+class VisitaFamiliaresTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.expediente = crear_expediente('familia')
+        self.datos = {
+            'expediente': self.expediente.id,
+            'institucion': 'Liceo',
+            'ano_academico': '2025',
+            'fecha_nacimiento': '2008-05-17',
+            'cedula': '101110111',
+            'telefono_principal': '88888888',
+            'direccion': 'San José',
+            'tipo_vivienda': 'propia',
+            'fecha_visita': '2025-04-01',
+        }
+
+    def familiar(self, nombre, **kwargs):
+        return {'nombre_completo': nombre, 'edad': 40, 'parentesco': 'Madre', **kwargs}
+
+    def test_crear_con_familiares(self):
+        datos = {**self.datos, 'familiares': [self.familiar('Ana'), self.familiar('Luis')]}
+        response = self.client.post('/api/visitas/', datos, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        visita = Visita.objects.get()
+        self.assertEqual(
+            sorted(visita.familiares.values_list('nombre_completo', flat=True)),
+            ['Ana', 'Luis'],
+        )
+
+    def test_actualizar_por_diferencia(self):
+        visita = crear_visita(self.expediente, date(2025, 4, 1))
+        ana = visita.familiares.create(**self.familiar('Ana'))
+        luis = visita.familiares.create(**self.familiar('Luis'))
+        sin_cambios = visita.familiares.create(**self.familiar('Eva'))
+
+        familiares = [
+            {'id': ana.id, **self.familiar('Ana María')},
+            {'id': sin_cambios.id, **self.familiar('Eva')},
+            self.familiar('Nuevo'),
+        ]
+        response = self.client.patch(
+            f'/api/visitas/{visita.id}/', {'familiares': familiares}, format='json'
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+
+        actuales = dict(visita.familiares.values_list('id', 'nombre_completo'))
+        self.assertEqual(actuales[ana.id], 'Ana María')
+        self.assertEqual(actuales[sin_cambios.id], 'Eva')
+        self.assertNotIn(luis.id, actuales)
+        self.assertEqual(sorted(actuales.values()), ['Ana María', 'Eva', 'Nuevo'])
+
+    def test_familiar_de_otra_visita(self):
+        visita = crear_visita(self.expediente, date(2025, 4, 1))
+        otra = crear_visita(self.expediente, date(2025, 5, 1))
+        ajeno = otra.familiares.create(**self.familiar('Ajeno'))
+
+        response = self.client.patch(
+            f'/api/visitas/{visita.id}/',
+            {'familiares': [{'id': ajeno.id, **self.familiar('Cambio')}]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+        ajeno.refresh_from_db()
+        self.assertEqual(ajeno.nombre_completo, 'Ajeno')
+
+
+# ============= INSCRIPCIÓN MASIVA =============
+
+class InscripcionMasivaTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.proyecto = Proyecto.objects.create(
+            nombre='Verano', descripcion='-', objetivo='-',
+            fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31),
+        )
+        self.norte = [crear_atleta(f'norte{i}', sede='Norte') for i in range(3)]
+        self.sur = crear_atleta('sur', sede='Sur')
+        ProyectoUsuario.objects.create(proyecto=self.proyecto, usuario=self.norte[0])
+        self.url = f'/api/proyectos/{self.proyecto.id}/'
+
+    def test_agregar_por_ids(self):
+        ids = [self.norte[0].id, self.sur.id, 9999]
+        # proyecto, ids, inscritos e INSERT (+ SAVEPOINT y RELEASE)
+        with self.assertNumQueries(6):
+            response = self.client.post(self.url + 'agregar-usuarios/', {'usuarios_ids': ids}, format='json')
+        self.assertEqual(
+            [r['resultado'] for r in response.data['resultados']],
+            ['ya_inscrito', 'agregado', 'no_encontrado'],
+        )
+        self.assertEqual(self.proyecto.usuarios.count(), 2)
+
+    def test_agregar_y_remover_por_sede(self):
+        response = self.client.post(self.url + 'agregar-usuarios/', {'sede': 'Norte'}, format='json')
+        self.assertEqual(response.data['totales'], {'ya_inscrito': 1, 'agregado': 2})
+
+        response = self.client.post(
+            self.url + 'remover-usuarios/',
+            {'usuarios_ids': [self.norte[1].id, self.sur.id]},
+            format='json',
+        )
+        self.assertEqual(response.data['totales'], {'removido': 1, 'no_inscrito': 1})
+        self.assertEqual(self.proyecto.usuarios.count(), 2)
+
+    def test_requiere_usuarios(self):
+        response = self.client.post(self.url + 'agregar-usuarios/', {}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_crear_proyecto_con_usuarios(self):
+        response = self.client.post('/api/proyectos/', {
+            'nombre': 'Nuevo', 'descripcion': '-', 'objetivo': '-',
+            'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-06-30',
+            'usuarios_ids': [self.sur.id, self.sur.id, 9999],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        proyecto = Proyecto.objects.get(nombre='Nuevo')
+        self.assertEqual(list(proyecto.usuarios.all()), [self.sur])
+
+
+# ============= IMPORTACIÓN DE ATLETAS =============
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class ImportarAtletasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        crear_atleta('existente')
+
+    def archivo(self, filas):
+        contenido = 'username,email,first_name,last_name,sede,genero\n' + '\n'.join(filas)
+        return SimpleUploadedFile('atletas.csv', contenido.encode('utf-8'), content_type='text/csv')
+
+    def test_importar_csv(self):
+        archivo = self.archivo([
+            'nuevo1,Nuevo1@test.com,Ana,Mora,Norte,F',
+            'nuevo2,nuevo2@test.com,Luis,Soto,Sur,',
+            'existente,otro@test.com,Eva,Rojas,Sur,F',
+            'nuevo1,repetido@test.com,Ana,Mora,Norte,F',
+            'malo,no-es-correo,X,Y,,M',
+        ])
+        response = self.client.post('/api/usuarios/importar-atletas/', {'archivo': archivo})
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['creados'], 2)
+        self.assertEqual(response.data['errores'], 3)
+        self.assertIsNotNone(response.data['reporte_url'])
+
+        nuevo = CustomUser.objects.get(username='nuevo1')
+        self.assertEqual(nuevo.email, 'nuevo1@test.com')
+        self.assertTrue(nuevo.check_password('nuevo1123'))
+        self.assertEqual(nuevo.expediente.genero, 'F')
+        self.assertFalse(Expediente.objects.filter(user__username='nuevo2').exists())
+
+    def test_consultas_por_lote(self):
+        filas = [f'a{i},a{i}@test.com,A,B,,M' for i in range(30)]
+        # validación de unicidad + INSERT usuarios + INSERT expedientes (+ SAVEPOINT/RELEASE),
+        # y en PostgreSQL el UPDATE del índice de búsqueda
+        consultas = 6 if connection.vendor == 'postgresql' else 5
+        with self.assertNumQueries(consultas):
+            resultado = importar_atletas(self.archivo(filas), 'atletas.csv', tamano_lote=50)
+        self.assertEqual(resultado['creados'], 30)
+
+    def test_correo_existente_sin_importar_mayusculas(self):
+        CustomUser.objects.filter(pk=crear_atleta('mayusculas').pk).update(email='Ana.Mora@Test.com')
+        resultado = importar_atletas(self.archivo(['ana,ana.mora@test.com,Ana,Mora,,F']), 'atletas.csv')
+        self.assertEqual(resultado['creados'], 0)
+        self.assertEqual(resultado['errores'][0][2], 'email: Este correo ya está registrado.')
+
+    def test_alta_concurrente_en_otro_lote(self):
+        bulk_create = CustomUser.objects.bulk_create
+
+        def competir(usuarios, *args, **kwargs):
+            # Alguien se registra con 'b1' entre la revisión y el INSERT del segundo lote
+            if any(usuario.username == 'b1' for usuario in usuarios):
+                crear_atleta('b1')
+            return bulk_create(usuarios, *args, **kwargs)
+
+        filas = ['a1,a1@test.com,A,B,,M', 'a2,a2@test.com,A,B,,M', 'b1,b1@otro.com,A,B,,M', 'b2,b2@test.com,A,B,,M']
+        with mock.patch.object(CustomUser.objects, 'bulk_create', side_effect=competir):
+            resultado = importar_atletas(self.archivo(filas), 'atletas.csv', tamano_lote=2)
+
+        self.assertEqual(resultado['creados'], 2)
+        self.assertEqual([(fila, username) for fila, username, _ in resultado['errores']], [(4, 'b1'), (5, 'b2')])
+        self.assertIsNotNone(resultado['reporte'])
+        self.assertTrue(CustomUser.objects.filter(username='a2').exists())
+        self.assertFalse(CustomUser.objects.filter(username='b2').exists())
+
+    def test_formato_no_soportado(self):
+        archivo = SimpleUploadedFile('atletas.txt', b'x')
+        response = self.client.post('/api/usuarios/importar-atletas/', {'archivo': archivo})
+        self.assertEqual(response.status_code, 400)
+
+
+# ============= AUTENTICACIÓN CON CLAIMS =============
+
+class TokenConRolTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = crear_atleta('jefa', rol='admin', sede='Central')
+        self.admin.set_password('clave-segura-1')
+        self.admin.save()
+
+    def login(self):
+        response = self.client.post('/api/auth/login/', {
+            'username': 'jefa', 'password': 'clave-segura-1'
+        }, format='json')
+        return response.data['tokens']['access']
+
+    def test_claims_en_token(self):
+        response = self.client.post('/api/token/', {
+            'username': 'jefa', 'password': 'clave-segura-1'
+        }, format='json')
+        token = AccessToken(response.data['access'])
+        self.assertEqual((token['rol'], token['sede'], token['activo']), ('admin', 'Central', True))
+
+    def test_permisos_sin_consultas(self):
+        from .permisions import IsAdmin, IsStaff
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.login()}')
+        self.client.get('/api/estadisticas/')  # llena las cachés
+        with CaptureQueriesContext(connection) as consultas:
+            response = self.client.get('/api/estadisticas/')
+            request = response.renderer_context['request']
+            self.assertTrue(IsAdmin().has_permission(request, None))
+            self.assertTrue(IsStaff().has_permission(request, None))
+        # Solo la versión de las estadísticas: ni el usuario ni su rol se consultan
+        self.assertFalse([c['sql'] for c in consultas if 'api_customuser' in c['sql']])
+        self.assertEqual(len(consultas), 2)
+        self.assertIsInstance(request.user, UsuarioToken)
+        self.assertEqual(request.user.id, self.admin.id)
+
+    def test_usuario_desactivado_es_rechazado(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.login()}')
+        self.assertEqual(self.client.get('/api/estadisticas/').status_code, 200)
+
+        self.admin.activo = False
+        self.admin.save()
+        self.assertEqual(self.client.get('/api/estadisticas/').status_code, 401)
+
+    def test_cambio_de_rol_invalida_token(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.login()}')
+        self.admin.rol = 'staff'
+        self.admin.save()
+        self.assertEqual(self.client.get('/api/estadisticas/').status_code, 401)
+
+    def test_perfil_usa_usuario_completo(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.login()}')
+        response = self.client.get('/api/auth/perfil/')
+        self.assertEqual(response.data['username'], 'jefa')
+
+
+# ============= VARIANTES DE IMÁGENES =============
+
+def imagen_png(nombre='foto.png', lado=1500):
+    salida = io.BytesIO()
+    Image.new('RGB', (lado, lado // 2), 'red').save(salida, format='PNG')
+    return SimpleUploadedFile(nombre, salida.getvalue(), content_type='image/png')
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), VARIANTES_SINCRONAS=True)
+class VariantesImagenTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_variantes_al_subir_imagen(self):
+        usuario = crear_atleta('foto')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/expedientes/', {
+                'user': usuario.id, 'genero': 'M', 'imagen': imagen_png(),
+            })
+        self.assertEqual(response.status_code, 201, response.data)
+
+        expediente = Expediente.objects.get(user=usuario)
+        variantes = expediente.imagen_variantes
+        self.assertEqual(variantes['original'], expediente.imagen.name)
+        with default_storage.open(variantes['thumb']) as archivo, Image.open(archivo) as thumb:
+            self.assertEqual(thumb.format, 'WEBP')
+            self.assertEqual(thumb.size, (160, 80))
+
+        data = self.client.get(f'/api/expedientes/{expediente.id}/').data
+        self.assertEqual(set(data['imagen_variantes']), {'thumb', 'medium', 'large'})
+        self.assertTrue(data['imagen_variantes']['thumb'].endswith('_thumb.webp'))
+
+    def test_comando_rellena_variantes(self):
+        expediente = crear_expediente('sinvariantes')
+        expediente.imagen.save('vieja.png', imagen_png(), save=False)
+        Expediente.objects.filter(pk=expediente.pk).update(imagen=expediente.imagen.name)
+
+        call_command('generar_variantes', stdout=io.StringIO())
+        expediente.refresh_from_db()
+        self.assertIn('large', expediente.imagen_variantes)
+
+        # --todas vuelve a codificar los archivos existentes
+        ruta = expediente.imagen_variantes['thumb']
+        default_storage.delete(ruta)
+        default_storage.save(ruta, ContentFile(b'danado'))
+        call_command('generar_variantes', '--todas', stdout=io.StringIO())
+        expediente.refresh_from_db()
+        self.assertEqual(expediente.imagen_variantes['thumb'], ruta)
+        with default_storage.open(ruta) as archivo, Image.open(archivo) as thumb:
+            self.assertEqual(thumb.format, 'WEBP')
+
+    def test_misma_imagen_en_dos_registros(self):
+        expedientes = [crear_expediente('igual1'), crear_expediente('igual2')]
+        for expediente in expedientes:
+            with self.captureOnCommitCallbacks(execute=True):
+                expediente.imagen.save('igual.png', imagen_png(), save=True)
+        primero, segundo = [Expediente.objects.get(pk=e.pk) for e in expedientes]
+        self.assertNotEqual(primero.imagen_variantes['thumb'], segundo.imagen_variantes['thumb'])
+
+        # Cambiar la imagen de uno no borra las variantes del otro
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.imagen.save('otra.png', imagen_png(lado=300), save=True)
+        for ruta in (segundo.imagen_variantes[nombre] for nombre in ('thumb', 'medium', 'large')):
+            self.assertTrue(default_storage.exists(ruta))
+
+
+# ============= SUBIDAS POR PARTES =============
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CARGAS_TEMP_DIR=tempfile.mkdtemp())
+class CargasTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.pdf = b'%PDF-1.4\n' + b'x' * 1000
+
+    def iniciar(self, contenido, destino='adjunto_notas', content_type='application/pdf'):
+        response = self.client.post('/api/cargas/', {
+            'nombre': 'notas.pdf', 'destino': destino,
+            'content_type': content_type, 'tamano_total': len(contenido),
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return f"/api/cargas/{response.data['id']}/"
+
+    def parte(self, url, datos, offset):
+        return self.client.generic(
+            'PATCH', url, datos,
+            content_type='application/offset+octet-stream',
+            HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def subir(self, contenido, **kwargs):
+        url = self.iniciar(contenido, **kwargs)
+        for offset in range(0, len(contenido), 400):
+            response = self.parte(url, contenido[offset:offset + 400], offset)
+            self.assertEqual(response.status_code, 200, response.data)
+        return url
+
+    def test_subida_reanudable_y_uso_en_visita(self):
+        url = self.iniciar(self.pdf)
+        self.parte(url, self.pdf[:400], 0)
+
+        # Reintento con offset viejo: se informa dónde continuar
+        response = self.parte(url, self.pdf[:400], 0)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Upload-Offset'], '400')
+
+        self.assertEqual(self.client.get(url)['Upload-Offset'], '400')
+        self.parte(url, self.pdf[400:], 400)
+        carga = self.client.post(url + 'finalizar/').data
+        self.assertEqual(carga['estado'], 'completa')
+
+        expediente = crear_expediente('notas')
+        response = self.client.post('/api/visitas/', {
+            'expediente': expediente.id, 'institucion': 'Liceo', 'ano_academico': '2025',
+            'fecha_nacimiento': '2008-05-17', 'cedula': '1', 'telefono_principal': '8',
+            'direccion': 'San José', 'tipo_vivienda': 'propia', 'fecha_visita': '2025-04-01',
+            'adjunto_notas_carga': carga['id'],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+
+        visita = Visita.objects.get()
+        with visita.adjunto_notas.open('rb') as archivo:
+            self.assertEqual(archivo.read(), self.pdf)
+        self.assertFalse(CargaArchivo.objects.exists())
+
+    def test_rechaza_contenido_de_otro_tipo(self):
+        url = self.iniciar(b'no es un pdf')
+        response = self.parte(url, b'no es un pdf', 0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(url).data['recibido'], 0)
+
+    def test_rechaza_mas_datos_que_los_declarados(self):
+        url = self.iniciar(self.pdf)
+        response = self.parte(url, self.pdf + b'extra', 0)
+        self.assertEqual(response.status_code, 400)
+
+    def test_parte_simultanea_gana_la_primera_en_bloquear(self):
+        url = self.iniciar(self.pdf)
+        carga_id = url.rstrip('/').rsplit('/', 1)[-1]
+
+        class StreamLento(io.BytesIO):
+            """Mientras se lee esta parte, otra con el mismo offset termina antes"""
+            def read(lector, *args):
+                if lector.tell() == 0:
+                    cargas.agregar_parte(carga_id, 0, io.BytesIO(self.pdf[:400]))
+                return super().read(*args)
+
+        with self.assertRaises(cargas.OffsetIncorrecto) as contexto:
+            cargas.agregar_parte(carga_id, 0, StreamLento(self.pdf[:500]))
+        self.assertEqual(contexto.exception.esperado, 400)
+        with open(CargaArchivo.objects.get().ruta_temporal, 'rb') as archivo:
+            self.assertEqual(archivo.read(), self.pdf[:400])
+
+    def test_no_finaliza_incompleta(self):
+        url = self.iniciar(self.pdf)
+        self.parte(url, self.pdf[:10], 0)
+        self.assertEqual(self.client.post(url + 'finalizar/').status_code, 400)
+
+    def test_imagen_de_expediente(self):
+        png = imagen_png(lado=200).read()
+        url = self.subir(png, destino='imagen', content_type='image/png')
+        carga_id = self.client.post(url + 'finalizar/').data['id']
+
+        usuario = crear_atleta('conimagen')
+        response = self.client.post('/api/expedientes/', {
+            'user': usuario.id, 'genero': 'F', 'imagen_carga': carga_id,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(Expediente.objects.get(user=usuario).imagen.name.startswith('imagenes_perfil/'))
+
+
+# ============= ENTREGA DE MEDIA =============
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class MedioTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.contenido = bytes(range(256)) * 4
+        self.ruta = default_storage.save('adjuntos_notas/notas.pdf', ContentFile(self.contenido))
+        self.url = f'/media/{self.ruta}'
+        self.client.force_authenticate(crear_atleta('personal_medios', rol='staff'))
+
+    def leer(self, response):
+        return b''.join(response.streaming_content)
+
+    def test_archivo_completo_y_304(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.leer(response), self.contenido)
+        self.assertEqual(response['Cache-Control'], 'private, no-cache')
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_rangos(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 10-19/{len(self.contenido)}')
+        self.assertEqual(self.leer(response), self.contenido[10:20])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-5')
+        self.assertEqual(self.leer(response), self.contenido[-5:])
+
+        response = self.client.get(self.url, HTTP_RANGE='bytes=5000-')
+        self.assertEqual(response.status_code, 416)
+
+    def test_variantes_inmutables(self):
+        ruta = default_storage.save('imagenes_perfil/variantes/expediente_7_0123456789abcdef_thumb.webp', ContentFile(b'x'))
+        response = self.client.get(f'/media/{ruta}')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    @override_settings(MEDIA_ENTREGA='x-accel')
+    def test_delegacion_a_nginx(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], f'/media-interno/{self.ruta}')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_ENTREGA='x-accel')
+    def test_privados_requieren_sesion(self):
+        self.client.force_authenticate(None)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+        self.assertNotIn('X-Accel-Redirect', response)
+
+        ruta = default_storage.save('imagenes_perfil/foto.png', ContentFile(b'x'))
+        self.assertEqual(self.client.get(f'/media/{ruta}').status_code, 200)
+
+    def test_atleta_solo_ve_lo_suyo(self):
+        expediente = crear_expediente('duenio_medios')
+        crear_visita(expediente, date(2025, 1, 10), adjunto_notas=self.ruta)
+        dossier = default_storage.save(f'dossiers/expediente_{expediente.id}/abc.pdf', ContentFile(b'%PDF'))
+        reporte = default_storage.save('reportes_importacion/r.csv', ContentFile(b'x'))
+
+        self.client.force_authenticate(expediente.user)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(f'/media/{dossier}').status_code, 200)
+        self.assertEqual(self.client.get(f'/media/{reporte}').status_code, 403)
+
+        otro = crear_atleta('otro_medios')
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(otro)['access']}")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.client.get(f'/media/{dossier}').status_code, 403)
+
+    def test_rutas_no_permitidas(self):
+        default_storage.save('cargas_tmp/secreto.part', ContentFile(b'x'))
+        self.assertEqual(self.client.get('/media/cargas_tmp/secreto.part').status_code, 404)
+        self.assertEqual(self.client.get('/media/adjuntos_notas/../../settings.py').status_code, 404)
+
+
+# ============= GET CONDICIONAL =============
+
+class RespuestaCondicionalTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.expediente = crear_expediente('condicional')
+        self.visita = crear_visita(self.expediente, date(2025, 3, 1))
+
+    def revalidar(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+
+    def test_304_sin_serializar(self):
+        url = f'/api/expedientes/{self.expediente.id}/'
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+
+        # Solo la consulta de agregados
+        with self.assertNumQueries(1):
+            response = self.revalidar(url, response)
+        self.assertEqual(response.status_code, 304)
+
+    def test_listado_304_con_una_consulta(self):
+        response = self.client.get('/api/visitas/')
+        self.assertIn('Last-Modified', response)
+
+        # Solo los agregados de las filas de la página
+        with self.assertNumQueries(1):
+            response = self.revalidar('/api/visitas/', response)
+        self.assertEqual(response.status_code, 304)
+
+        self.visita.institucion = 'Otra'
+        self.visita.save()
+        self.assertEqual(self.revalidar('/api/visitas/', response).status_code, 200)
+
+    def test_cambio_en_familiar_invalida_expediente_y_visita(self):
+        urls = [f'/api/expedientes/{self.expediente.id}/', f'/api/visitas/?expediente_id={self.expediente.id}']
+        respuestas = [self.client.get(url) for url in urls]
+
+        Familiar.objects.create(visita=self.visita, nombre_completo='Ana', edad=40, parentesco='Madre')
+        for url, response in zip(urls, respuestas):
+            self.assertEqual(self.revalidar(url, response).status_code, 200)
+
+    def test_eliminacion_invalida_listado(self):
+        otra = crear_visita(self.expediente, date(2025, 3, 2))
+        response = self.client.get('/api/visitas/')
+        self.assertEqual(self.revalidar('/api/visitas/', response).status_code, 304)
+
+        otra.delete()
+        self.assertEqual(self.revalidar('/api/visitas/', response).status_code, 200)
+
+    def test_cambio_de_usuario_invalida_expediente(self):
+        url = f'/api/expedientes/{self.expediente.id}/'
+        response = self.client.get(url)
+
+        usuario = self.expediente.user
+        usuario.first_name = 'Otro'
+        usuario.save()
+        self.assertEqual(self.revalidar(url, response).status_code, 200)
+
+    def test_inscripcion_invalida_proyecto(self):
+        proyecto = Proyecto.objects.create(
+            nombre='P', descripcion='d', objetivo='o',
+            fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31),
+        )
+        url = f'/api/proyectos/{proyecto.id}/'
+        response = self.client.get(url)
+        self.assertEqual(self.revalidar(url, response).status_code, 304)
+
+        self.client.post(f'{url}agregar-usuarios/', {'usuarios_ids': [self.expediente.user_id]}, format='json')
+        self.assertEqual(self.revalidar(url, response).status_code, 200)
+
+        # Los participantes muestran datos del usuario
+        response = self.client.get(url)
+        usuario = self.expediente.user
+        usuario.last_name = 'Cambiado'
+        usuario.save()
+        self.assertEqual(self.revalidar(url, response).status_code, 200)
+
+    def test_etag_distinto_por_pagina_y_filtro(self):
+        a = self.client.get('/api/expedientes/')
+        b = self.client.get('/api/expedientes/?activo=true')
+        self.assertNotEqual(a['ETag'], b['ETag'])
+
+
+# ============= CACHÉ DE RESPUESTAS =============
+
+# TransactionTestCase: dentro de una transacción la caché se omite a propósito
+class CacheRespuestasTests(TransactionTestCase):
+    def setUp(self):
+        caches['respuestas'].clear()
+        self.client = APIClient()
+        self.expediente = crear_expediente('cacheado')
+        self.visita = crear_visita(self.expediente, date(2025, 4, 1))
+
+    def tearDown(self):
+        caches['respuestas'].clear()
+
+    def test_segunda_lectura_desde_cache(self):
+        primera = self.client.get('/api/expedientes/')
+        self.assertEqual(primera['X-Cache'], 'MISS')
+
+        # Solo la consulta de agregados del ETag
+        with self.assertNumQueries(1):
+            segunda = self.client.get('/api/expedientes/')
+        self.assertEqual(segunda['X-Cache'], 'HIT')
+        self.assertEqual(segunda.json(), primera.json())
+
+    def test_escritura_de_otro_proceso(self):
+        url = '/api/visitas/'
+        primera = self.client.get(url)
+
+        # update() no dispara señales: como una escritura hecha por otro worker,
+        # las etiquetas de la caché de este proceso no cambian
+        Visita.objects.filter(pk=self.visita.pk).update(institucion='Otra', fecha_actualizacion=timezone.now())
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=primera['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['institucion'], 'Otra')
+
+    def test_invalidacion_precisa(self):
+        otro = crear_expediente('otro')
+        urls = [f'/api/expedientes/{self.expediente.id}/', f'/api/expedientes/{otro.id}/', f'/api/visitas/{self.visita.id}/']
+        for url in urls:
+            self.client.get(url)
+
+        Familiar.objects.create(visita=self.visita, nombre_completo='Luis', edad=50, parentesco='Padre')
+
+        self.assertEqual(self.client.get(urls[0])['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get(urls[1])['X-Cache'], 'HIT')
+        response = self.client.get(urls[2])
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(len(response.data['familiares']), 1)
+
+    def test_inscripcion_masiva_invalida_proyecto(self):
+        proyecto = Proyecto.objects.create(
+            nombre='P', descripcion='d', objetivo='o',
+            fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31),
+        )
+        url = f'/api/proyectos/{proyecto.id}/'
+        self.client.get(url)
+        self.client.post(f'{url}agregar-usuarios/', {'usuarios_ids': [self.expediente.user_id]}, format='json')
+
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['total_participantes'], 1)
+
+    def test_clave_por_rol(self):
+        self.client.get('/api/visitas/')
+        admin = crear_atleta('admin_cache', rol='admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(admin)['access']}")
+        self.assertEqual(self.client.get('/api/visitas/')['X-Cache'], 'MISS')
+        self.assertEqual(self.client.get('/api/visitas/')['X-Cache'], 'HIT')
+
+    def test_metricas(self):
+        self.client.get('/api/proyectos/')
+        self.client.get('/api/proyectos/')
+        response = self.client.get('/api/cache/metricas/')
+        self.assertEqual(response.data['proyecto'], {'hits': 1, 'misses': 1, 'ratio': 0.5})
+
+
+# ============= REGRESIÓN DE CONSULTAS =============
+
+# MD5: el hash real (PBKDF2) de crear usuarios y login dominaría los tiempos
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    MEDIA_ROOT=tempfile.mkdtemp(),
+    CARGAS_TEMP_DIR=tempfile.mkdtemp(),
+)
+class ConsultasPorEndpointTests(TestCase):
+    """
+    Cada endpoint se mide con N y con 10N objetos: el número de consultas no
+    debe crecer con N (un N+1 falla aquí). También se registran bytes y tiempo,
+    sin afirmar sobre el tiempo (depende de la máquina); con
+    REPORTE_RENDIMIENTO=<ruta> se guardan en JSON para comparar entre corridas.
+    """
+    N = 3
+
+    reporte = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        ruta = os.environ.get('REPORTE_RENDIMIENTO')
+        if ruta and cls.reporte:
+            with open(ruta, 'w', encoding='utf-8') as salida:
+                json.dump(cls.reporte, salida, indent=2, sort_keys=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.admin = crear_atleta('admin_consultas', rol='admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(self.admin)['access']}")
+        self.principal = crear_expediente('principal')
+        self.proyecto = Proyecto.objects.create(
+            nombre='Principal', descripcion='d', objetivo='o',
+            fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31),
+        )
+        self.carga = cargas.iniciar_carga('notas.pdf', 'adjunto_notas', 'application/pdf', 10)
+        self.trabajo = trabajos.encolar('importar_atletas', {'ruta': 'x.csv', 'nombre': 'x.csv'})
+        self.sembrados = 0
+
+    def sembrar(self, total):
+        """Lleva el conjunto de datos a `total` atletas, visitas e inscripciones"""
+        for i in range(self.sembrados, total):
+            expediente = crear_expediente(f'carga{i}', genero='MF'[i % 2], sede='Norte')
+            visita = crear_visita(expediente, date(2025, 1, 1) + timedelta(days=i))
+            Familiar.objects.create(visita=visita, nombre_completo=f'F{i}', edad=40, parentesco='Madre')
+            propia = crear_visita(self.principal, date(2024, 1, 1) + timedelta(days=i))
+            Familiar.objects.create(visita=propia, nombre_completo=f'P{i}', edad=12, parentesco='Hermano')
+            ProyectoUsuario.objects.create(proyecto=self.proyecto, usuario=expediente.user, activo=i % 3 != 0)
+        self.sembrados = total
+
+    def medir(self, nombre, metodo, url, datos=None, formato='json'):
+        # Vaciar cachés (estadísticas, estado de autenticación) para medir siempre lo mismo
+        cache.clear()
+        with CaptureQueriesContext(connection) as consultas:
+            inicio = time.perf_counter()
+            response = getattr(self.client, metodo)(url, datos, format=formato)
+            # Las respuestas por streaming consultan mientras se recorren
+            contenido = b''.join(response.streaming_content) if response.streaming else response.content
+            segundos = time.perf_counter() - inicio
+        self.assertLess(response.status_code, 400, f'{nombre}: {getattr(response, "data", "")}')
+        return {
+            'consultas': len(consultas),
+            'bytes': len(contenido),
+            'ms': round(segundos * 1000, 2),
+        }
+
+    def comparar(self, nombre, pequeno, grande):
+        self.reporte[nombre] = {'N': pequeno, '10N': grande}
+        with self.subTest(endpoint=nombre):
+            self.assertEqual(
+                grande['consultas'], pequeno['consultas'],
+                f'{nombre}: {pequeno["consultas"]} consultas con N, {grande["consultas"]} con 10N',
+            )
+            # El tamaño puede crecer con los datos, pero no más que ellos
+            self.assertLessEqual(grande['bytes'], 12 * pequeno['bytes'], nombre)
+
+    def lecturas(self):
+        return [
+            ('usuarios: lista', '/api/usuarios/'),
+            ('usuarios: detalle', f'/api/usuarios/{self.principal.user_id}/'),
+            ('usuarios: filtros', '/api/usuarios/?rol=user&activo=true&sede=Norte'),
+            ('expedientes: lista', '/api/expedientes/'),
+            ('expedientes: lista expandida', '/api/expedientes/?expand=visitas'),
+            ('expedientes: detalle', f'/api/expedientes/{self.principal.id}/'),
+            ('expedientes: resumen', f'/api/expedientes/{self.principal.id}/resumen/'),
+            ('visitas: lista', '/api/visitas/'),
+            ('visitas: por expediente', f'/api/visitas/?expediente_id={self.principal.id}'),
+            ('visitas: detalle', f'/api/visitas/{self.principal.visitas.first().id}/'),
+            ('familiares: lista', '/api/familiares/'),
+            ('proyectos: lista', '/api/proyectos/'),
+            ('proyectos: detalle', f'/api/proyectos/{self.proyecto.id}/'),
+            ('proyecto-usuarios: lista', '/api/proyecto-usuarios/'),
+            ('estadisticas', '/api/estadisticas/'),
+            ('buscar', '/api/buscar/?q=carga'),
+            ('perfil', '/api/auth/perfil/'),
+            ('familiares: detalle', f'/api/familiares/{self.principal.visitas.first().familiares.first().id}/'),
+            ('proyecto-usuarios: detalle', f'/api/proyecto-usuarios/{self.proyecto.proyectousuario_set.first().id}/'),
+            ('visitas: exportar', '/api/visitas/exportar/'),
+            ('cargas: detalle', f'/api/cargas/{self.carga.id}/'),
+            ('trabajos: detalle', f'/api/trabajos/{self.trabajo.id}/'),
+            ('cache: metricas', '/api/cache/metricas/'),
+            ('metricas', '/api/metricas/'),
+            ('async: expedientes', '/api/async/expedientes/'),
+            ('async: expediente', f'/api/async/expedientes/{self.principal.id}/'),
+            ('async: resumen', f'/api/async/expedientes/{self.principal.id}/resumen/'),
+            ('async: visitas', '/api/async/visitas/'),
+            ('async: visita', f'/api/async/visitas/{self.principal.visitas.first().id}/'),
+            ('async: proyectos', '/api/async/proyectos/'),
+        ]
+
+    def acciones(self, sufijo):
+        """Escrituras y acciones POST; `sufijo` evita choques entre la corrida con N y con 10N"""
+        usuario = self.principal.user_id
+        visita = self.principal.visitas.first().id
+        proyecto = f'/api/proyectos/{self.proyecto.id}/'
+        return [
+            ('usuarios: crear-atleta', 'post', '/api/usuarios/crear-atleta/', {
+                'username': f'nuevo{sufijo}', 'email': f'nuevo{sufijo}@test.com',
+                'first_name': 'Nuevo', 'last_name': 'Atleta', 'genero': 'F',
+            }),
+            ('usuarios: desactivar', 'post', f'/api/usuarios/{usuario}/desactivar/', None),
+            ('usuarios: activar', 'post', f'/api/usuarios/{usuario}/activar/', None),
+            ('usuarios: resetear-password', 'post', f'/api/usuarios/{usuario}/resetear_password/', None),
+            ('visitas: agregar-familiar', 'post', f'/api/visitas/{visita}/agregar-familiar/', {
+                'visita': visita, 'nombre_completo': f'Nuevo{sufijo}', 'edad': 30, 'parentesco': 'Tía',
+            }),
+            ('proyectos: agregar-usuario', 'post', f'{proyecto}agregar-usuario/', {'usuario_id': usuario}),
+            ('proyectos: remover-usuario', 'post', f'{proyecto}remover-usuario/', {'usuario_id': usuario}),
+            ('cargas: crear', 'post', '/api/cargas/', {
+                'nombre': f'notas{sufijo}.pdf', 'destino': 'adjunto_notas',
+                'content_type': 'application/pdf', 'tamano_total': 10,
+            }),
+            ('expedientes: dossier', 'get', f'/api/expedientes/{self.principal.id}/dossier/', None),
+        ]
+
+    def test_lecturas(self):
+        self.sembrar(self.N)
+        pequeno = {nombre: self.medir(nombre, 'get', url) for nombre, url in self.lecturas()}
+        self.sembrar(10 * self.N)
+        for nombre, url in self.lecturas():
+            self.comparar(nombre, pequeno[nombre], self.medir(nombre, 'get', url))
+
+    def test_acciones(self):
+        self.sembrar(self.N)
+        pequeno = {nombre: self.medir(nombre, metodo, url, datos) for nombre, metodo, url, datos in self.acciones('n')}
+        self.sembrar(10 * self.N)
+        for nombre, metodo, url, datos in self.acciones('10n'):
+            self.comparar(nombre, pequeno[nombre], self.medir(nombre, metodo, url, datos))
+
+    def test_inscripcion_masiva(self):
+        self.sembrar(10 * self.N)
+        ids = list(CustomUser.objects.filter(rol='user').values_list('id', flat=True))
+        resultados = {}
+        for cantidad in (self.N, 10 * self.N):
+            proyecto = Proyecto.objects.create(
+                nombre=f'P{cantidad}', descripcion='d', objetivo='o',
+                fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31),
+            )
+            url = f'/api/proyectos/{proyecto.id}/'
+            resultados[cantidad] = (
+                self.medir('agregar-usuarios', 'post', f'{url}agregar-usuarios/', {'usuarios_ids': ids[:cantidad]}),
+                self.medir('remover-usuarios', 'post', f'{url}remover-usuarios/', {'usuarios_ids': ids[:cantidad]}),
+            )
+        for indice, nombre in enumerate(['proyectos: agregar-usuarios', 'proyectos: remover-usuarios']):
+            self.comparar(nombre, resultados[self.N][indice], resultados[10 * self.N][indice])
+
+    def test_visita_con_familiares(self):
+        datos = {
+            'expediente': self.principal.id,
+            'institucion': 'Liceo',
+            'ano_academico': '2025',
+            'fecha_nacimiento': '2008-05-17',
+            'cedula': '101110111',
+            'telefono_principal': '88888888',
+            'direccion': 'San José',
+            'tipo_vivienda': 'propia',
+            'fecha_visita': '2025-04-01',
+        }
+        resultados = {}
+        for cantidad in (self.N, 10 * self.N):
+            familiares = [
+                {'nombre_completo': f'F{i}', 'edad': 40, 'parentesco': 'Tío'} for i in range(cantidad)
+            ]
+            crear = self.medir('crear', 'post', '/api/visitas/', {**datos, 'familiares': familiares})
+            visita = Visita.objects.latest('id')
+            editados = [
+                {'id': familiar.id, 'nombre_completo': f'{familiar.nombre_completo}!', 'edad': 41, 'parentesco': 'Tío'}
+                for familiar in visita.familiares.all()
+            ]
+            editar = self.medir('editar', 'patch', f'/api/visitas/{visita.id}/', {'familiares': editados})
+            resultados[cantidad] = (crear, editar)
+        for indice, nombre in enumerate(['visitas: crear con familiares', 'visitas: editar familiares']):
+            self.comparar(nombre, resultados[self.N][indice], resultados[10 * self.N][indice])
+
+    def test_importar_atletas(self):
+        resultados = {}
+        for cantidad in (self.N, 10 * self.N):
+            filas = '\n'.join(f'imp{cantidad}_{i},imp{cantidad}_{i}@test.com,A,B,Norte,F' for i in range(cantidad))
+            archivo = SimpleUploadedFile(
+                'atletas.csv',
+                f'username,email,first_name,last_name,sede,genero\n{filas}'.encode('utf-8'),
+                content_type='text/csv',
+            )
+            resultados[cantidad] = self.medir(
+                'importar', 'post', '/api/usuarios/importar-atletas/', {'archivo': archivo}, formato='multipart'
+            )
+        self.comparar('usuarios: importar-atletas', resultados[self.N], resultados[10 * self.N])
+
+
+# ============= DATOS SINTÉTICOS =============
+
+class DatosSinteticosTests(TestCase):
+    def test_sembrar_es_reproducible(self):
+        conteos = sembrar(atletas=20, staff=2, proyectos=2, semilla=7)
+        self.assertEqual(conteos['usuarios'], 22)
+        self.assertEqual(Expediente.objects.count(), 20)
+        primera = list(Visita.objects.order_by('id').values_list('cedula', 'gastos_totales'))
+
+        limpiar()
+        self.assertFalse(CustomUser.objects.filter(username__startswith=PREFIJO).exists())
+        sembrar(atletas=20, staff=2, proyectos=2, semilla=7)
+        segunda = list(Visita.objects.order_by('id').values_list('cedula', 'gastos_totales'))
+        self.assertEqual(primera, segunda)
+
+    def test_staff_puede_iniciar_sesion(self):
+        sembrar(atletas=5, staff=1, proyectos=1, password='clave-prueba')
+        response = APIClient().post(
+            '/api/auth/login/', {'username': f'{PREFIJO}staff_0', 'password': 'clave-prueba'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+# ============= EXPORTACIÓN =============
+
+class ExportarVisitasTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.expediente = crear_expediente('exportar')
+        cls.vieja = crear_visita(cls.expediente, date(2024, 6, 1), observaciones='=HYPERLINK("x")')
+        cls.nueva = crear_visita(cls.expediente, date(2025, 6, 1), gastos_totales=Decimal('150000.00'))
+        for nombre, ingreso in [('Ana', 300000), ('Luis', 0)]:
+            Familiar.objects.create(visita=cls.nueva, nombre_completo=nombre, edad=40,
+                                    parentesco='Madre', ingreso_mensual=ingreso)
+        crear_visita(crear_expediente('otro_exportar'), date(2025, 6, 2))
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def exportar(self, parametros=''):
+        response = self.client.get(f'/api/visitas/exportar/{parametros}')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenido = b''.join(response.streaming_content).decode('utf-8-sig')
+        return list(csv.DictReader(io.StringIO(contenido)))
+
+    def test_csv_con_familiares_aplanados(self):
+        filas = self.exportar(f'?expediente_id={self.expediente.id}')
+        self.assertEqual([int(fila['visita_id']) for fila in filas], [self.nueva.id, self.vieja.id])
+        fila = filas[0]
+        self.assertEqual(fila['gastos_totales'], '150000.00')
+        self.assertEqual(fila['cantidad_familiares'], '2')
+        self.assertEqual(fila['ingreso_familiares'], '300000.00')
+        self.assertEqual(fila['familiar_2_nombre'], 'Luis')
+        self.assertEqual(filas[1]['familiar_1_nombre'], '')
+        # Texto que Excel tomaría como fórmula
+        self.assertEqual(filas[1]['observaciones'], '\'=HYPERLINK("x")')
+
+    def test_filtros_de_fecha(self):
+        filas = self.exportar('?fecha_desde=2025-01-01&fecha_hasta=2025-06-01')
+        self.assertEqual([int(fila['visita_id']) for fila in filas], [self.nueva.id])
+
+    def test_consultas_constantes(self):
+        # Máximo de familiares, visitas y familiares prefetcheados del lote
+        with self.assertNumQueries(3):
+            self.exportar()
+
+    def test_formato_invalido(self):
+        self.assertEqual(self.client.get('/api/visitas/exportar/?formato=pdf').status_code, 400)
+
+    @unittest.skipUnless(importlib.util.find_spec('openpyxl'), 'requiere openpyxl')
+    def test_xlsx(self):
+        from openpyxl import load_workbook
+
+        response = self.client.get(f'/api/visitas/exportar/?formato=xlsx&expediente_id={self.expediente.id}')
+        libro = load_workbook(io.BytesIO(b''.join(response.streaming_content)), read_only=True)
+        filas = list(libro.active.iter_rows(values_only=True))
+        self.assertEqual(len(filas), 3)
+        self.assertEqual(filas[1][0], self.nueva.id)
+
+
+# ============= LECTURAS ASYNC =============
+
+class LecturaAsyncTests(TestCase):
+    """Las rutas /api/async/ devuelven lo mismo que sus equivalentes síncronas"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.expediente = crear_expediente('async')
+        for dia in range(1, 6):
+            visita = crear_visita(cls.expediente, date(2025, 2, dia))
+        Familiar.objects.create(visita=visita, nombre_completo='Ana', edad=40, parentesco='Madre')
+        proyecto = Proyecto.objects.create(nombre='Async', fecha_inicio=date(2025, 1, 1), fecha_fin=date(2025, 12, 31))
+        ProyectoUsuario.objects.create(proyecto=proyecto, usuario=cls.expediente.user)
+
+    def setUp(self):
+        self.async_client = AsyncClient()
+
+    async def comparar(self, ruta):
+        asincrona = await self.async_client.get(f'/api/async/{ruta}')
+        sincrona = await self.async_client.get(f'/api/{ruta}')
+        self.assertEqual(asincrona.status_code, 200)
+        datos = json.loads(asincrona.content)
+        esperado = json.loads(sincrona.content)
+        if 'results' in esperado:
+            datos, esperado = datos['results'], esperado['results']
+        self.assertEqual(datos, esperado)
+        return asincrona
+
+    async def test_listados(self):
+        await self.comparar('expedientes/?expand=visitas')
+        await self.comparar(f'visitas/?expediente_id={self.expediente.id}')
+        response = await self.comparar('proyectos/?incluir_total=true')
+        self.assertEqual(response['X-Total-Count'], '1')
+
+    async def test_detalles(self):
+        await self.comparar(f'expedientes/{self.expediente.id}/')
+        await self.comparar(f'expedientes/{self.expediente.id}/resumen/')
+        visita = await Visita.objects.afirst()
+        await self.comparar(f'visitas/{visita.id}/')
+
+    async def test_paginacion_por_cursor(self):
+        response = await self.async_client.get('/api/async/visitas/?page_size=2')
+        vistas = []
+        while True:
+            datos = json.loads(response.content)
+            vistas += [visita['id'] for visita in datos['results']]
+            if not datos['next']:
+                break
+            self.assertIn('/api/async/visitas/', datos['next'])
+            response = await self.async_client.get(datos['next'])
+        esperado = [visita.id async for visita in Visita.objects.order_by('-fecha_visita', 'id')]
+        self.assertEqual(vistas, esperado)
+
+    async def test_errores_como_drf(self):
+        response = await self.async_client.get('/api/async/expedientes/999999/')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get('/api/async/expedientes/abc/')
+        self.assertEqual(response.status_code, 404)
+        response = await self.async_client.get('/api/async/visitas/', headers={'Authorization': 'Bearer invalido'})
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+
+
+# ============= RÉPLICAS DE LECTURA =============
+
+# 'default' hace de réplica: el router la devuelve explícitamente solo cuando
+# la eligió como réplica (None significa "la primaria"). TransactionTestCase
+# porque dentro de una transacción siempre se lee de la primaria.
+# Caché en archivos: compartida entre procesos, como exige ReplicaMiddleware
+@override_settings(REPLICAS=['default'], CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+    'respuestas': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.mkdtemp()},
+})
+class ReplicasTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        caches['respuestas'].clear()
+        replicas._salud.clear()
+        self.factory = RequestFactory()
+
+    def leer(self, metodo='get', vista=None, **extra):
+        """Pasa un request por ReplicaMiddleware y devuelve el alias que eligió el router"""
+        leido = []
+        vista = vista or ExpedienteViewSet.as_view({'get': 'list'})
+
+        def get_response(request):
+            middleware.process_view(request, vista, (), {})
+            leido.append(replicas.RouterReplicas().db_for_read(Expediente))
+            if metodo == 'post':
+                replicas.RouterReplicas().db_for_write(Expediente)
+            return HttpResponse()
+
+        middleware = replicas.ReplicaMiddleware(get_response)
+        middleware(getattr(self.factory, metodo)('/api/expedientes/', **extra))
+        return leido[0]
+
+    def test_get_de_viewset_va_a_replica(self):
+        self.assertEqual(self.leer(), 'default')
+
+    def test_vistas_que_no_son_viewsets_usan_la_primaria(self):
+        self.assertIsNone(self.leer(vista=EstadisticasView.as_view()))
+
+    def test_cliente_fijado_tras_escribir(self):
+        token = {'HTTP_AUTHORIZATION': 'Bearer uno'}
+        self.leer('post', **token)
+        self.assertIsNone(self.leer(**token))
+        # Otro cliente sigue leyendo de la réplica
+        self.assertEqual(self.leer(HTTP_AUTHORIZATION='Bearer dos'), 'default')
+
+    @override_settings(REPLICAS_FIJAR_SEGUNDOS=0)
+    def test_fijacion_expira(self):
+        self.leer('post')
+        self.assertEqual(self.leer(), 'default')
+
+    @override_settings(REPLICAS_RETRASO_MAXIMO=-1)
+    def test_replica_atrasada_vuelve_a_la_primaria(self):
+        self.assertIsNone(self.leer())
+
+    def test_sin_replicas_no_interviene(self):
+        with override_settings(REPLICAS=[]):
+            self.assertIsNone(self.leer())
+
+    def test_exige_cache_compartida(self):
+        with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            with self.assertRaises(ImproperlyConfigured):
+                replicas.ReplicaMiddleware(lambda request: HttpResponse())
+            with override_settings(REPLICAS=[]):
+                replicas.ReplicaMiddleware(lambda request: HttpResponse())
+
+    def test_requests_reales(self):
+        crear_expediente('replica')
+        client = APIClient()
+        # Recién invalidada: lo leído de la réplica no se guarda en la caché
+        for _ in range(2):
+            self.assertEqual(client.get('/api/expedientes/')['X-Cache'], 'MISS')
+        response = client.post('/api/proyectos/', {
+            'nombre': 'Réplica', 'descripcion': 'Prueba', 'objetivo': 'Prueba',
+            'fecha_inicio': '2025-01-01', 'fecha_fin': '2025-12-31',
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(client.get('/api/proyectos/').data['results'][0]['nombre'], 'Réplica')
+
+
+# ============= MÉTRICAS POR REQUEST =============
+
+class MetricasTests(TestCase):
+    def setUp(self):
+        registro_metricas.limpiar()
+        self.client = APIClient()
+        expediente = crear_expediente('metricas')
+        crear_visita(expediente, date(2025, 1, 10))
+
+    def test_server_timing(self):
+        response = self.client.get('/api/visitas/')
+        componentes = {parte.split(';')[0].strip() for parte in response['Server-Timing'].split(',')}
+        self.assertEqual(componentes, {'db', 'auth', 'vista', 'render', 'total'})
+        self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+    def test_auth_medida(self):
+        admin = crear_atleta('admin_metricas', rol='admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(admin)['access']}")
+        response = self.client.get('/api/visitas/')
+        self.assertEqual(response.status_code, 200)
+        auth = float(response['Server-Timing'].split('auth;dur=')[1].split(',')[0])
+        self.assertGreater(auth, 0)
+
+    def test_histogramas_por_ruta(self):
+        expediente = Expediente.objects.get()
+        self.client.get('/api/visitas/')
+        self.client.get('/api/visitas/')
+        self.client.get(f'/api/expedientes/{expediente.id}/resumen/')
+
+        response = self.client.get('/api/metricas/')
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = response.content.decode()
+        self.assertIn('api_request_duration_seconds_count{route="visita-list",method="GET"} 2', texto)
+        self.assertIn('api_request_duration_seconds_bucket{route="visita-list",method="GET",le="+Inf"} 2', texto)
+        self.assertIn('api_request_queries_count{route="expediente-resumen",method="GET"} 1', texto)
+        self.assertIn('api_responses_total{route="visita-list",method="GET",status="2xx"} 2', texto)
+        self.assertIn('component="render"', texto)
+        self.assertIn('api_cache_respuestas_total{recurso="visita",resultado="hit"}', texto)
+
+    async def test_consultas_en_asgi(self):
+        # En ASGI el ORM usa las conexiones del hilo de sync_to_async
+        cliente = AsyncClient()
+        for ruta in ('/api/async/visitas/', '/api/visitas/'):
+            with self.subTest(ruta=ruta):
+                response = await cliente.get(ruta)
+                self.assertEqual(response.status_code, 200)
+                self.assertRegex(response['Server-Timing'], r'db;dur=[\d.]+;desc="[1-9]\d* consultas"')
+
+    @override_settings(METRICAS_ACTIVAS=False)
+    def test_desactivadas(self):
+        response = self.client.get('/api/visitas/')
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('visita-list', registro_metricas.exportar())
+
+
+# ============= TRABAJOS EN SEGUNDO PLANO =============
+
+def tarea_suma(trabajo, a, b):
+    trabajos.avance(trabajo, 50, 'Sumando')
+    return {'suma': a + b}
+
+
+def tarea_falla(trabajo):
+    raise RuntimeError('sin conexión')
+
+
+def tarea_invalida(trabajo):
+    raise serializers.ValidationError('Archivo inválido')
+
+
+TAREAS_PRUEBA = {
+    'suma': (tarea_suma, None),
+    'falla': (tarea_falla, 2),
+    'invalida': (tarea_invalida, None),
+}
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), TRABAJOS_ESPERA_BASE=30)
+@mock.patch.dict(trabajos._tareas, TAREAS_PRUEBA)
+class TrabajosTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_completa_y_guarda_resultado(self):
+        trabajo = trabajos.encolar('suma', {'a': 2, 'b': 3})
+        self.assertEqual(trabajos.procesar_pendientes(), 1)
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual(trabajo.progreso, 100)
+        self.assertEqual(trabajo.mensaje, 'Sumando')
+        self.assertEqual(trabajo.resultado, {'suma': 5})
+        self.assertEqual(trabajo.intentos, 1)
+        self.assertIsNotNone(trabajo.fecha_fin)
+
+    def test_reintenta_con_espera_exponencial(self):
+        trabajo = trabajos.encolar('falla')
+        self.assertEqual(trabajo.max_intentos, 2)
+        with self.assertLogs('api.trabajos', 'ERROR'):
+            trabajos.procesar_pendientes()
+
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'pendiente')
+        self.assertEqual(trabajo.error, 'RuntimeError: sin conexión')
+        self.assertGreater(trabajo.disponible_desde, timezone.now() + timedelta(seconds=25))
+        # Todavía no está disponible
+        self.assertEqual(trabajos.procesar_pendientes(), 0)
+        self.assertEqual(trabajos.espera_reintento(2), 60)
+
+        Trabajo.objects.filter(pk=trabajo.pk).update(disponible_desde=timezone.now())
+        with self.assertLogs('api.trabajos', 'ERROR'):
+            trabajos.procesar_pendientes()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'fallido')
+        self.assertEqual(trabajo.intentos, 2)
+
+    def test_error_de_validacion_no_se_reintenta(self):
+        trabajo = trabajos.encolar('invalida')
+        with self.assertLogs('api.trabajos', 'ERROR'):
+            trabajos.procesar_pendientes()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'fallido')
+        self.assertEqual(trabajo.error, 'Archivo inválido')
+        self.assertEqual(trabajo.intentos, 1)
+
+    def test_reserva_vencida_vuelve_a_la_cola(self):
+        trabajo = trabajos.encolar('suma', {'a': 1, 'b': 1})
+        self.assertEqual(trabajos.tomar_trabajo('caido:1').pk, trabajo.pk)
+        self.assertIsNone(trabajos.tomar_trabajo('otro:2'))
+
+        Trabajo.objects.filter(pk=trabajo.pk).update(bloqueado_hasta=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(trabajos.procesar_pendientes('otro:2'), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'completado')
+        self.assertEqual(trabajo.trabajador, 'otro:2')
+        self.assertEqual(trabajo.intentos, 2)
+
+        # El trabajador caído ya no puede escribir sobre el trabajo
+        trabajo.trabajador = 'caido:1'
+        trabajos.avance(trabajo, 10, 'tarde')
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.progreso, 100)
+
+    def test_reserva_vencida_sin_intentos_falla(self):
+        trabajo = trabajos.encolar('falla')
+        Trabajo.objects.filter(pk=trabajo.pk).update(
+            estado='en_proceso', intentos=2, bloqueado_hasta=timezone.now() - timedelta(seconds=1)
+        )
+        trabajos.recuperar_vencidos()
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'fallido')
+
+    def test_endpoint_estado(self):
+        trabajo = trabajos.encolar('suma', {'a': 1, 'b': 2})
+        response = self.client.get(f'/api/trabajos/{trabajo.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['estado'], 'pendiente')
+
+        trabajos.procesar_pendientes()
+        response = self.client.get(f'/api/trabajos/{trabajo.pk}/')
+        self.assertEqual(response.data['estado'], 'completado')
+        self.assertEqual(response.data['resultado'], {'suma': 3})
+
+        self.assertEqual(self.client.get('/api/trabajos/00000000-0000-0000-0000-000000000000/').status_code, 404)
+        self.assertEqual(self.client.get('/api/trabajos/').status_code, 404)
+
+    def test_importar_atletas_asincrono(self):
+        contenido = 'username,email,first_name,last_name\nasync1,async1@test.com,Ana,Mora\n'
+        archivo = SimpleUploadedFile('atletas.csv', contenido.encode('utf-8'), content_type='text/csv')
+        response = self.client.post('/api/usuarios/importar-atletas/?asincrono=true', {'archivo': archivo})
+
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertTrue(response['Location'].endswith(f"/api/trabajos/{response.data['trabajo']['id']}/"))
+        self.assertFalse(CustomUser.objects.filter(username='async1').exists())
+        ruta = Trabajo.objects.get().parametros['ruta']
+        self.assertTrue(default_storage.exists(ruta))
+
+        call_command('run_workers', una_vez=True, stdout=io.StringIO())
+        estado = self.client.get(response['Location']).data
+        self.assertEqual(estado['estado'], 'completado', estado['error'])
+        self.assertEqual(estado['resultado'], {'creados': 1, 'errores': 0, 'reporte_url': None})
+        self.assertTrue(CustomUser.objects.filter(username='async1').exists())
+        self.assertFalse(default_storage.exists(ruta))
+
+    def test_importacion_visible_en_otros_procesos(self):
+        total = self.client.get('/api/estadisticas/').data['total_expedientes']
+        listado = self.client.get('/api/expedientes/')
+        contenido = 'username,email,first_name,last_name,genero\nvisible1,visible1@test.com,Ana,Mora,F\n'
+        archivo = SimpleUploadedFile('atletas.csv', contenido.encode('utf-8'), content_type='text/csv')
+        self.client.post('/api/usuarios/importar-atletas/?asincrono=true', {'archivo': archivo})
+
+        # run_workers es otro proceso: sus invalidaciones no llegan a las cachés locales de este
+        with mock.patch('api.importacion.invalidar'):
+            trabajos.procesar_pendientes()
+
+        self.assertEqual(self.client.get('/api/estadisticas/').data['total_expedientes'], total + 1)
+        response = self.client.get('/api/expedientes/', HTTP_IF_NONE_MATCH=listado['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_encolar_con_token_jwt(self):
+        admin = crear_atleta('admin_trabajos', rol='admin')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(admin)['access']}")
+        contenido = 'username,email,first_name,last_name\njwt1,jwt1@test.com,Ana,Mora\n'
+        archivo = SimpleUploadedFile('atletas.csv', contenido.encode('utf-8'), content_type='text/csv')
+        response = self.client.post('/api/usuarios/importar-atletas/?asincrono=true', {'archivo': archivo})
+
+        self.assertEqual(response.status_code, 202, response.data)
+        self.assertEqual(Trabajo.objects.get().creado_por_id, admin.id)
+
+    def test_importar_asincrono_valida_formato(self):
+        archivo = SimpleUploadedFile('atletas.txt', b'x')
+        response = self.client.post('/api/usuarios/importar-atletas/?asincrono=true', {'archivo': archivo})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Trabajo.objects.exists())
+
+
+# ============= DOSSIER PDF =============
+
+@unittest.skipUnless(importlib.util.find_spec('reportlab'), 'requiere reportlab')
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class DossierExpedienteTests(TransactionTestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.expediente = crear_expediente('dossier')
+        self.visita = crear_visita(self.expediente, date(2025, 3, 1), ingresos_totales=500000)
+        self.familiar = Familiar.objects.create(
+            visita=self.visita, nombre_completo='Marta Dossier', edad=45,
+            parentesco='Madre', ingreso_mensual=250000,
+        )
+        self.url = f'/api/expedientes/{self.expediente.id}/dossier/'
+        self.client.force_authenticate(crear_atleta('personal_dossier', rol='staff'))
+
+    def generar(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        trabajos.procesar_pendientes()
+        return Trabajo.objects.get(pk=response.data['trabajo']['id'])
+
+    def archivos(self):
+        carpeta = f'dossiers/expediente_{self.expediente.id}'
+        return default_storage.listdir(carpeta)[1] if default_storage.exists(carpeta) else []
+
+    def test_genera_en_segundo_plano_y_reutiliza(self):
+        primera = self.client.get(self.url)
+        self.assertEqual(primera.status_code, 202)
+        # Mientras está pendiente no se encola otro
+        segunda = self.client.get(self.url)
+        self.assertEqual(segunda.data['trabajo']['id'], primera.data['trabajo']['id'])
+
+        trabajos.procesar_pendientes()
+        trabajo = Trabajo.objects.get()
+        self.assertEqual(trabajo.estado, 'completado', trabajo.error)
+        self.assertEqual(trabajo.resultado['url'], self.url)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+        self.assertEqual(Trabajo.objects.count(), 1)
+
+    def test_regenera_solo_si_cambian_los_datos(self):
+        self.generar()
+        anterior = self.archivos()
+
+        self.familiar.ingreso_mensual = 300000
+        self.familiar.save()
+        trabajo = self.generar()
+        self.assertEqual(trabajo.estado, 'completado', trabajo.error)
+        self.assertEqual(len(self.archivos()), 1)
+        self.assertNotEqual(self.archivos(), anterior)
+
+        crear_visita(self.expediente, date(2025, 6, 1))
+        self.assertEqual(self.client.get(self.url).status_code, 202)
+
+    def test_expediente_inexistente(self):
+        self.assertEqual(self.client.get('/api/expedientes/999999/dossier/').status_code, 404)
+        self.assertEqual(self.client.get('/api/expedientes/abc/dossier/').status_code, 404)
+        self.assertFalse(Trabajo.objects.exists())
+
+    def test_eliminar_expediente_borra_dossiers(self):
+        self.generar()
+        self.assertEqual(len(self.archivos()), 1)
+        # Fuera de una transacción on_commit se ejecuta de inmediato
+        self.expediente.delete()
+        self.assertEqual(self.archivos(), [])
+
+    def test_encolar_con_token_jwt(self):
+        admin = crear_atleta('admin_dossier', rol='admin')
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(admin)['access']}")
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Trabajo.objects.get().creado_por_id, admin.id)
+
+    def test_acceso_restringido(self):
+        self.generar()
+        self.client.force_authenticate(None)
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+        otro = crear_atleta('otro_dossier')
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(otro)['access']}")
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        # El atleta dueño sí lo descarga
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens_para_usuario(self.expediente.user)['access']}")
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+        # Sin sesión tampoco se encola la generación de una versión nueva
+        self.client.credentials()
+        self.familiar.ingreso_mensual = 1
+        self.familiar.save()
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+        self.assertEqual(Trabajo.objects.count(), 1)
@@ -0,0 +1,205 @@
+import logging
+import os
+import signal
+import socket
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+
+from .models import Trabajo
+
+
+logger = logging.getLogger(__name__)
+
+
+# ============= TRABAJOS EN SEGUNDO PLANO =============
+#
+# Cola en la base de datos (modelo Trabajo), sin broker externo. Las vistas
+# llaman encolar() y responden 202 con la URL de /api/trabajos/<id>/; los
+# procesos de `manage.py run_workers` toman los trabajos con
+# SELECT ... FOR UPDATE SKIP LOCKED, así varios trabajadores no toman el mismo.
+#
+# Un trabajo tomado queda reservado TRABAJOS_RESERVA_SEGUNDOS; cada avance()
+# renueva la reserva. Si el trabajador muere, al vencer la reserva el trabajo
+# vuelve a la cola (o falla si ya agotó los intentos). Un error reintenta con
+# espera exponencial; ErrorPermanente y ValidationError fallan sin reintentar.
+# Las tareas se registran con @tarea en api/tareas.py.
+#
+# Los trabajadores son otros procesos: sin REDIS_URL sus cachés (LocMem) no
+# son las de los workers web. Por eso lo que una tarea escribe no depende de
+# invalidar cachés: las versiones de estadísticas, listados y ETag salen de
+# la base (api/estadisticas.py, api/condicional.py).
+
+_tareas = {}
+
+
+class ErrorPermanente(Exception):
+    """Error que no se arregla reintentando (datos inválidos, archivo faltante...)"""
+
+
+def tarea(nombre, max_intentos=None):
+    """
+    Registra una función como tarea: funcion(trabajo, **parametros) devuelve
+    el resultado (JSON). Las tareas que no son idempotentes usan max_intentos=1.
+    """
+    def registrar(funcion):
+        _tareas[nombre] = (funcion, max_intentos)
+        return funcion
+    return registrar
+
+
+def encolar(tipo, parametros=None, usuario=None):
+    if tipo not in _tareas:
+        raise ValueError(f'Tarea no registrada: {tipo}')
+    _, max_intentos = _tareas[tipo]
+    return Trabajo.objects.create(
+        tipo=tipo,
+        parametros=parametros or {},
+        # Con JWT request.user es un UsuarioToken, no un CustomUser: se guarda el id
+        creado_por_id=usuario.id if usuario is not None and usuario.is_authenticated else None,
+        max_intentos=max_intentos or settings.TRABAJOS_MAX_INTENTOS,
+    )
+
+
+def avance(trabajo, progreso=None, mensaje=None):
+    """Reporta el avance (0-100) desde la tarea y renueva la reserva"""
+    cambios = {'bloqueado_hasta': timezone.now() + timedelta(seconds=settings.TRABAJOS_RESERVA_SEGUNDOS)}
+    if progreso is not None:
+        trabajo.progreso = cambios['progreso'] = max(0, min(100, int(progreso)))
+    if mensaje is not None:
+        trabajo.mensaje = cambios['mensaje'] = mensaje[:255]
+    # Si la reserva venció y otro trabajador lo tomó, este ya no escribe
+    Trabajo.objects.filter(pk=trabajo.pk, trabajador=trabajo.trabajador, estado='en_proceso').update(**cambios)
+
+
+def espera_reintento(intentos):
+    """Segundos antes del siguiente intento: base * 2^(intentos-1), con tope"""
+    return min(settings.TRABAJOS_ESPERA_BASE * 2 ** (intentos - 1), settings.TRABAJOS_ESPERA_MAXIMA)
+
+
+# ---------- Cola ----------
+
+def recuperar_vencidos():
+    """Trabajos cuyo trabajador dejó de renovar la reserva"""
+    ahora = timezone.now()
+    vencidos = Trabajo.objects.filter(estado='en_proceso', bloqueado_hasta__lt=ahora)
+    fallidos = vencidos.filter(intentos__gte=F('max_intentos')).update(
+        estado='fallido', fecha_fin=ahora, bloqueado_hasta=None,
+        error='El trabajador dejó de responder y no quedan intentos.',
+    )
+    devueltos = vencidos.update(estado='pendiente', disponible_desde=ahora, bloqueado_hasta=None)
+    return devueltos + fallidos
+
+
+def tomar_trabajo(trabajador):
+    """Reserva el siguiente trabajo disponible para `trabajador` (o None)"""
+    ahora = timezone.now()
+    with transaction.atomic():
+        trabajo = (
+            Trabajo.objects.select_for_update(skip_locked=True)
+            .filter(estado='pendiente', disponible_desde__lte=ahora)
+            .order_by('disponible_desde')
+            .first()
+        )
+        if trabajo is None:
+            return None
+        trabajo.estado = 'en_proceso'
+        trabajo.intentos += 1
+        trabajo.trabajador = trabajador
+        trabajo.bloqueado_hasta = ahora + timedelta(seconds=settings.TRABAJOS_RESERVA_SEGUNDOS)
+        trabajo.fecha_inicio = ahora
+        trabajo.error = ''
+        trabajo.save(update_fields=[
+            'estado', 'intentos', 'trabajador', 'bloqueado_hasta', 'fecha_inicio', 'error',
+        ])
+    return trabajo
+
+
+def ejecutar(trabajo):
+    """Corre la tarea de un trabajo ya tomado y guarda el resultado o el error"""
+    try:
+        if trabajo.tipo not in _tareas:
+            raise ErrorPermanente(f'Tarea no registrada: {trabajo.tipo}')
+        funcion, _ = _tareas[trabajo.tipo]
+        resultado = funcion(trabajo, **trabajo.parametros)
+        # Un resultado que no es JSON falla aquí y cuenta como error de la tarea
+        Trabajo.objects.filter(pk=trabajo.pk, trabajador=trabajo.trabajador).update(
+            estado='completado', progreso=100, resultado=resultado,
+            fecha_fin=timezone.now(), bloqueado_hasta=None,
+        )
+    except Exception as error:
+        _fallo(trabajo, error)
+
+
+def _fallo(trabajo, error):
+    permanente = isinstance(error, (ErrorPermanente, serializers.ValidationError))
+    if isinstance(error, serializers.ValidationError):
+        detalle = error.detail[0] if isinstance(error.detail, list) else error.detail
+        mensaje = str(detalle)
+    else:
+        mensaje = f'{type(error).__name__}: {error}'
+    logger.exception('Trabajo %s (%s) falló en el intento %s', trabajo.pk, trabajo.tipo, trabajo.intentos)
+
+    cambios = {'error': mensaje[:2000], 'bloqueado_hasta': None}
+    if permanente or trabajo.intentos >= trabajo.max_intentos:
+        cambios.update(estado='fallido', fecha_fin=timezone.now())
+    else:
+        espera = espera_reintento(trabajo.intentos)
+        cambios.update(estado='pendiente', disponible_desde=timezone.now() + timedelta(seconds=espera))
+    Trabajo.objects.filter(pk=trabajo.pk, trabajador=trabajo.trabajador).update(**cambios)
+
+
+def procesar_siguiente(trabajador):
+    """Toma y ejecuta un trabajo; devuelve False si la cola estaba vacía"""
+    recuperar_vencidos()
+    trabajo = tomar_trabajo(trabajador)
+    if trabajo is None:
+        return False
+    ejecutar(trabajo)
+    return True
+
+
+# ---------- Trabajadores ----------
+
+def nombre_trabajador():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def bucle_trabajador(detener, intervalo):
+    """Cuerpo de cada proceso de run_workers: procesa hasta que `detener` se activa"""
+    # Ctrl+C llega a todo el grupo de procesos: el padre decide cuándo parar.
+    # Un SIGTERM directo al hijo termina el trabajo en curso y sale.
+    terminar = []
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda *args: terminar.append(True))
+
+    trabajador = nombre_trabajador()
+    logger.info('Trabajador %s iniciado', trabajador)
+    while not terminar and not detener.is_set():
+        # Igual que entre requests: descarta conexiones vencidas o rotas
+        close_old_connections()
+        try:
+            ocupado = procesar_siguiente(trabajador)
+        except Exception:
+            # Base caída u otro error fuera de una tarea: esperar y reintentar
+            logger.exception('Error en el trabajador %s', trabajador)
+            ocupado = False
+        finally:
+            close_old_connections()
+        if not ocupado:
+            detener.wait(intervalo)
+    connections.close_all()
+    logger.info('Trabajador %s detenido', trabajador)
+
+
+def procesar_pendientes(trabajador=None, limite=None):
+    """Procesa en este proceso lo que haya en la cola (run_workers --una-vez, tests)"""
+    trabajador = trabajador or nombre_trabajador()
+    procesados = 0
+    while (limite is None or procesados < limite) and procesar_siguiente(trabajador):
+        procesados += 1
+    return procesados
@@ -1,9 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import lectura_async
 from .views import (
-    RegistroView, LoginView, PerfilView, CambiarPasswordView,
+    RegistroView, LoginView, PerfilView, CambiarPasswordView, EstadisticasView,
+    CacheMetricasView, MetricasView, BuscarView,
     UsuarioViewSet, ExpedienteViewSet, VisitaViewSet, 
-    FamiliarViewSet, ProyectoViewSet, ProyectoUsuarioViewSet
+    FamiliarViewSet, ProyectoViewSet, ProyectoUsuarioViewSet, CargaArchivoViewSet,
+    TrabajoViewSet
 )
 
 # ========== ROUTER ==========
@@ -17,6 +20,8 @@ router.register(r'visitas', VisitaViewSet, basename='visita')
 router.register(r'familiares', FamiliarViewSet, basename='familiar')
 router.register(r'proyectos', ProyectoViewSet, basename='proyecto')
 router.register(r'proyecto-usuarios', ProyectoUsuarioViewSet, basename='proyecto-usuario')
+router.register(r'cargas', CargaArchivoViewSet, basename='carga')
+router.register(r'trabajos', TrabajoViewSet, basename='trabajo')
 
 # ========== URLS ==========
 urlpatterns = [
@@ -26,6 +31,26 @@ urlpatterns = [
     path('auth/perfil/', PerfilView.as_view(), name='perfil'),
     path('auth/cambiar-password/', CambiarPasswordView.as_view(), name='cambiar-password'),
     
+    # Estadísticas agregadas para el dashboard
+    path('estadisticas/', EstadisticasView.as_view(), name='estadisticas'),
+    
+    # Aciertos/fallos de la caché de respuestas
+    path('cache/metricas/', CacheMetricasView.as_view(), name='cache-metricas'),
+    
+    # Tiempos por ruta para Prometheus
+    path('metricas/', MetricasView.as_view(), name='metricas'),
+    
+    # Búsqueda de texto completo
+    path('buscar/', BuscarView.as_view(), name='buscar'),
+    
+    # Lecturas async (servidas con uvicorn vía config/asgi.py)
+    path('async/expedientes/', lectura_async.expediente_lista, name='expediente-list-async'),
+    path('async/expedientes/<pk>/', lectura_async.expediente_detalle, name='expediente-detail-async'),
+    path('async/expedientes/<pk>/resumen/', lectura_async.expediente_resumen, name='expediente-resumen-async'),
+    path('async/visitas/', lectura_async.visita_lista, name='visita-list-async'),
+    path('async/visitas/<pk>/', lectura_async.visita_detalle, name='visita-detail-async'),
+    path('async/proyectos/', lectura_async.proyecto_lista, name='proyecto-list-async'),
+    
     # Incluir TODAS las rutas del router
     path('', include(router.urls)),
 ]
\ No newline at end of file
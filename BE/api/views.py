@@ -1,18 +1,36 @@
-from rest_framework import viewsets, status
+from rest_framework import generics, mixins, viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.views import APIView
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
-from .models import CustomUser, Expediente, Visita, Familiar, Proyecto, ProyectoUsuario
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.http import Http404, HttpResponse
+from django.urls import reverse
+from django.core.files.storage import default_storage
+from django.db.models import Count, Max, Prefetch, Q
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework.authentication import SessionAuthentication
+from .models import CustomUser, Expediente, Visita, Familiar, Proyecto, ProyectoUsuario, CargaArchivo, Trabajo
+from .pagination import VisitaCursorPaginacion, BusquedaPaginacion
+from .estadisticas import obtener_estadisticas
+from .busqueda import buscar_usuarios
+from . import inscripciones, importacion, exportacion, cargas, trabajos, dossier
+from .autenticacion import tokens_para_usuario
+from .medios import respuesta_medio, verificar_acceso
+from .condicional import RespuestaCondicionalMixin
+from .cache_respuestas import CacheRespuestaMixin, metricas as metricas_cache
+from .metricas import exportar as exportar_metricas
 from .serializers import (
     RegistroUsuarioSerializer, CrearUsuarioAtletaSerializer,
     UsuarioSerializer, UsuarioActualizarSerializer,
-    CambiarPasswordSerializer, ExpedienteSerializer, ExpedienteCrearSerializer,
+    CambiarPasswordSerializer, ExpedienteSerializer, ExpedienteListaSerializer,
+    ExpedienteCrearSerializer,
     VisitaSerializer, VisitaCrearSerializer, FamiliarSerializer, 
-    ProyectoSerializer, ProyectoCrearSerializer, ProyectoUsuarioSerializer
+    ProyectoSerializer, ProyectoCrearSerializer, ProyectoUsuarioSerializer,
+    ResultadoBusquedaSerializer, InscripcionMasivaSerializer, CargaArchivoSerializer,
+    TrabajoSerializer
 )
 
 
@@ -27,15 +45,10 @@ class RegistroView(APIView):
         if serializer.is_valid():
             user = serializer.save()
             
-            refresh = RefreshToken.for_user(user)
-            
             return Response({
                 'message': 'Usuario registrado exitosamente',
                 'user': UsuarioSerializer(user).data,
-                'tokens': {
-                    'refresh': str(refresh),
-                    'access': str(refresh.access_token),
-                }
+                'tokens': tokens_para_usuario(user),
             }, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -66,20 +79,17 @@ class LoginView(APIView):
                 'error': 'Usuario inactivo'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        refresh = RefreshToken.for_user(user)
-        
         return Response({
             'message': 'Login exitoso',
             'user': UsuarioSerializer(user).data,
-            'tokens': {
-                'refresh': str(refresh),
-                'access': str(refresh.access_token),
-            }
+            'tokens': tokens_para_usuario(user),
         })
 
 
 class PerfilView(APIView):
     """Ver y actualizar perfil del usuario autenticado"""
+    # Necesita el CustomUser completo, no solo los claims del token
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
@@ -103,6 +113,7 @@ class PerfilView(APIView):
 
 class CambiarPasswordView(APIView):
     """Cambiar contraseña del usuario autenticado"""
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
@@ -126,6 +137,47 @@ class CambiarPasswordView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+# ============= ESTADÍSTICAS =============
+
+class EstadisticasView(APIView):
+    """Distribuciones por género, sede, beca y edad para el dashboard"""
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+    
+    def get(self, request):
+        return Response(obtener_estadisticas())
+
+
+class CacheMetricasView(APIView):
+    """Aciertos y fallos de la caché de respuestas por recurso"""
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+    
+    def get(self, request):
+        return Response(metricas_cache())
+
+
+class MetricasView(APIView):
+    """Histogramas por ruta en formato de texto de Prometheus"""
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+    
+    def get(self, request):
+        return HttpResponse(exportar_metricas(metricas_cache()), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ============= BÚSQUEDA =============
+
+class BuscarView(generics.ListAPIView):
+    """Búsqueda de atletas por nombre, usuario, correo, sede, cédula o institución"""
+    serializer_class = ResultadoBusquedaSerializer
+    pagination_class = BusquedaPaginacion
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+    
+    def get_queryset(self):
+        texto = self.request.query_params.get('q', '').strip()
+        if not texto:
+            return CustomUser.objects.none()
+        return buscar_usuarios(texto)
+
+
 # ============= USUARIOS =============
 
 class UsuarioViewSet(viewsets.ModelViewSet):
@@ -143,7 +195,7 @@ class UsuarioViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filtrar usuarios"""
-        queryset = CustomUser.objects.all()
+        queryset = CustomUser.objects.select_related('expediente')
         
         # Filtro por rol
         rol = self.request.query_params.get('rol')
@@ -181,6 +233,39 @@ class UsuarioViewSet(viewsets.ModelViewSet):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
+    @action(detail=False, methods=['post'], url_path='importar-atletas')
+    def importar_atletas(self, request):
+        """
+        Importación masiva de atletas desde CSV/XLSX (campo 'archivo').
+        Columnas: username, email, first_name, last_name y opcionales
+        password, sede, telefono, genero.
+        Con ?asincrono=true se procesa en segundo plano y responde 202
+        con el trabajo a consultar en /api/trabajos/<id>/.
+        """
+        archivo = request.FILES.get('archivo')
+        
+        if not archivo:
+            return Response({
+                'error': 'Se requiere el archivo (CSV o XLSX)'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        if request.query_params.get('asincrono', '').lower() == 'true':
+            ruta = importacion.guardar_archivo(archivo)
+            trabajo = trabajos.encolar(
+                'importar_atletas', {'ruta': ruta, 'nombre': archivo.name}, usuario=request.user
+            )
+            return respuesta_trabajo(request, trabajo)
+        
+        resultado = importacion.importar_atletas(archivo, archivo.name)
+        reporte = resultado['reporte']
+        
+        return Response({
+            'message': 'Importación finalizada',
+            'creados': resultado['creados'],
+            'errores': len(resultado['errores']),
+            'reporte_url': request.build_absolute_uri(default_storage.url(reporte)) if reporte else None,
+        })
+    
     @action(detail=True, methods=['post'])
     def desactivar(self, request, pk=None):
         """Desactivar un usuario"""
@@ -213,20 +298,44 @@ class UsuarioViewSet(viewsets.ModelViewSet):
 
 # ============= EXPEDIENTES =============
 
-class ExpedienteViewSet(viewsets.ModelViewSet):
+class ExpedienteViewSet(RespuestaCondicionalMixin, CacheRespuestaMixin, viewsets.ModelViewSet):
     """CRUD de expedientes"""
     queryset = Expediente.objects.all()
     permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    recurso_cache = 'expediente'
+    agregados_version = {
+        'expediente': Max('fecha_actualizacion'),
+        'visita': Max('visitas__fecha_actualizacion'),
+        'familiar': Max('visitas__familiares__fecha_actualizacion'),
+        'conteo_visitas': Count('visitas', distinct=True),
+        'conteo_familiares': Count('visitas__familiares', distinct=True),
+    }
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return ExpedienteCrearSerializer
+        if self.action == 'list':
+            return ExpedienteListaSerializer
         return ExpedienteSerializer
     
     def get_queryset(self):
         """Filtrar expedientes"""
-        queryset = Expediente.objects.select_related('user').prefetch_related('visitas')
+        # Conteo y última visita se calculan en la misma consulta del expediente
+        queryset = Expediente.objects.select_related('user').annotate(
+            total_visitas=Count('visitas'),
+            ultima_visita=Max('visitas__fecha_visita'),
+        )
+        
+        # El listado compacto solo trae las visitas con ?expand=visitas
+        if self.action != 'list' or 'visitas' in self.request.query_params.get('expand', '').split(','):
+            queryset = queryset.prefetch_related('visitas__familiares')
+        
+        return queryset
+    
+    def filter_queryset(self, queryset):
+        """Filtros por query params (también usados para calcular el ETag)"""
+        queryset = super().filter_queryset(queryset)
         
         # Filtro por usuario
         user_id = self.request.query_params.get('user_id')
@@ -253,19 +362,53 @@ class ExpedienteViewSet(viewsets.ModelViewSet):
         return Response({
             'expediente': ExpedienteSerializer(expediente, context={'request': request}).data,
             'estadisticas': {
-                'total_visitas': expediente.visitas.count(),
-                'ultima_visita': expediente.visitas.first().fecha_visita if expediente.visitas.exists() else None,
+                'total_visitas': expediente.total_visitas,
+                'ultima_visita': expediente.ultima_visita,
             }
         })
+    
+    @action(detail=True, methods=['get'])
+    def dossier(self, request, pk=None):
+        """
+        PDF con el expediente, sus visitas, familiares y resumen económico.
+        Si la versión actual de los datos ya está generada se entrega; si no,
+        se encola su generación y responde 202 con el trabajo a consultar.
+        """
+        try:
+            version = self._version(self.filter_queryset(self.queryset.all()).filter(pk=pk))
+        except (TypeError, ValueError, DjangoValidationError):
+            raise Http404
+        if not version['total']:
+            raise Http404
+        
+        ruta = dossier.ruta_dossier(pk, version)
+        # Mismo control que /media/dossiers/: personal o el atleta dueño
+        verificar_acceso(request, ruta)
+        if default_storage.exists(ruta):
+            response = respuesta_medio(request, ruta)
+            response['Content-Disposition'] = f'attachment; filename="expediente_{pk}.pdf"'
+            return response
+        
+        trabajo = dossier.trabajo_en_curso(ruta) or trabajos.encolar(
+            dossier.TIPO_TRABAJO, {'expediente_id': int(pk), 'ruta': ruta}, usuario=request.user
+        )
+        return respuesta_trabajo(request, trabajo)
 
 
 # ============= VISITAS =============
 
-class VisitaViewSet(viewsets.ModelViewSet):
+class VisitaViewSet(RespuestaCondicionalMixin, CacheRespuestaMixin, viewsets.ModelViewSet):
     """CRUD de visitas domiciliarias"""
     queryset = Visita.objects.all()
     permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    recurso_cache = 'visita'
+    pagination_class = VisitaCursorPaginacion
+    agregados_version = {
+        'visita': Max('fecha_actualizacion'),
+        'familiar': Max('familiares__fecha_actualizacion'),
+        'conteo_familiares': Count('familiares', distinct=True),
+    }
     
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -274,7 +417,11 @@ class VisitaViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filtrar visitas"""
-        queryset = Visita.objects.select_related('expediente__user').prefetch_related('familiares')
+        return Visita.objects.select_related('expediente__user').prefetch_related('familiares')
+    
+    def filter_queryset(self, queryset):
+        """Filtros por query params (también usados para calcular el ETag)"""
+        queryset = super().filter_queryset(queryset)
         
         # Filtro por expediente
         expediente_id = self.request.query_params.get('expediente_id')
@@ -292,6 +439,14 @@ class VisitaViewSet(viewsets.ModelViewSet):
         
         return queryset.order_by('-fecha_visita')
     
+    @action(detail=False, methods=['get'])
+    def exportar(self, request):
+        """Exportar visitas con sus familiares (?formato=csv|xlsx, mismos filtros que el listado)"""
+        queryset = self.filter_queryset(self.get_queryset()).order_by('-fecha_visita', 'id')
+        formato = request.query_params.get('formato', 'csv').lower()
+        
+        return exportacion.exportar_visitas(queryset, formato, request._request)
+    
     @action(detail=True, methods=['post'], url_path='agregar-familiar')
     def agregar_familiar(self, request, pk=None):
         """Agregar un familiar a una visita existente"""
@@ -329,11 +484,19 @@ class FamiliarViewSet(viewsets.ModelViewSet):
 
 # ============= PROYECTOS =============
 
-class ProyectoViewSet(viewsets.ModelViewSet):
+class ProyectoViewSet(RespuestaCondicionalMixin, CacheRespuestaMixin, viewsets.ModelViewSet):
     """CRUD de proyectos"""
     queryset = Proyecto.objects.all()
     permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
     parser_classes = [MultiPartParser, FormParser, JSONParser]
+    recurso_cache = 'proyecto'
+    # Una inscripción nueva siempre trae una fecha mayor; las bajas cambian los conteos
+    agregados_version = {
+        'proyecto': Max('fecha_actualizacion'),
+        'inscripcion': Max('proyectousuario__fecha_inscripcion'),
+        'inscritos': Count('proyectousuario', distinct=True),
+        'activos': Count('proyectousuario', filter=Q(proyectousuario__activo=True), distinct=True),
+    }
     
     def get_serializer_class(self):
         if self.action == 'create':
@@ -342,7 +505,28 @@ class ProyectoViewSet(viewsets.ModelViewSet):
     
     def get_queryset(self):
         """Filtrar proyectos"""
-        queryset = Proyecto.objects.prefetch_related('usuarios')
+        queryset = Proyecto.objects.all()
+        
+        # Solo las acciones que serializan el proyecto necesitan participantes
+        if self.action in ['list', 'retrieve', 'update', 'partial_update']:
+            queryset = queryset.annotate(
+                participantes_activos=Count(
+                    'proyectousuario', filter=Q(proyectousuario__activo=True)
+                )
+            ).prefetch_related(
+                # Participantes con su usuario y expediente en una sola consulta,
+                # en orden de inscripción
+                Prefetch(
+                    'proyectousuario_set',
+                    queryset=ProyectoUsuario.objects.select_related('usuario__expediente').order_by('id'),
+                )
+            )
+        
+        return queryset
+    
+    def filter_queryset(self, queryset):
+        """Filtros por query params (también usados para calcular el ETag)"""
+        queryset = super().filter_queryset(queryset)
         
         # Filtro por activo
         activo = self.request.query_params.get('activo')
@@ -401,12 +585,146 @@ class ProyectoViewSet(viewsets.ModelViewSet):
             return Response({
                 'error': 'Relación no encontrada'
             }, status=status.HTTP_404_NOT_FOUND)
+    
+    def _inscripcion_masiva(self, request, operacion, mensaje):
+        proyecto = self.get_object()
+        serializer = InscripcionMasivaSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        solicitados, encontrados = inscripciones.resolver_usuarios(**serializer.validated_data)
+        resultados = operacion(proyecto, solicitados, encontrados)
+        
+        totales = {}
+        for resultado in resultados.values():
+            totales[resultado] = totales.get(resultado, 0) + 1
+        
+        return Response({
+            'message': mensaje,
+            'resultados': [
+                {'usuario_id': usuario_id, 'resultado': resultado}
+                for usuario_id, resultado in resultados.items()
+            ],
+            'totales': totales,
+        })
+    
+    @action(detail=True, methods=['post'], url_path='agregar-usuarios')
+    def agregar_usuarios(self, request, pk=None):
+        """Agregar varios usuarios al proyecto (usuarios_ids, sede y/o rol)"""
+        return self._inscripcion_masiva(
+            request, inscripciones.inscribir_usuarios, 'Inscripción procesada'
+        )
+    
+    @action(detail=True, methods=['post'], url_path='remover-usuarios')
+    def remover_usuarios(self, request, pk=None):
+        """Remover varios usuarios del proyecto (usuarios_ids, sede y/o rol)"""
+        return self._inscripcion_masiva(
+            request, inscripciones.remover_usuarios, 'Remoción procesada'
+        )
 
 
 # ============= PROYECTO USUARIOS =============
 
 class ProyectoUsuarioViewSet(viewsets.ModelViewSet):
     """CRUD de relaciones proyecto-usuario"""
-    queryset = ProyectoUsuario.objects.all()
+    queryset = ProyectoUsuario.objects.select_related('proyecto', 'usuario__expediente')
     serializer_class = ProyectoUsuarioSerializer
-    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
\ No newline at end of file
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+
+
+# ============= CARGAS POR PARTES =============
+
+class CargaArchivoViewSet(viewsets.GenericViewSet):
+    """
+    Subidas reanudables (ver api/cargas.py):
+    POST crea la carga, PATCH agrega una parte (header Upload-Offset),
+    GET consulta el offset recibido y POST finalizar/ la deja lista para usar.
+    """
+    queryset = CargaArchivo.objects.all()
+    serializer_class = CargaArchivoSerializer
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+    
+    def _respuesta(self, carga, status_code=status.HTTP_200_OK):
+        response = Response(CargaArchivoSerializer(carga).data, status=status_code)
+        response['Upload-Offset'] = str(carga.recibido)
+        return response
+    
+    def create(self, request):
+        serializer = CargaArchivoSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        carga = cargas.iniciar_carga(**serializer.validated_data)
+        return self._respuesta(carga, status.HTTP_201_CREATED)
+    
+    def retrieve(self, request, pk=None):
+        return self._respuesta(self.get_object())
+    
+    def partial_update(self, request, pk=None):
+        carga = self.get_object()
+        offset = request.headers.get('Upload-Offset')
+        
+        if offset is None or not offset.isdigit():
+            return Response({
+                'error': 'Se requiere el header Upload-Offset'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            carga = cargas.agregar_parte(carga.id, int(offset), request.stream)
+        except cargas.OffsetIncorrecto as error:
+            response = Response({
+                'error': 'El offset no coincide con lo recibido',
+                'recibido': error.esperado
+            }, status=status.HTTP_409_CONFLICT)
+            response['Upload-Offset'] = str(error.esperado)
+            return response
+        
+        return self._respuesta(carga)
+    
+    def destroy(self, request, pk=None):
+        cargas.eliminar_carga(self.get_object())
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    
+    @action(detail=True, methods=['post'])
+    def finalizar(self, request, pk=None):
+        """Verifica que la carga esté completa y sea del tipo declarado"""
+        carga = cargas.finalizar_carga(self.get_object().id)
+        return self._respuesta(carga)
+
+
+
+# ============= TRABAJOS EN SEGUNDO PLANO =============
+
+def respuesta_trabajo(request, trabajo):
+    """202 con el trabajo encolado y la URL para consultar su estado"""
+    url = request.build_absolute_uri(reverse('trabajo-detail', args=[trabajo.pk]))
+    response = Response({
+        'message': 'Trabajo encolado',
+        'trabajo': TrabajoSerializer(trabajo).data,
+        'url': url,
+    }, status=status.HTTP_202_ACCEPTED)
+    response['Location'] = url
+    return response
+
+
+class TrabajoViewSet(mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Estado, avance y resultado de un trabajo (ver api/trabajos.py)"""
+    queryset = Trabajo.objects.all()
+    serializer_class = TrabajoSerializer
+    permission_classes = [AllowAny]  # TODO: Cambiar a [IsAuthenticated]
+    # El cliente consulta justo después de encolar: leer siempre de la primaria
+    lecturas_en_replica = False
+
+
+
+# ============= ARCHIVOS MEDIA =============
+
+class MedioView(APIView):
+    """
+    Entrega imágenes, variantes y adjuntos después de verificar el acceso;
+    la transferencia se delega al proxy si MEDIA_ENTREGA lo indica.
+    """
+    permission_classes = [AllowAny]  # Las carpetas privadas se revisan en verificar_acceso
+    
+    def get(self, request, ruta):
+        verificar_acceso(request, ruta)
+        return respuesta_medio(request, ruta)
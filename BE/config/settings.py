@@ -22,6 +22,11 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Quién envía los archivos media: 'python', 'x-accel' (nginx) o 'x-sendfile' (Apache)
+MEDIA_ENTREGA = 'python'
+# Location interna de nginx que apunta a MEDIA_ROOT (solo con 'x-accel')
+MEDIA_ACCEL_PREFIJO = '/media-interno/'
+
 # ============================================
 # LÍMITES DE TAMAÑO DE ARCHIVOS
 # ============================================
@@ -32,6 +37,12 @@ DATA_UPLOAD_MAX_MEMORY_SIZE = 2621440  # 2.5 MB en bytes
 # Tamaño máximo total de archivos subidos (10 MB)
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB en bytes
 
+# Archivos temporales de las subidas por partes (api/cargas.py)
+CARGAS_TEMP_DIR = os.path.join(BASE_DIR, 'cargas_tmp')
+
+# Variantes WebP de imágenes: False = en segundo plano tras el commit
+VARIANTES_SINCRONAS = False
+
 # Tamaño máximo del request completo (incluyendo todos los campos)
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 1000  # Número máximo de campos en un form
 
@@ -56,12 +67,17 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'api',
     'corsheaders',
 ]
 
 MIDDLEWARE = [
+    # Primero, para que el tiempo total cubra toda la cadena (api/metricas.py)
+    'api.metricas.MedicionMiddleware',
+    # Lecturas de los ViewSets en réplicas (api/replicas.py)
+    'api.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -74,6 +90,11 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'config.urls'
 
+# Tiempos por request (header Server-Timing) e histogramas en /api/metricas/
+METRICAS_ACTIVAS = os.environ.get('METRICAS_ACTIVAS', '1') == '1'
+# Desactivar para no exponer los tiempos a los clientes
+METRICAS_SERVER_TIMING = os.environ.get('METRICAS_SERVER_TIMING', '1') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -106,6 +127,114 @@ DATABASES = {
     }
 }
 
+# Manejo de conexiones (DB_CONEXIONES):
+#   'nueva'        una conexión por request (desarrollo)
+#   'persistente'  cada hilo reutiliza su conexión DB_CONN_MAX_AGE segundos
+#   'pool'         pool de psycopg por proceso; requiere psycopg[pool] (producción)
+# Con pool, cada worker abre entre DB_POOL_MIN y DB_POOL_MAX conexiones por
+# alias: workers * DB_POOL_MAX * alias debe quedar bajo max_connections.
+# Comparar perfiles con `manage.py medir_conexiones`.
+DB_CONEXIONES = os.environ.get('DB_CONEXIONES', 'nueva')
+
+if DB_CONEXIONES == 'persistente':
+    DATABASES['default']['CONN_MAX_AGE'] = int(os.environ.get('DB_CONN_MAX_AGE', 600))
+    # Verifica la conexión reutilizada antes de cada request
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+elif DB_CONEXIONES == 'pool':
+    DATABASES['default']['CONN_MAX_AGE'] = 0  # el pool no admite conexiones persistentes
+    # Con pool, el chequeo lo hace psycopg al entregar cada conexión
+    DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': int(os.environ.get('DB_POOL_MIN', 2)),
+            'max_size': int(os.environ.get('DB_POOL_MAX', 10)),
+            # Segundos esperando una conexión libre antes de fallar
+            'timeout': float(os.environ.get('DB_POOL_TIMEOUT', 10)),
+            # Reciclar conexiones viejas u ociosas
+            'max_lifetime': float(os.environ.get('DB_POOL_MAX_LIFETIME', 1800)),
+            'max_idle': float(os.environ.get('DB_POOL_MAX_IDLE', 300)),
+        },
+    }
+
+# Réplicas de solo lectura: DB_REPLICAS=host1,host2:5433 crea los alias
+# replica_1, replica_2... con las credenciales de 'default'. REPLICAS lista
+# los alias que usa api/replicas.py (en local sirven dos alias SQLite).
+# Con réplicas hace falta REDIS_URL: la fijación a la primaria tras escribir
+# se guarda en la caché 'default' y tiene que verse desde todos los workers.
+for numero, destino in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), start=1):
+    host, _, puerto = destino.strip().partition(':')
+    DATABASES[f'replica_{numero}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': puerto or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+REPLICAS = [alias for alias in DATABASES if alias != 'default']
+
+DATABASE_ROUTERS = ['api.replicas.RouterReplicas']
+# Segundos que un cliente lee de la primaria después de escribir
+REPLICAS_FIJAR_SEGUNDOS = int(os.environ.get('REPLICAS_FIJAR_SEGUNDOS', 5))
+# Atraso máximo tolerado antes de volver a la primaria
+REPLICAS_RETRASO_MAXIMO = float(os.environ.get('REPLICAS_RETRASO_MAXIMO', 2))
+# Cada cuánto se mide el atraso de cada réplica
+REPLICAS_CHEQUEO_SEGUNDOS = 5
+
+
+# ============================================
+# CACHÉ
+# ============================================
+
+# 'default': estadísticas y estado de autenticación
+# 'respuestas': respuestas de la API (api/cache_respuestas.py)
+# En producción definir REDIS_URL (p. ej. redis://localhost:6379/1) para
+# compartir la caché entre workers; CACHE_RESPUESTAS_DIR usa archivos.
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHE_RESPUESTAS_DIR = os.environ.get('CACHE_RESPUESTAS_DIR')
+CACHE_RESPUESTAS_TTL = int(os.environ.get('CACHE_RESPUESTAS_TTL', 300))
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'respuestas': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'respuestas',
+            'TIMEOUT': CACHE_RESPUESTAS_TTL,
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'respuestas': {
+            'BACKEND': (
+                'django.core.cache.backends.filebased.FileBasedCache'
+                if CACHE_RESPUESTAS_DIR else
+                'django.core.cache.backends.locmem.LocMemCache'
+            ),
+            'LOCATION': CACHE_RESPUESTAS_DIR or 'respuestas',
+            'TIMEOUT': CACHE_RESPUESTAS_TTL,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        },
+    }
+
+
+# ============================================
+# TRABAJOS EN SEGUNDO PLANO
+# ============================================
+
+# Cola en la base de datos (api/trabajos.py); los procesa `manage.py run_workers`
+TRABAJOS_MAX_INTENTOS = int(os.environ.get('TRABAJOS_MAX_INTENTOS', 3))
+# Espera antes de reintentar: base * 2^(intento-1) segundos, hasta el máximo
+TRABAJOS_ESPERA_BASE = int(os.environ.get('TRABAJOS_ESPERA_BASE', 30))
+TRABAJOS_ESPERA_MAXIMA = int(os.environ.get('TRABAJOS_ESPERA_MAXIMA', 3600))
+# Un trabajo sin avance() durante este tiempo se considera abandonado
+TRABAJOS_RESERVA_SEGUNDOS = int(os.environ.get('TRABAJOS_RESERVA_SEGUNDOS', 600))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -164,19 +293,28 @@ CORS_ALLOWED_ORIGINS = [
     'http://127.0.0.1:5173',
 ]
 
+# Headers que el FE puede leer en respuestas CORS
+CORS_EXPOSE_HEADERS = ['X-Total-Count', 'X-Cache', 'Server-Timing']
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Autoriza con los claims del token (rol, sede, activo) sin cargar el usuario
+        'api.autenticacion.JWTRolAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # ← Cambiado a AllowAny
     ],
+    # Paginación por cursor en todos los listados (?page_size=N, ?incluir_total=true)
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.CursorPaginacion',
+    'PAGE_SIZE': 50,
 }
 
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'api.autenticacion.TokenConRolSerializer',
+    'TOKEN_USER_CLASS': 'api.autenticacion.UsuarioToken',
 }
 
 AUTH_USER_MODEL = 'api.CustomUser'
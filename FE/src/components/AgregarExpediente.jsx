@@ -21,6 +21,7 @@ function AgregarExpediente() {
     const [fechaExpediente, setFechaExpediente] = useState('');
     const [expedientes, setExpedientes] = useState([]);
     const [usuarios, setUsuarios] = useState([]);
+    const [siguiente, setSiguiente] = useState(null);
     const [editMode, setEditMode] = useState(false);
     const [currentExpedienteId, setCurrentExpedienteId] = useState(null);
     const [error, setError] = useState(null);
@@ -68,8 +69,20 @@ function AgregarExpediente() {
         try {
             const data = await apiService.getData('expedientes/');
             // Mapear expedientes del backend al frontend
-            const expedientesMapeados = data.map(mapExpedienteFromBackend);
+            const expedientesMapeados = data.results.map(mapExpedienteFromBackend);
             setExpedientes(expedientesMapeados);
+            setSiguiente(data.next);
+        } catch (error) {
+            console.error('Error obteniendo expedientes:', error);
+            setError('Error al cargar expedientes');
+        }
+    }
+
+    async function cargarMasExpedientes() {
+        try {
+            const data = await apiService.getData(siguiente);
+            setExpedientes(actuales => actuales.concat(data.results.map(mapExpedienteFromBackend)));
+            setSiguiente(data.next);
         } catch (error) {
             console.error('Error obteniendo expedientes:', error);
             setError('Error al cargar expedientes');
@@ -78,7 +91,8 @@ function AgregarExpediente() {
 
     async function obtenerUsuarios() {
         try {
-            const data = await apiService.getData('usuarios/');
+            // El select de usuarios necesita la lista completa
+            const data = await apiService.getAllData('usuarios/');
             // Mapear usuarios del backend al frontend
             const usuariosMapeados = data.map(mapUsuarioFromBackend);
             setUsuarios(usuariosMapeados);
@@ -422,6 +436,9 @@ function AgregarExpediente() {
                         ))}
                     </tbody>
                 </table>
+                {siguiente && (
+                    <button onClick={cargarMasExpedientes} className='FLR'>Cargar más</button>
+                )}
             </div>
         </div>
     );
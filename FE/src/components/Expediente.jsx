@@ -14,6 +14,8 @@ function Expediente() {
   const [error, setError] = useState(null);
   const [isLoading, setIsLoading] = useState(false);
   const [expedientes, setExpedientes] = useState([]);
+  const [siguiente, setSiguiente] = useState(null);
+  const [cargandoMas, setCargandoMas] = useState(false);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -25,17 +27,18 @@ function Expediente() {
     setError(null);
     
     try {
-      // Obtener expedientes con el nuevo API
+      // Primera página; las demás se piden con "Cargar más"
       const data = await apiService.getData('expedientes/');
       
       console.log('Expedientes recibidos:', data);
       
       // Mapear datos del backend al formato del frontend
-      const expedientesMapeados = data.map(mapExpedienteFromBackend);
+      const expedientesMapeados = data.results.map(mapExpedienteFromBackend);
       
       console.log('Expedientes mapeados:', expedientesMapeados);
       
       setExpedientes(expedientesMapeados);
+      setSiguiente(data.next);
       
     } catch (err) {
       console.error('Error al obtener expedientes:', err);
@@ -60,6 +63,21 @@ function Expediente() {
     }
   };
 
+  const cargarMas = async () => {
+    setCargandoMas(true);
+    
+    try {
+      const data = await apiService.getData(siguiente);
+      setExpedientes(actuales => actuales.concat(data.results.map(mapExpedienteFromBackend)));
+      setSiguiente(data.next);
+    } catch (err) {
+      console.error('Error al cargar más expedientes:', err);
+      setError('Hubo un problema al cargar más expedientes.');
+    } finally {
+      setCargandoMas(false);
+    }
+  };
+
   return (
     <div>
       <div className='static'>
@@ -113,6 +131,16 @@ function Expediente() {
           />
         ))}
 
+        {!isLoading && !error && siguiente && (
+          <button 
+            className='buttong' 
+            onClick={cargarMas}
+            disabled={cargandoMas}
+          >
+            {cargandoMas ? 'Cargando...' : 'Cargar más'}
+          </button>
+        )}
+
         {!isLoading && !error && expedientes.length === 0 && (
           <div className="empty-state">
             <p className="mensaje-vacio">No hay expedientes disponibles.</p>
@@ -79,7 +79,7 @@ export default function Report() {
         console.log("Intentando conectar al servidor...");
         
         // Usar solo Llamados.getData, no hacer fetch doble
-        const data = await Llamados.getData("api/expedientes/");
+        const data = await Llamados.getData("api/estadisticas/");
         
         console.log("Datos recibidos:", data);
         
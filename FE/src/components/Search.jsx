@@ -1,40 +1,33 @@
 import React, { useState, useEffect } from 'react';
+import apiService from '../services/apiService';
 import '../style/search.css';
 
 function Search() {
   const [query, setQuery] = useState('');
   const [results, setResults] = useState([]);
-  const [allPeople, setAllPeople] = useState([]);
 
   useEffect(() => {
-    const fetchPeople = async () => {
+    const value = query.trim();
+
+    if (!value) {
+      setResults([]);
+      return;
+    }
+
+    const timeoutId = setTimeout(async () => {
       try {
-        const response = await fetch('https://api.example.com/people');
-        const data = await response.json();
-        setAllPeople(data);
-        setResults(data);
+        // La búsqueda se resuelve en el servidor (índice de texto completo)
+        const response = await apiService.axiosInstance.get('buscar/', {
+          params: { q: value },
+        });
+        setResults(response.data.results);
       } catch (error) {
         console.error('Error al obtener datos:', error);
       }
-    };
-
-    fetchPeople();
-  }, []);
-
-  useEffect(() => {
-    const timeoutId = setTimeout(() => {
-      const value = query.toLowerCase();
-      const filtered = allPeople.filter(person =>
-        person.name.toLowerCase().includes(value) ||
-        person.username.toLowerCase().includes(value) ||
-        person.email?.toLowerCase().includes(value) ||
-        person.city?.toLowerCase().includes(value)
-      );
-      setResults(filtered);
-    }, 300); // Espera 300ms antes de aplicar el filtro
+    }, 300); // Espera 300ms antes de consultar
 
     return () => clearTimeout(timeoutId);
-  }, [query, allPeople]);
+  }, [query]);
 
   const handleInputChange = (e) => {
     setQuery(e.target.value);
@@ -45,14 +38,14 @@ function Search() {
       <input
         type="text"
         className="search-input"
-        placeholder="Buscar por nombre, username, email o ciudad..."
+        placeholder="Buscar por nombre, username, email, sede o cédula..."
         value={query}
         onChange={handleInputChange}
       />
       <ul>
         {results.map(person => (
           <li key={person.id}>
-            {person.name} <span style={{ color: '#888' }}>({person.username})</span>
+            {person.nombre_completo} <span style={{ color: '#888' }}>({person.username})</span>
           </li>
         ))}
       </ul>
@@ -60,4 +53,4 @@ function Search() {
   );
 }
 
-export default Search;
\ No newline at end of file
+export default Search;
@@ -86,6 +86,9 @@ axiosInstance.interceptors.response.use(
 
 /**
  * GET - Obtener datos
+ * Los listados vienen paginados por cursor: se devuelve solo la página
+ * pedida ({ next, previous, results }). Para la siguiente se llama de nuevo
+ * con la URL de `next`.
  */
 async function getData(endpoint) {
   try {
@@ -96,6 +99,31 @@ async function getData(endpoint) {
   }
 }
 
+/**
+ * GET de todas las páginas de un listado, concatenadas en un arreglo.
+ * Solo para lo que de verdad necesita el conjunto completo (p. ej. selects);
+ * las vistas de listado deben paginar con getData.
+ */
+async function getAllData(endpoint) {
+  try {
+    let resultados = [];
+    let siguiente = endpoint;
+
+    while (siguiente) {
+      const pagina = (await axiosInstance.get(siguiente)).data;
+      if (!pagina || !Array.isArray(pagina.results)) {
+        return pagina;
+      }
+      resultados = resultados.concat(pagina.results);
+      siguiente = pagina.next;
+    }
+
+    return resultados;
+  } catch (error) {
+    console.error(`Error GET ${endpoint}:`, error);
+  }
+}
+
 /**
  * POST - Crear datos
  */
@@ -234,6 +262,7 @@ function logout() {
 const apiService = {
   // CRUD básico
   getData,
+  getAllData,
   postData,
   postFormData,
   patchData,
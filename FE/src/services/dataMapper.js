@@ -9,7 +9,7 @@ export function mapExpedienteFromBackend(expediente) {
   return {
     id: expediente.id,
     user: expediente.user,
-    imagen: expediente.imagen_url || expediente.imagen,
+    imagen: expediente.imagen_variantes?.medium || expediente.imagen_url || expediente.imagen,
     genero: expediente.genero === 'M' ? 'masculino' : 
             expediente.genero === 'F' ? 'femenino' : 'otro',
     activo: expediente.activo,
@@ -227,7 +227,7 @@ export function mapProyectoFromBackend(proyecto) {
     nombreProyecto: proyecto.nombre,
     objetivo: proyecto.objetivo,
     descripcion: proyecto.descripcion,
-    imagen: proyecto.imagen_url || proyecto.imagen,
+    imagen: proyecto.imagen_variantes?.medium || proyecto.imagen_url || proyecto.imagen,
     fechaInicio: proyecto.fecha_inicio,
     fechaFin: proyecto.fecha_fin,
     activo: proyecto.activo,